@@ -0,0 +1,137 @@
+"""The game actions clients can send, shared by the HTTP endpoints, the websocket and batches.
+
+Each action has a request model and a function applying it to a game (under the game's lock)
+and returning what the reply carries besides the state, such as a message or the score log.
+"""
+from typing import Callable, Dict, NamedTuple
+
+from pydantic import BaseModel, ValidationError
+
+import balatro_set_engine as engine
+from balatro_set_cards import JOKER_DATABASE, TAROT_DATABASE
+from balatro_set_classes import GameState
+from balatro_set_core import invalidate_joker_dispatch
+from balatro_set_engine import GameActionError
+from balatro_set_scoring import ScoreLogTracer
+
+#%% --- Requests ---
+class PlaySetRequest(BaseModel): card_indices: list[int]
+class DiscardRequest(BaseModel): card_indices: list[int]
+class BuyJokerRequest(BaseModel): slot_index: int
+class SellJokerRequest(BaseModel): joker_index: int
+class BuyBoosterRequest(BaseModel): slot_index: int
+class ChoosePackRewardRequest(BaseModel): selected_ids: list[str]
+class LeaveShopRequest(BaseModel): pass
+
+class UseConsumableRequest(BaseModel):
+    consumable_index: int
+    target_card_indices: list[int] | None = None
+
+class ReorderJokersRequest(BaseModel):
+    new_order: list[int]
+
+# Debug actions
+class SetMoneyRequest(BaseModel): amount: int
+class GiveJokerRequest(BaseModel): joker_id: str
+class GiveTarotRequest(BaseModel): tarot_id: str
+
+# An action by name, as sent over the websocket and in batches
+class ActionRequest(BaseModel):
+    action: str
+    params: dict = {}
+
+class ActionBatchRequest(BaseModel):
+    actions: list[ActionRequest]
+
+#%% --- Actions ---
+def play_set(game: GameState, request: PlaySetRequest) -> dict:
+    chips, mult, score_gained, scoring_ctx = engine.play_set(game, request.card_indices, tracer=ScoreLogTracer())
+    return {"scoring_details": {
+        "chips": chips,
+        "mult": mult,
+        "score_gained": score_gained,
+        "score_log": [log.model_dump() for log in scoring_ctx.score_log]
+    }}
+
+def discard(game: GameState, request: DiscardRequest) -> dict:
+    engine.discard(game, request.card_indices)
+    return {}
+
+def buy_joker(game: GameState, request: BuyJokerRequest) -> dict:
+    engine.buy_joker(game, request.slot_index)
+    return {}
+
+def sell_joker(game: GameState, request: SellJokerRequest) -> dict:
+    joker_to_sell, sell_price = engine.sell_joker(game, request.joker_index)
+    return {"message": f"Sold {joker_to_sell.name} for ${sell_price}."}
+
+def buy_booster_pack(game: GameState, request: BuyBoosterRequest) -> dict:
+    engine.buy_booster_pack(game, request.slot_index)
+    return {}
+
+def choose_pack_reward(game: GameState, request: ChoosePackRewardRequest) -> dict:
+    return {"message": engine.choose_pack_reward(game, request.selected_ids)}
+
+def use_consumable(game: GameState, request: UseConsumableRequest) -> dict:
+    return {"message": engine.use_consumable(game, request.consumable_index, request.target_card_indices)}
+
+def reorder_jokers(game: GameState, request: ReorderJokersRequest) -> dict:
+    engine.reorder_jokers(game, request.new_order)
+    return {}
+
+def leave_shop(game: GameState, request: LeaveShopRequest) -> dict:
+    engine.leave_shop(game)
+    return {}
+
+def set_money(game: GameState, request: SetMoneyRequest) -> dict:
+    game.money = request.amount
+    return {}
+
+def give_joker(game: GameState, request: GiveJokerRequest) -> dict:
+    if request.joker_id not in JOKER_DATABASE:
+        raise GameActionError("Invalid joker id.")
+    if len(game.jokers) >= game.joker_slots:
+        raise GameActionError("No empty joker slots.")
+    game.jokers.append(JOKER_DATABASE[request.joker_id].instantiate())
+    game.mark_dirty("jokers")
+    invalidate_joker_dispatch(game)
+    return {}
+
+def give_tarot(game: GameState, request: GiveTarotRequest) -> dict:
+    if request.tarot_id not in TAROT_DATABASE:
+        raise GameActionError("Invalid tarot id.")
+    if len(game.consumables) >= game.consumable_slots:
+        raise GameActionError("No empty consumable slots.")
+    game.consumables.append(TAROT_DATABASE[request.tarot_id])
+    game.mark_dirty("consumables")
+    return {}
+
+class Action(NamedTuple):
+    request: type[BaseModel]
+    apply: Callable[[GameState, BaseModel], dict]
+    saves: bool = False  # Whether the save file is written after the action
+
+ACTIONS: Dict[str, Action] = {
+    "play_set": Action(PlaySetRequest, play_set, saves=True),
+    "discard": Action(DiscardRequest, discard),
+    "buy_joker": Action(BuyJokerRequest, buy_joker),
+    "sell_joker": Action(SellJokerRequest, sell_joker),
+    "buy_booster_pack": Action(BuyBoosterRequest, buy_booster_pack),
+    "choose_pack_reward": Action(ChoosePackRewardRequest, choose_pack_reward),
+    "use_consumable": Action(UseConsumableRequest, use_consumable),
+    "reorder_jokers": Action(ReorderJokersRequest, reorder_jokers),
+    "leave_shop": Action(LeaveShopRequest, leave_shop),
+    "set_money": Action(SetMoneyRequest, set_money),
+    "give_joker": Action(GiveJokerRequest, give_joker),
+    "give_tarot": Action(GiveTarotRequest, give_tarot),
+}
+
+def parse_action(name: str, params: dict) -> tuple[Action, BaseModel]:
+    """The action called `name` and its validated request."""
+    action = ACTIONS.get(name) if isinstance(name, str) else None
+    if action is None:
+        raise GameActionError(f"Unknown action {name!r}.")
+    try:
+        return action, action.request.model_validate(params or {})
+    except ValidationError as exc:
+        raise GameActionError(f"Invalid params for {name}: {exc}")
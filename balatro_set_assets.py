@@ -0,0 +1,189 @@
+"""Static files served from memory, precompressed, with ETags and fingerprinted URLs.
+
+Every file under the static directory is read once at startup, hashed, and compressed with gzip
+(and brotli when it is installed). `app.js` is also served as `app.<hash>.js`: fingerprinted URLs
+never change content, so browsers keep them for a year without asking again. The pages and JS
+modules are rewritten to load each other through these URLs, and each page gets a manifest
+(`assetUrl` in the client) for the URLs scripts build themselves, such as joker images. The
+plain URLs, pages included, are revalidated with their ETag. Restart the server to pick up edits;
+files added afterwards (e.g. new card images) are loaded on their first request.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Dict, NamedTuple, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from starlette.responses import Response
+
+HASH_LENGTH = 10
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Images are already compressed; smaller files aren't worth a Content-Encoding
+COMPRESSED_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+MEDIA_TYPES = {".js": "text/javascript", ".mjs": "text/javascript", ".css": "text/css", ".html": "text/html",
+               ".json": "application/json", ".svg": "image/svg+xml", ".webp": "image/webp"}
+# Content-Encoding -> ETag suffix, in order of preference
+ENCODINGS = {"br": "-br", "gzip": "-gz"}
+
+# References rewritten to fingerprinted URLs: src/href attributes in pages, module specifiers in JS
+_HTML_REFERENCE = re.compile(r'\b(src|href)="([^"?#:]+)"')
+_JS_IMPORT = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*)(['"])(\.{0,2}/[^'"]+)\2""")
+_FINGERPRINTED = re.compile(r"^(.*)\.([0-9a-f]{%d})(\.[^./]+)?$" % HASH_LENGTH)
+
+class Asset(NamedTuple):
+    path: str                  # Relative to the static directory, with forward slashes
+    url: str                   # The fingerprinted URL, e.g. /app.0123456789.js
+    media_type: str
+    hash: str
+    bodies: Dict[str, bytes]   # Content-Encoding ("identity", "gzip", "br") -> body
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.hash}{ENCODINGS.get(encoding, "")}"'
+
+def media_type(path: str) -> str:
+    ext = posixpath.splitext(path)[1].lower()
+    media = MEDIA_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return media + "; charset=utf-8" if media.startswith("text/") else media
+
+def fingerprinted_path(path: str, digest: str) -> str:
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+def make_asset(path: str, content: bytes) -> Asset:
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    media = media_type(path)
+    bodies = {"identity": content}
+    if len(content) >= MIN_COMPRESS_SIZE and media.startswith(COMPRESSED_TYPES):
+        candidates = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates["br"] = brotli.compress(content, quality=11)
+        bodies.update((encoding, body) for encoding, body in candidates.items() if len(body) < len(content))
+    return Asset(path, "/" + fingerprinted_path(path, digest), media, digest, bodies)
+
+def accepted_encoding(asset: Asset, accept_encoding: str) -> str:
+    """The preferred precompressed body the client accepts, else "identity"."""
+    accepted = set()
+    for token in accept_encoding.lower().split(","):
+        name, *params = token.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip())
+    for encoding in ENCODINGS:
+        if encoding in asset.bodies and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+class StaticAssets:
+    def __init__(self, directory: str):
+        self.directory = os.path.realpath(directory)
+        self.assets: Dict[str, Asset] = {}
+        sources = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                with open(full_path, "rb") as f:
+                    sources[os.path.relpath(full_path, self.directory).replace(os.sep, "/")] = f.read()
+        # Pages and modules are hashed after the files they reference, whose URLs they contain
+        for path in sorted(sources, key=lambda path: path.endswith(".html")):
+            self.build(path, sources, set())
+
+    def build(self, path: str, sources: Dict[str, bytes], building: set) -> Optional[Asset]:
+        if path in self.assets or path not in sources or path in building:
+            return self.assets.get(path)
+        building.add(path)
+        content = sources[path]
+        if path.endswith(".html"):
+            content = self.rewrite_page(path, content.decode("utf-8"), sources, building).encode("utf-8")
+        elif path.endswith((".js", ".mjs")):
+            content = self.rewrite_module(path, content.decode("utf-8"), sources, building).encode("utf-8")
+        building.discard(path)
+        asset = self.assets[path] = make_asset(path, content)
+        return asset
+
+    def referenced_url(self, path: str, reference: str, sources: Dict[str, bytes], building: set) -> str:
+        """`reference` from the file at `path`, pointing at the fingerprinted URL of the file it names."""
+        if reference.startswith("/"):
+            target = posixpath.normpath(reference.lstrip("/"))
+        else:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(path), reference))
+        # Pages keep their names, they are what users bookmark
+        if target.endswith(".html"):
+            return reference
+        asset = self.build(target, sources, building)
+        if asset is None:
+            return reference
+        name = posixpath.basename(reference)
+        return reference[:len(reference) - len(name)] + posixpath.basename(asset.url)
+
+    def rewrite_page(self, path: str, page: str, sources: Dict[str, bytes], building: set) -> str:
+        page = _HTML_REFERENCE.sub(
+            lambda m: f'{m[1]}="{self.referenced_url(path, m[2], sources, building)}"', page)
+        manifest = {}
+        for other in sorted(sources):
+            if not other.endswith(".html"):
+                asset = self.build(other, sources, building)
+                if asset is not None:
+                    manifest["/" + other] = asset.url
+        # "</" can't end the script early once escaped
+        script = ('<script id="asset-manifest" type="application/json">'
+                  + json.dumps(manifest, separators=(",", ":")).replace("</", "<\\/") + "</script>\n")
+        return page.replace("</head>", script + "</head>", 1)
+
+    def rewrite_module(self, path: str, source: str, sources: Dict[str, bytes], building: set) -> str:
+        return _JS_IMPORT.sub(
+            lambda m: f"{m[1]}{m[2]}{self.referenced_url(path, m[3], sources, building)}{m[2]}", source)
+
+    def load(self, path: str) -> Optional[Asset]:
+        """A file added to the directory since startup, if `path` names one inside it."""
+        full_path = os.path.realpath(os.path.join(self.directory, path))
+        if not full_path.startswith(self.directory + os.sep) or not os.path.isfile(full_path):
+            return None
+        with open(full_path, "rb") as f:
+            asset = self.assets[path] = make_asset(path, f.read())
+        return asset
+
+    def find(self, path: str) -> tuple[Optional[Asset], bool]:
+        """The asset served at `path` and whether the URL is fingerprinted with its current hash."""
+        asset = self.assets.get(path)
+        if asset is not None:
+            return asset, False
+        match = _FINGERPRINTED.match(path)
+        if match:
+            asset = self.assets.get(match[1] + (match[3] or ""))
+            if asset is not None:
+                # An outdated fingerprint gets the current file, but browsers must not keep it under that URL
+                return asset, asset.hash == match[2]
+        return self.load(path), False
+
+    def response(self, path: str, accept_encoding: str = "", if_none_match: str = "") -> Optional[Response]:
+        """The file at `path`, or a 304 if the client has it; None if there is no such file."""
+        asset, immutable = self.find(path)
+        if asset is None:
+            return None
+        encoding = accepted_encoding(asset, accept_encoding)
+        headers = {"ETag": asset.etag(encoding), "Cache-Control": IMMUTABLE if immutable else REVALIDATE}
+        if len(asset.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or headers["ETag"] in tags:
+            return Response(status_code=304, headers=headers)
+        return Response(content=asset.bodies[encoding], media_type=asset.media_type, headers=headers)
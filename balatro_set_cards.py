@@ -1,6 +1,6 @@
 import random
 
-from balatro_set_classes import Joker, JokerAbility, JokerTrigger, JokerVariant
+from balatro_set_classes import JokerTemplate, JokerAbility, JokerTrigger, JokerVariant, JOKER_VARIANT_ABILITIES
 from balatro_set_classes import ConsumableCard, ConsumableAbility, ConsumableTrigger
 from balatro_set_classes import GameState, GameContext
 
@@ -12,7 +12,7 @@ def add_random_tarot(game_state: 'GameState', number: int = 1):
     for _ in range(number):
         if len(game_state.consumables) < game_state.consumable_slots:
             random_idx = random.randint(0, len(TAROT_DATABASE) - 1)
-            card = TAROT_DATABASE.values()[random_idx].copy()
+            card = list(TAROT_DATABASE.values())[random_idx].copy()
             game_state.consumables.append(card)
 
 def t_death_ability(c: ConsumableCard, ctx: GameContext):
@@ -35,9 +35,25 @@ def t_wheel_ability(c: ConsumableCard, ctx: GameContext):
             random_joker.variant = new_variant
             random_joker.price = int(random_joker.price * JOKER_VARIANT_PRICES_MULT[new_variant])
 
+JOKER_VARIANT_ABILITIES.update({
+    JokerVariant.FOIL: (
+        JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: setattr(ctx.scoring, 'flat_chips', ctx.scoring.flat_chips + 50)),
+    ),
+    JokerVariant.HOLOGRAPHIC: (
+        JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: setattr(ctx.scoring, 'additive_mult', ctx.scoring.additive_mult + 10)),
+    ),
+    JokerVariant.POLYCHROME: (
+        JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: setattr(ctx.scoring, 'multiplicative_mult', ctx.scoring.multiplicative_mult * 1.5)),
+    ),
+    JokerVariant.NEGATIVE: (
+        JokerAbility(trigger=JokerTrigger.ON_BUY_SELF, ability=lambda j, ctx: setattr(ctx.game, 'joker_slots', ctx.game.joker_slots + 1)),
+        JokerAbility(trigger=JokerTrigger.ON_DESTROY_SELF, ability=lambda j, ctx: setattr(ctx.game, 'joker_slots', ctx.game.joker_slots - 1)),
+    ),
+})
+
 JOKER_DATABASE = {
     # default joker
-    "J_MULT": Joker(
+    "J_MULT": JokerTemplate(
         id="J_MULT",
         name="Joker",
         description="+4 Mult",
@@ -48,7 +64,7 @@ JOKER_DATABASE = {
     ),
 
     # set of +3 mult per color jokers
-    "J_GREEDY": Joker(
+    "J_GREEDY": JokerTemplate(
         id="J_GREEDY",
         name="Greedy Joker",
         description="Played green cards give +3 Mult",
@@ -59,7 +75,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_LUSTY": Joker(
+    "J_LUSTY": JokerTemplate(
         id="J_LUSTY",
         name="Lusty Joker",
         description="Played red cards give +3 Mult",
@@ -70,7 +86,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_Wrathful": Joker(
+    "J_Wrathful": JokerTemplate(
         id="J_WRATHFUL",
         name="Wrathful Joker",
         description="Played magenta cards give +3 Mult",
@@ -83,7 +99,7 @@ JOKER_DATABASE = {
     ),
 
     # +mult and + chips for played features jokers
-    "J_JOLLY": Joker(
+    "J_JOLLY": JokerTemplate(
         id="J_JOLLY",
         name="Jolly Joker",
         description="+8 Mult if played set is (3U, 1L)",
@@ -94,7 +110,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_ZANNY": Joker(
+    "J_ZANNY": JokerTemplate(
         id="J_ZANNY",
         name="Zanny Joker",
         description="+12 Mult if played set is (2U, 2L)",
@@ -105,7 +121,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_MAD": Joker(
+    "J_MAD": JokerTemplate(
         id="J_MAD",
         name="Mad Joker",
         description="+16 Mult if played set is (1U, 3L)",
@@ -116,7 +132,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_CRAZY": Joker(
+    "J_CRAZY": JokerTemplate(
         id="J_CRAZY",
         name="Crazy Joker",
         description="+20 Mult if played set is (0U, 4L)",
@@ -127,7 +143,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_SLY": Joker(
+    "J_SLY": JokerTemplate(
         id="J_SLY",
         name="Sly Joker",
         description="+50 Chips if played set is (3U, 1L)",
@@ -138,7 +154,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_WILY": Joker(
+    "J_WILY": JokerTemplate(
         id="J_WILY",
         name="Wily Joker",
         description="+100 Chips if played set is (2U, 2L)",
@@ -149,7 +165,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_CLEVER": Joker(
+    "J_CLEVER": JokerTemplate(
         id="J_CLEVER",
         name="Clever Joker",
         description="+150 Chips if played set is (1U, 3L)",
@@ -161,7 +177,7 @@ JOKER_DATABASE = {
         ]
     ),
 
-    "J_STENCIL": Joker(
+    "J_STENCIL": JokerTemplate(
         id="J_STENCIL",
         name="Joker Stencil",
         description="x1 Mult for each empty Joker slot",
@@ -175,7 +191,7 @@ JOKER_DATABASE = {
         ]
     ),
 
-    "J_BANNER": Joker(
+    "J_BANNER": JokerTemplate(
         id="J_BANNER",
         name="Banner",
         description="+30 Chips for each remaining discard",
@@ -189,7 +205,7 @@ JOKER_DATABASE = {
         ]
     ),
 
-    "J_MYSTIC_SUMMIT": Joker(
+    "J_MYSTIC_SUMMIT": JokerTemplate(
         id="J_MYSTIC_SUMMIT",
         name="Mystic Summit",
         description="+15 Mult when 0 discards remaining",
@@ -201,7 +217,7 @@ JOKER_DATABASE = {
         ]
     ),
 
-    "J_LOYALTY_CARD": Joker(
+    "J_LOYALTY_CARD": JokerTemplate(
         id="J_LOYALTY_CARD",
         name="Loyalty Card",
         description="x4 Mult every 6 hands played",
@@ -218,29 +234,29 @@ JOKER_DATABASE = {
         ],
         calculate_display_badge=lambda j, ctx: f"{j.custom_data['n_hands']} remaining"
     ),
-    "J_8_BALL": Joker(
+    "J_8_BALL": JokerTemplate(
         id="J_8_BALL",
         name="8-Ball",
         description="1 in 4 to create a Tarot card when scoring",
         rarity="Common",
         abilities=[
             JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: (
-                add_random_tarot(ctx.game, 1) if random.random() < 0.25 else None
+                add_random_tarot(ctx.game, 1) if ctx.chance(0.25) else None
             ))
         ]
     ),
-    "J_MISPRINT": Joker(
+    "J_MISPRINT": JokerTemplate(
         id="J_MISPRINT",
         name="Misprint",
         description="+0-23 Mult",
         rarity="Common",
         abilities=[
             JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: (
-                setattr(ctx.scoring, 'additive_mult', ctx.scoring.additive_mult + random.randint(0, 23))
+                setattr(ctx.scoring, 'additive_mult', ctx.scoring.additive_mult + ctx.randint(0, 23))
             ))
         ]
     ),
-    "J_FIBONACCI": Joker(
+    "J_FIBONACCI": JokerTemplate(
         id="J_FIBONACCI",
         name="Fibonacci",
         description="Each played Solid Oval card gives +8 Mult",
@@ -251,7 +267,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_SCARY_FACE": Joker(
+    "J_SCARY_FACE": JokerTemplate(
         id="J_SCARY_FACE",
         name="Scary Face",
         description="Each played card with 3 symbols gives +30 Chips",
@@ -262,7 +278,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_ABSTRACT": Joker(
+    "J_ABSTRACT": JokerTemplate(
         id="J_ABSTRACT",
         name="Abstract",
         description="+3 Mult for each Joker held",
@@ -275,7 +291,7 @@ JOKER_DATABASE = {
         ],
         calculate_display_badge=lambda j, ctx: f"+{3 * len(ctx.game.jokers)} M"
     ),
-    "J_DELAYED_GRATIFICATION": Joker(
+    "J_DELAYED_GRATIFICATION": JokerTemplate(
         id="J_DELAYED_GRATIFICATION",
         name="Delayed Gratification",
         description="Earn $2 per discard if no discards are used by end of round",
@@ -286,7 +302,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_FACELESS": Joker(
+    "J_FACELESS": JokerTemplate(
         id="J_FACELESS",
         name="Faceless Joker",
         description="Earn $5 if 3 or more Triangle cards are discarded at the same time",
@@ -297,7 +313,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_SUPERPOSITION": Joker(
+    "J_SUPERPOSITION": JokerTemplate(
         id="J_SUPERPOSITION",
         name="Superposition",
         description="Create a Tarot card when scoring a set with a striped green card",
@@ -308,7 +324,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_VAMPIRE": Joker(
+    "J_VAMPIRE": JokerTemplate(
         id="J_VAMPIRE",
         name="Vampire",
         description="This joker gains x0.1 Mult per scoring enhanced card played, removes card Enhancement",
@@ -328,7 +344,7 @@ JOKER_DATABASE = {
         display_badge="{eternal_x_mult:.1f}x M",
         calculate_display_badge=lambda j, ctx: f"{j.custom_data['eternal_x_mult']:.1f}x M"
     ),
-    "J_VAGABOND": Joker(
+    "J_VAGABOND": JokerTemplate(
         id="J_VAGABOND",
         name="Vagabond",
         description="Create a Tarot card if hand is played with $4 or less",
@@ -339,7 +355,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_MIDAS_MASK": Joker(
+    "J_MIDAS_MASK": JokerTemplate(
         id="J_MIDAS_MASK",
         name="Midas Mask",
         description="All played Solid Rectangle cards become Gold when scored",
@@ -350,7 +366,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_DRUNKARD": Joker(
+    "J_DRUNKARD": JokerTemplate(
         id="J_DRUNKARD",
         name="Drunkard",
         description="+1 Discard",
@@ -364,7 +380,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_JUGGLER": Joker(
+    "J_JUGGLER": JokerTemplate(
         id="J_JUGGLER",
         name="Juggler",
         description="+1 Play",
@@ -378,7 +394,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_GOLDEN": Joker(
+    "J_GOLDEN": JokerTemplate(
         id="J_GOLDEN",
         name="Golden Joker",
         description="Earn $4 at end of round",
@@ -389,7 +405,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_BASEBALL": Joker(
+    "J_BASEBALL": JokerTemplate(
         id="J_BASEBALL",
         name="Baseball Card",
         description="x1.5 Mult for each Uncommon Joker held",
@@ -418,7 +434,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_BULL": Joker(
+    "J_BULL": JokerTemplate(
         id="J_BULL",
         name="Bull",
         description="+2 Chips for each $1 you have",
@@ -431,7 +447,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_POPCORN": Joker(
+    "J_POPCORN": JokerTemplate(
         id="J_POPCORN",
         name="Popcorn",
         description="+20 Mult, -4 Mult per round played",
@@ -448,7 +464,7 @@ JOKER_DATABASE = {
             )),
         ]
     ),
-    "J_ACROBAT": Joker(
+    "J_ACROBAT": JokerTemplate(
         id="J_ACROBAT",
         name="Acrobat",
         description="x3 Mult on final played set of the round",
@@ -459,7 +475,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_ROUGH_GEM": Joker(
+    "J_ROUGH_GEM": JokerTemplate(
         id="J_ROUGH_GEM",
         name="Rough Gem",
         description="Played Green cards earn $1",
@@ -470,18 +486,18 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_BLOODSTONE": Joker(
+    "J_BLOODSTONE": JokerTemplate(
         id="J_BLOODSTONE",
         name="Bloodstone",
         description="Played Red cards have a 1 in 2 chance to give x1.5 Mult",
         rarity="Uncommon",
         abilities=[
             JokerAbility(trigger=JokerTrigger.ON_SCORE_CARD, ability=lambda j, ctx: (
-                setattr(ctx.scoring, 'multiplicative_mult', ctx.scoring.multiplicative_mult * 1.5) if ctx.scoring.current_scoring_card.attributes[0] == 0 and random.random() < 0.5 else None
+                setattr(ctx.scoring, 'multiplicative_mult', ctx.scoring.multiplicative_mult * 1.5) if ctx.scoring.current_scoring_card.attributes[0] == 0 and ctx.chance(0.5) else None
             ))
         ]
     ),
-    "J_ONYX": Joker(
+    "J_ONYX": JokerTemplate(
         id="J_ONYX",
         name="Onyx",
         description="Played Magenta cards give +50 Chips",
@@ -492,7 +508,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_FLOWER": Joker(
+    "J_FLOWER": JokerTemplate(
         id="J_FLOWER",
         name="Flower Pot",
         description="x3 Mult if played set containsa Green, a Red, and a Magenta card",
@@ -505,7 +521,7 @@ JOKER_DATABASE = {
             ))
         ]
     ),
-    "J_WEE": Joker(
+    "J_WEE": JokerTemplate(
         id="J_WEE",
         name="Wee Joker",
         description="This Joker gains +8 Chips for each played Single Triangle card",
@@ -1,6 +1,10 @@
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, GetCoreSchemaHandler, GetJsonSchemaHandler, PrivateAttr
+from pydantic_core import core_schema
+import copy
+import itertools
+import random
 
 class JokerTrigger(Enum):
     ON_SCORE_CALCULATION = "on_score_calculation"
@@ -38,31 +42,61 @@ class ScoreLogEntry(BaseModel):
     mult_after: float
     trigger_phase: str = "unknown"  # 'card_scoring', 'end_scoring'
 
-class ScoringContext(BaseModel):
+# The scoring kernel and the abilities work on the plain classes below, which are created for
+# every action and scored card; pydantic models are kept for what is sent to the client and saved.
+
+class ScoringContext:
     """Holds the values being calculated during scoring."""
-    base_chips: int
-    base_mult: float
-    flat_chips: int
-    additive_mult: float
-    multiplicative_mult: float
-    uniform_features: int
-    ladder_features: int
-    set_type_string: str
-    score_log: List[ScoreLogEntry] = []
-    current_scoring_card: Optional['Card'] = None  # The card currently being scored (for ON_SCORE_CARD triggers)
-    scoring_cards: List['Card']
-
-class ConsumableContext(BaseModel):
+    __slots__ = ("base_chips", "base_mult", "flat_chips", "additive_mult", "multiplicative_mult", "uniform_features",
+                 "ladder_features", "set_type_string", "score_log", "current_scoring_card", "scoring_cards")
+
+    def __init__(self, base_chips: int, base_mult: float, flat_chips: int, additive_mult: float, multiplicative_mult: float,
+                 uniform_features: int, ladder_features: int, set_type_string: str, scoring_cards: List['Card'],
+                 score_log: Optional[List[ScoreLogEntry]] = None, current_scoring_card: Optional['Card'] = None):
+        self.base_chips = base_chips
+        self.base_mult = base_mult
+        self.flat_chips = flat_chips
+        self.additive_mult = additive_mult
+        self.multiplicative_mult = multiplicative_mult
+        self.uniform_features = uniform_features
+        self.ladder_features = ladder_features
+        self.set_type_string = set_type_string
+        self.score_log: List[ScoreLogEntry] = score_log if score_log is not None else []
+        self.current_scoring_card = current_scoring_card  # The card currently being scored (for ON_SCORE_CARD triggers)
+        self.scoring_cards = scoring_cards
+
+class ConsumableContext:
     """A container for passing context to consumable abilities."""
-    game: 'GameState'
-    message: str
+    __slots__ = ("game", "message")
 
-class GameContext(BaseModel):
+    def __init__(self, game: 'GameState', message: str):
+        self.game = game
+        self.message = message
+
+class GameContext:
     """A container for passing game state and other context to abilities."""
-    game: 'GameState'
-    scoring: Optional[ScoringContext] = None
-    consumable: Optional[ConsumableContext] = None
-    selected_card_indices: List[int] = []
+    __slots__ = ("game", "scoring", "consumable", "selected_card_indices", "rng")
+
+    def __init__(self, game: 'GameState', scoring: Optional[ScoringContext] = None, consumable: Optional[ConsumableContext] = None,
+                 selected_card_indices: Optional[List[int]] = None, rng: Optional[Any] = None):
+        self.game = game
+        self.scoring = scoring
+        self.consumable = consumable
+        self.selected_card_indices: List[int] = selected_card_indices if selected_card_indices is not None else []
+        # Source of the random rolls of abilities; None rolls with the global `random` module
+        self.rng = rng
+
+    def chance(self, probability: float) -> bool:
+        """True with the given probability, e.g. `ctx.chance(0.25)` for a 1 in 4 chance."""
+        if self.rng is not None:
+            return self.rng.chance(probability)
+        return random.random() < probability
+
+    def randint(self, low: int, high: int) -> int:
+        """A uniform integer in [low, high], like `random.randint`."""
+        if self.rng is not None:
+            return self.rng.randint(low, high)
+        return random.randint(low, high)
 
 class JokerAbility(BaseModel):
     trigger: JokerTrigger
@@ -74,6 +108,50 @@ class ConsumableAbility(BaseModel):
     ability: Callable[['ConsumableCard', GameContext], None]
     class Config: arbitrary_types_allowed = True
 
+# Registries filled by balatro_set_cards at import time
+JOKER_TEMPLATES: Dict[str, 'JokerTemplate'] = {}
+JOKER_VARIANT_ABILITIES: Dict[JokerVariant, Tuple[JokerAbility, ...]] = {}
+_RESOLVED_ABILITIES: Dict[Tuple[str, JokerVariant], Tuple[JokerAbility, ...]] = {}
+
+def resolve_joker_abilities(joker_id: str, variant: JokerVariant) -> Tuple[JokerAbility, ...]:
+    """Template abilities followed by the variant abilities, shared by every joker with the same id and variant."""
+    key = (joker_id, variant)
+    abilities = _RESOLVED_ABILITIES.get(key)
+    if abilities is None:
+        abilities = JOKER_TEMPLATES[joker_id].abilities + JOKER_VARIANT_ABILITIES.get(variant, ())
+        _RESOLVED_ABILITIES[key] = abilities
+    return abilities
+
+class JokerTemplate(BaseModel):
+    """Immutable joker definition. Shop and owned jokers are `Joker` instances pointing at it by id."""
+    model_config = ConfigDict(frozen=True, arbitrary_types_allowed=True)
+
+    id: str
+    name: str
+    description: str
+    rarity: str
+
+    display_badge: Optional[str] = None
+    calculate_display_badge: Optional[Callable[['Joker', GameContext], Optional[str]]] = None
+
+    custom_data: Dict[str, Any] = Field(default_factory=dict)
+
+    abilities: Tuple[JokerAbility, ...] = ()
+
+    def model_post_init(self, __context: Any):
+        JOKER_TEMPLATES[self.id] = self
+
+    def instantiate(self, variant: JokerVariant = JokerVariant.BASIC) -> 'Joker':
+        return Joker(
+            id=self.id,
+            name=self.name,
+            description=self.description,
+            rarity=self.rarity,
+            variant=variant,
+            display_badge=self.display_badge,
+            custom_data=copy.deepcopy(self.custom_data),
+        )
+
 class Joker(BaseModel):
     id: str
     name: str
@@ -83,15 +161,23 @@ class Joker(BaseModel):
     variant: JokerVariant = JokerVariant.BASIC
 
     display_badge: Optional[str] = None
-    calculate_display_badge: Callable[['Joker', GameContext], Optional[str]] = None
 
     custom_data: Dict[str, Any] = Field(default_factory=dict, exclude=True)
 
-    abilities: List[JokerAbility] = Field([], exclude=True)
+    @property
+    def template(self) -> JokerTemplate:
+        return JOKER_TEMPLATES[self.id]
+
+    @property
+    def abilities(self) -> Tuple[JokerAbility, ...]:
+        return resolve_joker_abilities(self.id, self.variant)
+
+    @property
+    def calculate_display_badge(self) -> Optional[Callable[['Joker', GameContext], Optional[str]]]:
+        return self.template.calculate_display_badge
 
     def copy(self, **kwargs):
-        new_abilities = [a.copy(deep=True) for a in self.abilities]
-        return super().copy(update={'abilities': new_abilities}, **kwargs)
+        return super().copy(update={'custom_data': copy.deepcopy(self.custom_data)}, **kwargs)
 
 class ConsumableCard(BaseModel):
     id: str
@@ -102,9 +188,74 @@ class ConsumableCard(BaseModel):
     abilities: List[ConsumableAbility] = Field([], exclude=True)
     target_count: int = 0
 
-class Card(BaseModel):
-    attributes: List[int]
-    enhancement: Optional[str] = None
+def card_code(attributes) -> int:
+    """Packs card attributes into a small int: the base-3 code of the plain attributes (0..80, the
+    same as balatro_set_core.b_card_code for plain cards), plus a bit per wild (-1) attribute from bit 7."""
+    code = 0
+    for i, value in enumerate(attributes):
+        if value == -1:
+            code |= 1 << (7 + i)
+        else:
+            code += value * 3 ** (3 - i)
+    return code
+
+# Attributes of every card code, shared by all cards with that code
+CODE_ATTRIBUTES: Dict[int, Tuple[int, ...]] = {
+    card_code(attributes): attributes for attributes in itertools.product((-1, 0, 1, 2), repeat=4)
+}
+
+class Card:
+    """A set card: its attributes as a `card_code` and an optional enhancement.
+
+    Validated from and dumped to `{"attributes": [...], "enhancement": ...}` inside pydantic models.
+    """
+    __slots__ = ("code", "enhancement")
+
+    def __init__(self, attributes=None, enhancement: Optional[str] = None, code: Optional[int] = None):
+        self.code = code if code is not None else card_code(attributes)
+        self.enhancement = enhancement
+
+    @property
+    def attributes(self) -> Tuple[int, ...]:
+        return CODE_ATTRIBUTES[self.code]
+
+    @attributes.setter
+    def attributes(self, attributes):
+        self.code = card_code(attributes)
+
+    def copy(self) -> 'Card':
+        return Card(code=self.code, enhancement=self.enhancement)
+
+    def model_dump(self) -> dict:
+        return {"attributes": list(CODE_ATTRIBUTES[self.code]), "enhancement": self.enhancement}
+
+    @classmethod
+    def validate(cls, value: Any) -> 'Card':
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            return cls(attributes=value["attributes"], enhancement=value.get("enhancement"))
+        raise ValueError("A card must be a Card or a dict with its attributes.")
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls.validate, serialization=core_schema.plain_serializer_function_ser_schema(cls.model_dump))
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema: core_schema.CoreSchema, handler: GetJsonSchemaHandler) -> Dict[str, Any]:
+        return {"type": "object", "properties": {"attributes": {"type": "array", "items": {"type": "integer"}},
+                                                 "enhancement": {"type": ["string", "null"]}}}
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Card):
+            return NotImplemented
+        return self.code == other.code and self.enhancement == other.enhancement
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Card(attributes={list(self.attributes)}, enhancement={self.enhancement!r})"
 
 class ShopSlot(BaseModel):
     item: Optional[Joker]
@@ -158,6 +309,24 @@ class GameState(BaseModel):
     pack_opening_state: Optional[PackOpeningState] = None
     game_phase: str = "playing"
     run_won: bool = False
+    # Game rule: a board without any set is redealt automatically
+    auto_refresh_dead_board: bool = False
+    # Bumped by every action, see balatro_set_sync
+    version: int = 0
+
+    # JokerTrigger -> [(joker, ability)], see balatro_set_core.get_joker_dispatch
+    _joker_dispatch: Optional[Dict[JokerTrigger, List[Any]]] = PrivateAttr(default=None)
+    # balatro_set_core.BoardSetIndex of the board, see balatro_set_engine.board_set_count
+    _board_index: Optional[Any] = PrivateAttr(default=None)
+    # Section name -> cached dump, see balatro_set_serialize. A missing section is dirty.
+    _sections: Dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    def mark_dirty(self, *sections: str):
+        """Drops the serializer's cache of the given sections, or of all of them."""
+        if not sections:
+            self._sections.clear()
+        for section in sections:
+            self._sections.pop(section, None)
 
     def model_dump(self, **kwargs):
         """Custom model dump to exclude abilities from serialization."""
@@ -166,12 +335,10 @@ class GameState(BaseModel):
         
         dump = super().model_dump(**kwargs)
 
-        # Exclude the 'abilities' field from jokers and consumables as they are not JSON serializable
         if 'jokers' in dump:
             for idx, joker in enumerate(dump['jokers']):
-                joker.pop('abilities', None)
-                joker.pop('calculate_display_badge', None)
                 joker["custom_data"] = self.jokers[idx].custom_data  # Ensure custom data is included
+        # Exclude the 'abilities' field from consumables as they are not JSON serializable
         if 'consumables' in dump:
             for consumable in dump['consumables']:
                 consumable.pop('abilities', None)
@@ -180,12 +347,6 @@ class GameState(BaseModel):
         if 'pack_opening_state' in dump and dump['pack_opening_state']:
             # No un-serializable fields in PackOpeningState, but good practice
             pass
-        if 'shop_state' in dump:
-            for slot in dump['shop_state']['joker_slots']:
-                item = slot.get('item')
-                if item:
-                    item.pop('abilities', None)
-                    item.pop('calculate_display_badge', None)
 
         return dump
     
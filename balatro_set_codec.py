@@ -0,0 +1,184 @@
+"""Compact binary save file for Balatro games (balatro-saves.bin).
+
+Each card is packed into a uint16: its `card_code` (id 0..80 plus a bit per wild attribute) in
+the low 11 bits and its enhancement, as an index into the file's enhancement table, in the top
+5 bits. The deck, board and discard pile are arrays of these. Jokers are stored as template id,
+variant and `custom_data`, consumables by id; the remaining scalar fields and the rarely present
+shop and pack are small JSON blobs. JSON (`model_dump`) stays the export format.
+
+File layout, little-endian:
+    b"BSAV", u16 schema version, u8 enhancement count, enhancements as u8 length + utf-8
+    (the first one is "no enhancement"), u32 game count, then per game a u32 length + record.
+Files written with an older schema are decoded and then upgraded by MIGRATIONS.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from balatro_set_classes import Card, GameState, JokerVariant
+from balatro_set_serialize import dump_scalars, encode_json, encoded_section
+
+MAGIC = b"BSAV"
+SCHEMA_VERSION = 1
+# Enhancements set by the scoring kernel, jokers and tarots. Others are added to a file's table as they are met.
+ENHANCEMENTS = (None, "bonus_chips", "bonus_mult", "x_mult", "gold", "wildcard", "amplify",
+                "lucky", "mult", "bonus", "steel", "glass")
+CODE_BITS = 11
+MAX_ENHANCEMENTS = 1 << (16 - CODE_BITS)
+VARIANTS = tuple(JokerVariant)
+PILES = ("deck", "board", "discard_pile")
+
+# MIGRATIONS[v] upgrades a game decoded from schema v to schema v + 1 (its card piles are lists of Card)
+MIGRATIONS: Dict[int, Callable[[dict], dict]] = {}
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_HEADER = struct.Struct("<4sHB")
+
+class SaveFormatError(ValueError):
+    """A save file that is not a Balatro save or was written by a newer version."""
+
+#%% --- Encoding ---
+def enhancement_table() -> Dict[Optional[str], int]:
+    """Enhancement -> index, shared by the records of one file and extended while encoding them."""
+    return {enhancement: i for i, enhancement in enumerate(ENHANCEMENTS)}
+
+def enhancement_index(enhancements: Dict[Optional[str], int], enhancement: Optional[str]) -> int:
+    index = enhancements.get(enhancement)
+    if index is None:
+        if len(enhancements) >= MAX_ENHANCEMENTS:
+            raise SaveFormatError(f"More than {MAX_ENHANCEMENTS} enhancements in one save file.")
+        index = enhancements[enhancement] = len(enhancements)
+    return index
+
+def pack_cards(cards: List[Card], enhancements: Dict[Optional[str], int]) -> bytes:
+    # Most cards have no enhancement, and index 0 needs no bits
+    packed = array("H", [card.code if card.enhancement is None else card.code | enhancement_index(enhancements, card.enhancement) << CODE_BITS
+                         for card in cards])
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return _U16.pack(len(packed)) + packed.tobytes()
+
+def short_str(value: str) -> bytes:
+    data = value.encode()
+    return _U8.pack(len(data)) + data
+
+def blob(data: bytes) -> bytes:
+    return _U32.pack(len(data)) + data
+
+def encode_record(game: GameState, enhancements: Dict[Optional[str], int]) -> bytes:
+    """One game of the save file. Cheap enough to run for every game on every save."""
+    cache = game._sections
+    parts = [blob(encode_json(dump_scalars(game)))]
+    parts.extend(pack_cards(getattr(game, name), enhancements) for name in PILES)
+    parts.append(_U8.pack(len(game.jokers)))
+    for joker in game.jokers:
+        parts.append(short_str(joker.id) + _U8.pack(VARIANTS.index(joker.variant)) + blob(encode_json(joker.custom_data)))
+    parts.append(_U8.pack(len(game.consumables)))
+    parts.extend(short_str(consumable.id) for consumable in game.consumables)
+    parts.append(blob(encoded_section(game, cache, "shop_state")))
+    parts.append(blob(encoded_section(game, cache, "pack_opening_state")))
+    return b"".join(parts)
+
+def encode_saves(records: Dict[str, bytes], enhancements: Dict[Optional[str], int]) -> bytes:
+    """The save file of records encoded with `encode_record` and the same enhancement table."""
+    table = sorted(enhancements, key=enhancements.get)
+    parts = [_HEADER.pack(MAGIC, SCHEMA_VERSION, len(table))]
+    parts.extend(short_str(enhancement or "") for enhancement in table)
+    parts.append(_U32.pack(len(records)))
+    parts.extend(blob(record) for record in records.values())
+    return b"".join(parts)
+
+def write_saves(path: str, records: Dict[str, bytes], enhancements: Dict[Optional[str], int]) -> int:
+    """Writes the file next to `path` and moves it into place, so readers never see half a file. Returns its size."""
+    tmp_path = path + ".tmp"
+    data = encode_saves(records, enhancements)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+#%% --- Decoding ---
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def unpack(self, fmt: struct.Struct) -> int:
+        if self.pos + fmt.size > len(self.data):
+            raise SaveFormatError("Truncated save file.")
+        value, = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return value
+
+    def take(self, size: int) -> bytes:
+        if self.pos + size > len(self.data):
+            raise SaveFormatError("Truncated save file.")
+        value = bytes(self.data[self.pos:self.pos + size])
+        self.pos += size
+        return value
+
+    def short_str(self) -> str:
+        return self.take(self.unpack(_U8)).decode()
+
+    def blob(self) -> bytes:
+        return self.take(self.unpack(_U32))
+
+    def cards(self, enhancements: List[Optional[str]]) -> List[Card]:
+        packed = array("H", self.take(2 * self.unpack(_U16)))
+        if sys.byteorder == "big":
+            packed.byteswap()
+        mask = (1 << CODE_BITS) - 1
+        return [Card(code=value & mask, enhancement=enhancements[value >> CODE_BITS]) for value in packed]
+
+def decode_record(record: Reader, enhancements: List[Optional[str]]) -> dict:
+    """A game as the `model_dump()` dict `balatro_set_engine.game_state_from_dict` reads.
+
+    The card piles are lists of Card rather than of card dicts, which are slower to build and parse back.
+    """
+    game = json.loads(record.blob())
+    for name in PILES:
+        game[name] = record.cards(enhancements)
+    game["jokers"] = []
+    for _ in range(record.unpack(_U8)):
+        joker_id = record.short_str()
+        variant = VARIANTS[record.unpack(_U8)]
+        game["jokers"].append({"id": joker_id, "variant": variant.value, "custom_data": json.loads(record.blob())})
+    game["consumables"] = [{"id": record.short_str()} for _ in range(record.unpack(_U8))]
+    game["shop_state"] = json.loads(record.blob())
+    game["pack_opening_state"] = json.loads(record.blob())
+    return game
+
+def decode_saves(data) -> Dict[str, dict]:
+    """id -> game dump of a save file's bytes (or any buffer, such as a memory map)."""
+    if len(data) < _HEADER.size:
+        raise SaveFormatError("Truncated save file.")
+    reader = Reader(data)
+    magic, version, n_enhancements = _HEADER.unpack_from(data, 0)
+    reader.pos = _HEADER.size
+    if magic != MAGIC:
+        raise SaveFormatError("Not a Balatro save file.")
+    if version > SCHEMA_VERSION:
+        raise SaveFormatError(f"Save file schema {version} is newer than this server's {SCHEMA_VERSION}.")
+    enhancements = [reader.short_str() or None for _ in range(n_enhancements)]
+
+    games = {}
+    for _ in range(reader.unpack(_U32)):
+        game = decode_record(Reader(reader.blob()), enhancements)
+        for schema in range(version, SCHEMA_VERSION):
+            game = MIGRATIONS[schema](game)
+        games[game["id"]] = game
+    return games
+
+def read_saves(path: str) -> Dict[str, dict]:
+    """Decodes the save file at `path` through a memory map instead of reading it into memory first."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise SaveFormatError("Empty save file.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decode_saves(data)
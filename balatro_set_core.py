@@ -1,10 +1,19 @@
+import math
 import random
 import itertools
-from typing import List, Any, Optional
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, List, Any, Optional
 
-from balatro_set_classes import GameState, GameContext, ScoreLogEntry
-from balatro_set_classes import Joker, JokerAbility, JokerTrigger, JokerVariant
-from balatro_set_classes import ConsumableCard, ConsumableTrigger, ConsumableContext, ConsumableAbility
+from balatro_set_classes import GameState, GameContext
+from balatro_set_classes import Joker, JokerAbility, JokerTemplate, JokerTrigger, JokerVariant
+from balatro_set_classes import ConsumableCard, ConsumableTrigger, ConsumableAbility
+from balatro_set_logging import trace_enabled, trace_event
+from balatro_set_metrics import record_joker_trigger, record_set_search
+
+if TYPE_CHECKING:
+    # balatro_set_scoring imports this module
+    from balatro_set_scoring import ScoreTracer
 
 #%% --- Game Logic ---
 def get_joker_by_name(game_state: 'GameState', name: str) -> Optional['Joker']:
@@ -46,8 +55,212 @@ def b_is_set(cards: List[List[int]]):
             
     return True
 
-GameContext.model_rebuild()
-ConsumableContext.model_rebuild()
+def b_split_wildcards(cards: List[List[int]]) -> tuple[List[int], List[int], List[int]]:
+    """Splits card indices into (plain, partially wild, fully wild) cards."""
+    plain, partial, wild = [], [], []
+    for i, card in enumerate(cards):
+        n_wild = card.count(-1)
+        if n_wild == 0:
+            plain.append(i)
+        elif n_wild == len(card):
+            wild.append(i)
+        else:
+            partial.append(i)
+    return plain, partial, wild
+
+def b_card_code(card) -> int:
+    """Base-3 code of a plain card, 0..80."""
+    return card[0] * 27 + card[1] * 9 + card[2] * 3 + card[3]
+
+# _THIRD_CARD[a][b] is the code of the only card completing a set with the plain cards coded a and b:
+# per attribute, the same value if both are equal, else the missing one
+_THIRD_CARD = [[b_card_code([(-x - y) % 3 for x, y in zip(a, b)]) for b in itertools.product(range(3), repeat=4)]
+               for a in itertools.product(range(3), repeat=4)]
+
+def b_third_code(a: int, b: int) -> int:
+    """Code of the card completing a set with the plain cards coded a and b."""
+    return _THIRD_CARD[a][b]
+
+def _plain_sets(cards: List[List[int]], plain: List[int]):
+    """Yields the sorted index triples of sets among plain cards, completing every pair in O(n^2)."""
+    codes = [b_card_code(cards[i]) for i in plain]
+    positions: dict[int, List[int]] = {}
+    for i, code in zip(plain, codes):
+        positions.setdefault(code, []).append(i)
+    for a, i in enumerate(plain):
+        thirds = _THIRD_CARD[codes[a]]
+        for b in range(a + 1, len(plain)):
+            ks = positions.get(thirds[codes[b]])
+            if ks:
+                j = plain[b]
+                for k in ks:
+                    if k > j:
+                        yield (i, j, k)
+
+def _partial_sets(cards: List[List[int]], plain: List[int], partial: List[int]) -> set[tuple[int, int, int]]:
+    """Sets with at least one partially wild card and no fully wild card (only made by tarots, so rare).
+
+    A partial card completes a plain pair if the pair's third card matches it on its non-wild
+    attributes; triples with two or more partial cards are checked directly.
+    """
+    found = set()
+    matches = {
+        p: {b_card_code(code) for code in itertools.product(*[range(3) if v == -1 else (v,) for v in cards[p]])}
+        for p in partial
+    }
+    codes = [b_card_code(cards[i]) for i in plain]
+    for a, i in enumerate(plain):
+        thirds = _THIRD_CARD[codes[a]]
+        for b in range(a + 1, len(plain)):
+            third = thirds[codes[b]]
+            for p in partial:
+                if third in matches[p]:
+                    found.add(tuple(sorted((i, plain[b], p))))
+    candidates = sorted(plain + partial)
+    for p, q in itertools.combinations(partial, 2):
+        for k in candidates:
+            if k != p and k != q and b_is_set([cards[p], cards[q], cards[k]]):
+                found.add(tuple(sorted((p, q, k))))
+    return found
+
+def b_find_sets(cards: List[List[int]]) -> List[tuple[int, int, int]]:
+    """Returns the sorted index triples of every (wildcard-aware) set among the given card attributes.
+
+    Plain cards use third-card completion, so the search is quadratic rather than cubic. A fully wild
+    card makes a set with any two other cards, so those triples are listed directly.
+    """
+    record_set_search("b_find_sets", len(cards))
+    plain, partial, wild = b_split_wildcards(cards)
+    found = list(_plain_sets(cards, plain))
+    if partial:
+        found.extend(_partial_sets(cards, plain, partial))
+    if wild:
+        n = len(cards)
+        is_wild = [False] * n
+        for w in wild:
+            is_wild[w] = True
+        for i in range(n):
+            for j in range(i + 1, n):
+                if is_wild[i] or is_wild[j]:
+                    found.extend((i, j, k) for k in range(j + 1, n))
+                else:
+                    found.extend((i, j, k) for k in wild if k > j)
+    found.sort()
+    return found
+
+def b_count_sets(cards: List[List[int]]) -> int:
+    """Number of sets among the cards, counting the triples with a fully wild card instead of listing them."""
+    record_set_search("b_count_sets", len(cards))
+    plain, partial, wild = b_split_wildcards(cards)
+    tame = len(cards) - len(wild)
+    count = sum(1 for _ in _plain_sets(cards, plain))
+    if partial:
+        count += len(_partial_sets(cards, plain, partial))
+    return count + math.comb(len(cards), 3) - math.comb(tame, 3)
+
+def b_has_set(cards: List[List[int]]) -> bool:
+    """True if the cards contain at least one set; stops at the first one."""
+    record_set_search("b_has_set", len(cards))
+    plain, partial, wild = b_split_wildcards(cards)
+    if wild:
+        return len(cards) >= 3
+    if next(_plain_sets(cards, plain), None) is not None:
+        return True
+    return bool(partial) and bool(_partial_sets(cards, plain, partial))
+
+_CODE_CARDS = [list(card) for card in itertools.product(range(3), repeat=4)]
+
+class BoardSetIndex:
+    """The number of sets on a board, kept up to date as cards leave and arrive.
+
+    `sync` diffs the board against the cards it has seen and only counts the sets through the
+    cards that changed: O(board) per plain card, via third-card completion over card codes.
+    """
+    def __init__(self):
+        self.cards: Counter = Counter()  # attribute tuples on the board
+        self.codes: Counter = Counter()  # plain card code -> count
+        self.partial: List[List[int]] = []
+        self.wild = 0
+        self.size = 0
+        self.set_count = 0
+
+    def sync(self, board: List[List[int]]) -> int:
+        """Brings the index up to `board` and returns its number of sets."""
+        record_set_search("board_index", len(board))
+        current = Counter(map(tuple, board))
+        if current == self.cards:
+            return self.set_count
+        for card in list(self.cards):
+            for _ in range(self.cards[card] - current.get(card, 0)):
+                self._remove(list(card))
+                self.set_count -= self.sets_with(list(card))
+        for card, count in current.items():
+            for _ in range(count - self.cards.get(card, 0)):
+                self.set_count += self.sets_with(list(card))
+                self._add(list(card))
+        return self.set_count
+
+    def _add(self, card: List[int]):
+        self.cards[tuple(card)] += 1
+        self.size += 1
+        n_wild = card.count(-1)
+        if n_wild == 0:
+            self.codes[b_card_code(card)] += 1
+        elif n_wild == len(card):
+            self.wild += 1
+        else:
+            self.partial.append(card)
+
+    def _remove(self, card: List[int]):
+        self.cards[tuple(card)] -= 1
+        if not self.cards[tuple(card)]:
+            del self.cards[tuple(card)]
+        self.size -= 1
+        n_wild = card.count(-1)
+        if n_wild == 0:
+            code = b_card_code(card)
+            self.codes[code] -= 1
+            if not self.codes[code]:
+                del self.codes[code]
+        elif n_wild == len(card):
+            self.wild -= 1
+        else:
+            self.partial.remove(card)
+
+    def sets_with(self, card: List[int]) -> int:
+        """Number of sets `card` forms with two cards of the index (which doesn't contain it)."""
+        n_wild = card.count(-1)
+        if n_wild == len(card):
+            return math.comb(self.size, 2)
+        # Any pair with a fully wild card completes a set
+        count = self.wild * (self.size - self.wild) + math.comb(self.wild, 2)
+
+        # Pairs of plain cards: ordered pairs (c, d) with d the third card of (card, c)
+        codes = self.codes
+        ordered_pairs = 0
+        if n_wild == 0:
+            thirds = _THIRD_CARD[b_card_code(card)]
+            for c, k in codes.items():
+                d = thirds[c]
+                ordered_pairs += k * (k - 1) if d == c else k * codes.get(d, 0)
+        else:
+            # A partially wild card stands for every plain card matching its other attributes
+            matches = [b_card_code(code) for code in itertools.product(*[range(3) if v == -1 else (v,) for v in card])]
+            for c, k in codes.items():
+                for m in matches:
+                    d = _THIRD_CARD[c][m]
+                    ordered_pairs += k * (k - 1) if d == c else k * codes.get(d, 0)
+        count += ordered_pairs // 2
+
+        # Pairs with a partially wild card, checked directly (only made by tarots, so rare)
+        for i, q in enumerate(self.partial):
+            for c, k in self.codes.items():
+                if b_is_set([card, q, _CODE_CARDS[c]]):
+                    count += k
+            for r in self.partial[i + 1:]:
+                if b_is_set([card, q, r]):
+                    count += 1
+        return count
 
 ANTE_CONFIG = {
     1: {"scores": [300, 450, 600], "names": ["Small Blind", "Big Blind", "The Wall"], "boss_effects": [None, None, "debuff_first_joker"]},
@@ -67,8 +280,8 @@ PACK_RARITIES = {
     "Legendary": {"show": 5, "choose": 2, "weight": 2},
 }
 
-def get_random_joker_by_rarity(available_jokers: list[Joker]) -> Optional[Joker]:
-    """Selects a random joker based on weighted rarity."""
+def get_random_joker_by_rarity(available_jokers: list[JokerTemplate]) -> Optional[Joker]:
+    """Rolls a new joker instance from the given templates based on weighted rarity and variant."""
     if not available_jokers:
         return None
 
@@ -90,7 +303,7 @@ def get_random_joker_by_rarity(available_jokers: list[Joker]) -> Optional[Joker]
 
     weights = [rarity_weights[r] for r in possible_rarities]
     chosen_rarity = random.choices(possible_rarities, weights=weights, k=1)[0]
-    chosen_joker: Joker = random.choice(jokers_by_rarity[chosen_rarity])
+    chosen_template: JokerTemplate = random.choice(jokers_by_rarity[chosen_rarity])
 
     variant_weights = {
         JokerVariant.BASIC: 75,
@@ -102,24 +315,7 @@ def get_random_joker_by_rarity(available_jokers: list[Joker]) -> Optional[Joker]
 
     chosen_variant = random.choices(list(variant_weights.keys()), weights=list(variant_weights.values()),k=1)[0]
 
-    match chosen_variant:
-        case JokerVariant.BASIC:
-            pass
-        case JokerVariant.FOIL:
-            chosen_joker.variant = JokerVariant.FOIL
-            chosen_joker.abilities.append(JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: setattr(ctx.scoring, 'flat_chips', ctx.scoring.flat_chips + 50)))
-        case JokerVariant.HOLOGRAPHIC:
-            chosen_joker.variant = JokerVariant.HOLOGRAPHIC
-            chosen_joker.abilities.append(JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: setattr(ctx.scoring, 'additive_mult', ctx.scoring.additive_mult + 10)))
-        case JokerVariant.POLYCHROME:
-            chosen_joker.variant = JokerVariant.POLYCHROME
-            chosen_joker.abilities.append(JokerAbility(trigger=JokerTrigger.ON_SCORE_CALCULATION, ability=lambda j, ctx: setattr(ctx.scoring, 'multiplicative_mult', ctx.scoring.multiplicative_mult * 1.5)))
-        case JokerVariant.NEGATIVE:
-            chosen_joker.variant = JokerVariant.NEGATIVE
-            chosen_joker.abilities.append(JokerAbility(trigger=JokerTrigger.ON_BUY_SELF, ability= lambda j, ctx: setattr(ctx.game, 'joker_slots', ctx.game.joker_slots + 1)))
-            chosen_joker.abilities.append(JokerAbility(trigger=JokerTrigger.ON_DESTROY_SELF, ability= lambda j, ctx: setattr(ctx.game, 'joker_slots', ctx.game.joker_slots - 1)))
-
-    return chosen_joker
+    return chosen_template.instantiate(chosen_variant)
 
 
 def get_random_pack_rarity():
@@ -133,76 +329,113 @@ def get_current_blind_info(game: GameState) -> dict[str, Any]:
         return {"name": "Unknown", "score_required": 999999}
     return {"name": ante_info["names"][game.current_blind_index], "score_required": ante_info["scores"][game.current_blind_index]}
 
-def trigger_joker_abilities(game_ctx: GameContext, trigger: JokerTrigger):
-    active_jokers = game_ctx.game.jokers
-    if game_ctx.game.boss_blind_effect == "debuff_first_joker" and trigger == JokerTrigger.ON_SCORE_CALCULATION:
-        active_jokers = game_ctx.game.jokers[1:]
+def build_joker_dispatch(game: GameState) -> dict[JokerTrigger, list[tuple[Joker, JokerAbility]]]:
+    """Groups the (joker, ability) pairs of the owned jokers by trigger, in joker order."""
+    dispatch = {trigger: [] for trigger in JokerTrigger}
+    for idx, joker in enumerate(game.jokers):
+        for ability in joker.abilities:
+            # The Wall: the leftmost joker does not take part in the final score calculation
+            if idx == 0 and ability.trigger == JokerTrigger.ON_SCORE_CALCULATION and game.boss_blind_effect == "debuff_first_joker":
+                continue
+            dispatch[ability.trigger].append((joker, ability))
+    return dispatch
+
+def get_joker_dispatch(game: GameState) -> dict[JokerTrigger, list[tuple[Joker, JokerAbility]]]:
+    """Returns the cached dispatch table, building it if it was invalidated."""
+    if game._joker_dispatch is None:
+        game._joker_dispatch = build_joker_dispatch(game)
+    return game._joker_dispatch
+
+def invalidate_joker_dispatch(game: GameState):
+    """Must be called whenever the owned jokers, their order/variants or the boss blind effect change."""
+    game._joker_dispatch = None
+
+def trigger_joker_abilities(game_ctx: GameContext, trigger: JokerTrigger, tracer: Optional['ScoreTracer'] = None):
+    """Runs every owned joker ability for `trigger`.
 
+    Without a tracer (or outside of scoring) the abilities are simply called in order.
+    With a tracer, each change to chips/mult is described and handed to `tracer.log`.
+    Requests sampled by balatro_set_logging additionally emit one trace event per ability.
+    """
+    start = time.perf_counter()
+    abilities_to_run = get_joker_dispatch(game_ctx.game)[trigger]
     scoring_ctx = game_ctx.scoring if game_ctx.scoring else None
+    sampled = trace_enabled()
 
-    abilities_to_run = [(joker, ability) for joker in active_jokers for ability in joker.abilities if ability.trigger == trigger]
-    
-    print(f"Triggering {len(abilities_to_run)} joker abilities for trigger: {trigger.name}")
+    if not sampled and (tracer is None or scoring_ctx is None):
+        for joker, ability_def in abilities_to_run:
+            ability_def.ability(joker, game_ctx)
+        record_joker_trigger(trigger, len(abilities_to_run), time.perf_counter() - start)
+        return
+
+    if sampled:
+        trace_event("joker_trigger", trigger=trigger.name, abilities=len(abilities_to_run))
     
     # Determine trigger phase for logging
     trigger_phase = "end_scoring" if trigger == JokerTrigger.ON_SCORE_CALCULATION else "card_scoring"
     
     for joker, ability_def in abilities_to_run:
-        if scoring_ctx:
-            chips_before = scoring_ctx.base_chips + scoring_ctx.flat_chips
-            mult_before = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
-            flat_chips_before = scoring_ctx.flat_chips
-            additive_mult_before = scoring_ctx.additive_mult
-            multiplicative_mult_before = scoring_ctx.multiplicative_mult
+        if scoring_ctx is None:
+            ability_def.ability(joker, game_ctx)
+            trace_event("joker_ability", joker=joker.name, ability=ability_def.ability.__name__, trigger=trigger.name)
+            continue
+
+        chips_before = scoring_ctx.base_chips + scoring_ctx.flat_chips
+        mult_before = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
+        flat_chips_before = scoring_ctx.flat_chips
+        additive_mult_before = scoring_ctx.additive_mult
+        multiplicative_mult_before = scoring_ctx.multiplicative_mult
         
-        print(f"Running ability {ability_def.ability.__name__} for joker {joker.name} with trigger {trigger.name}")
         ability_def.ability(joker, game_ctx)
 
-        if scoring_ctx:
-            chips_after = scoring_ctx.base_chips + scoring_ctx.flat_chips
-            mult_after = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
+        chips_after = scoring_ctx.base_chips + scoring_ctx.flat_chips
+        mult_after = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
+        
+        # Check what specific changes were made
+        chips_change = scoring_ctx.flat_chips - flat_chips_before
+        additive_mult_change = scoring_ctx.additive_mult - additive_mult_before
+        multiplicative_mult_change = scoring_ctx.multiplicative_mult / multiplicative_mult_before
+        if sampled:
+            trace_event("joker_ability", joker=joker.name, ability=ability_def.ability.__name__, trigger=trigger.name,
+                        chips_before=chips_before, chips_after=chips_after, mult_before=mult_before, mult_after=mult_after)
+
+        if chips_change != 0 or additive_mult_change != 0 or abs(multiplicative_mult_change - 1) > 0.001:
+            description = ""
             
-            # Check what specific changes were made
-            chips_change = scoring_ctx.flat_chips - flat_chips_before
-            additive_mult_change = scoring_ctx.additive_mult - additive_mult_before
-            multiplicative_mult_change = scoring_ctx.multiplicative_mult / multiplicative_mult_before
-            print(f"Joker {joker.name} ability {ability_def.ability.__name__} changed chips from {chips_before} to {chips_after}, mult from {mult_before} to {mult_after}")
-
-            if chips_change != 0 or additive_mult_change != 0 or abs(multiplicative_mult_change - 1) > 0.001:
-                description = ""
-                
-                # Priority order: chips -> additive mult -> multiplicative mult
-                if chips_change > 0: 
-                    description = f"+{int(chips_change)} Chips"
-                elif chips_change < 0:
-                    description = f"{int(chips_change)} Chips"
-                elif additive_mult_change > 0:
-                    if isinstance(additive_mult_change, int) or additive_mult_change.is_integer():
-                         description = f"+{int(additive_mult_change)} Mult"
-                    else:
-                         description = f"+{additive_mult_change:.1f} Mult"
-                elif additive_mult_change < 0:
-                    if isinstance(additive_mult_change, int) or additive_mult_change.is_integer():
-                        description = f"{int(additive_mult_change)} Mult"
-                    else:
-                        description = f"{additive_mult_change:.1f} Mult"
-                elif abs(multiplicative_mult_change - 1) > 0.001:
-                    if multiplicative_mult_change.is_integer():
-                        description = f"x{int(multiplicative_mult_change)} Mult"
-                    else:
-                        description = f"x{multiplicative_mult_change:.1f} Mult"
-
-                if description:  # Only log if there's an actual change
-                    scoring_ctx.score_log.append(ScoreLogEntry(
-                        source_type='joker',
-                        source_name=joker.name,
-                        description=description.strip(),
-                        chips_before=chips_before,
-                        mult_before=mult_before,
-                        chips_after=chips_after,
-                        mult_after=mult_after,
-                        trigger_phase=trigger_phase
-                    ))
+            # Priority order: chips -> additive mult -> multiplicative mult
+            if chips_change > 0: 
+                description = f"+{int(chips_change)} Chips"
+            elif chips_change < 0:
+                description = f"{int(chips_change)} Chips"
+            elif additive_mult_change > 0:
+                if isinstance(additive_mult_change, int) or additive_mult_change.is_integer():
+                     description = f"+{int(additive_mult_change)} Mult"
+                else:
+                     description = f"+{additive_mult_change:.1f} Mult"
+            elif additive_mult_change < 0:
+                if isinstance(additive_mult_change, int) or additive_mult_change.is_integer():
+                    description = f"{int(additive_mult_change)} Mult"
+                else:
+                    description = f"{additive_mult_change:.1f} Mult"
+            elif abs(multiplicative_mult_change - 1) > 0.001:
+                if multiplicative_mult_change.is_integer():
+                    description = f"x{int(multiplicative_mult_change)} Mult"
+                else:
+                    description = f"x{multiplicative_mult_change:.1f} Mult"
+
+            if tracer and description:  # Only log if there's an actual change
+                tracer.log(
+                    scoring_ctx,
+                    source_type='joker',
+                    source_name=joker.name,
+                    description=description.strip(),
+                    chips_before=chips_before,
+                    mult_before=mult_before,
+                    chips_after=chips_after,
+                    mult_after=mult_after,
+                    trigger_phase=trigger_phase
+                )
+    record_joker_trigger(trigger, len(abilities_to_run), time.perf_counter() - start)
 
 def trigger_consumable_abilities(game: GameState, consumable: ConsumableCard, trigger: ConsumableTrigger, game_ctx: GameContext):
     abilities_to_run = [ability for ability in consumable.abilities if ability.trigger == trigger]
@@ -0,0 +1,687 @@
+import copy
+import itertools
+import math
+import random
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional
+
+from balatro_set_classes import Card, GameState, GameContext, ConsumableContext, ShopSlot, ShopState, BoosterPack
+from balatro_set_classes import PackOpeningChoice, PackOpeningState, Joker, JokerTrigger, JokerVariant, ConsumableTrigger
+from balatro_set_classes import JOKER_TEMPLATES
+from balatro_set_cards import JOKER_DATABASE, TAROT_DATABASE, JOKER_RARITY_PRICES, JOKER_VARIANT_PRICES_MULT
+from balatro_set_core import ANTE_CONFIG, PACK_RARITIES, BoardSetIndex
+from balatro_set_core import b_create_deck, b_find_sets, b_is_set, get_current_blind_info, get_random_joker_by_rarity, get_random_pack_rarity
+from balatro_set_core import trigger_joker_abilities, trigger_consumable_abilities, build_joker_dispatch, invalidate_joker_dispatch
+from balatro_set_metrics import not_recorded
+from balatro_set_scoring import ScoreDistribution, ScoreResult, ScoreTracer, ScriptedRandom, score_distribution, score_set
+from balatro_set_serialize import ROUND_SECTIONS
+
+# Game rules for the Balatro mode, independent of the HTTP layer in server.py.
+# Every action mutates the given GameState in place and raises GameActionError if it is not allowed.
+# Actions mark the sections they (and the jokers and tarots they trigger) change dirty for the serializer.
+
+class GameActionError(Exception):
+    """An action that is not allowed in the current game state. Maps to HTTP 400."""
+
+# Redeals in a row before a dead board is left as it is (the deck may not hold a set at all)
+MAX_BOARD_REFRESHES = 10
+STARTING_SET_TYPE_LEVELS = {"3_uniform_1_ladder": 2, "2_uniform_2_ladder": 2, "1_uniform_3_ladder": 2, "0_uniform_4_ladder": 2}
+
+#%% --- Setup & persistence ---
+def new_game(uid: str = "", auto_refresh_dead_board: bool = False) -> GameState:
+    deck_cards = [Card(attributes=attr) for attr in b_create_deck()]
+    random.shuffle(deck_cards)
+    game = GameState(
+        id=uid,
+        board_size=12, base_board_size=12, money=4, boards_remaining=4, discards_remaining=3, ante=1,
+        current_blind_index=0, game_phase="playing",
+        jokers=[],
+        set_type_levels=dict(STARTING_SET_TYPE_LEVELS),
+        auto_refresh_dead_board=auto_refresh_dead_board,
+    )
+    game.board = deck_cards[:game.board_size]
+    game.deck = deck_cards[game.board_size:]
+    refresh_dead_board(game)
+    return game
+
+def game_state_from_dict(uid: str, game_data: dict) -> GameState:
+    """Rebuilds a GameState from its `model_dump()`, re-attaching joker and tarot abilities by id."""
+    jokers: List[Joker] = []
+    for j in game_data.get("jokers", []):
+        if j["id"] in JOKER_TEMPLATES:
+            joker = JOKER_TEMPLATES[j["id"]].instantiate(JokerVariant(j["variant"]))
+            joker.custom_data = j.get("custom_data", joker.custom_data)
+            jokers.append(joker)
+
+    consumable_data = game_data.get("consumables", [])
+    consumables = [TAROT_DATABASE[c["id"]].copy() for c in consumable_data if c["id"] in TAROT_DATABASE]
+    game_state = GameState(
+        id=uid,
+        board_size=game_data.get("board_size", 12),
+        base_board_size=game_data.get("base_board_size", 12),
+        money=game_data.get("money", 4),
+        boards_remaining=game_data.get("boards_remaining", 4),
+        discards_remaining=game_data.get("discards_remaining", 3),
+        ante=game_data.get("ante", 1),
+        current_blind_index=game_data.get("current_blind_index", 0),
+        game_phase=game_data.get("game_phase", "playing"),
+        jokers=jokers,
+        consumables=consumables,
+        set_type_levels=game_data.get("set_type_levels", {}),
+        played_set_types=game_data.get("played_set_types", []),
+        boss_blind_effect=game_data.get("boss_blind_effect"),
+        boards_per_round=game_data.get("boards_per_round", 4),
+        discards_per_round=game_data.get("discards_per_round", 3),
+        joker_slots=game_data.get("joker_slots", 5),
+        consumable_slots=game_data.get("consumable_slots", 2),
+        run_won=game_data.get("run_won", False),
+        auto_refresh_dead_board=game_data.get("auto_refresh_dead_board", False),
+        version=game_data.get("version", 0),
+    )
+    game_state.board = [Card.validate(card) for card in game_data.get("board", [])]
+    game_state.deck = [Card.validate(card) for card in game_data.get("deck", [])]
+    game_state.discard_pile = [Card.validate(card) for card in game_data.get("discard_pile", [])]
+    game_state.round_score = game_data.get("round_score", 0)
+    last_used = game_data.get("last_consumable_used")
+    if last_used and last_used["id"] in TAROT_DATABASE:
+        game_state.last_consumable_used = TAROT_DATABASE[last_used["id"]].copy()
+    if game_data.get("shop_state"):
+        game_state.shop_state = ShopState.model_validate(game_data["shop_state"])
+        # Jokers are dumped without their custom_data, which a shop joker still has from its template
+        for slot in game_state.shop_state.joker_slots:
+            if slot.item is not None and slot.item.id in JOKER_TEMPLATES:
+                slot.item = JOKER_TEMPLATES[slot.item.id].instantiate(slot.item.variant)
+    if game_data.get("pack_opening_state"):
+        game_state.pack_opening_state = PackOpeningState.model_validate(game_data["pack_opening_state"])
+    return game_state
+
+def clone_game(game: GameState) -> GameState:
+    """A copy of `game` that actions can be applied to without touching the original.
+
+    Everything an action can mutate is copied: the card piles (cards are changed in place by
+    tarots and jokers), jokers, levels, the shop and the pack being opened.
+    """
+    clone = game.model_copy()
+    clone.deck = [card.copy() for card in game.deck]
+    clone.board = [card.copy() for card in game.board]
+    clone.discard_pile = [card.copy() for card in game.discard_pile]
+    clone.played_set_types = list(game.played_set_types)
+    clone.set_type_levels = dict(game.set_type_levels)
+    clone.consumables = list(game.consumables)
+    clone.jokers = [joker.copy() for joker in game.jokers]
+    clone.shop_state = game.shop_state.model_copy(deep=True)
+    if game.pack_opening_state is not None:
+        clone.pack_opening_state = game.pack_opening_state.model_copy(deep=True)
+    clone._joker_dispatch = None
+    clone._board_index = None
+    clone._sections = {}
+    return clone
+
+#%% --- Board ---
+def get_board_cards(game: GameState, card_indices: List[int]) -> List[Card]:
+    if len(set(card_indices)) != len(card_indices) or not all(0 <= i < len(game.board) for i in card_indices):
+        raise GameActionError("Invalid card selection.")
+    return [game.board[i] for i in card_indices]
+
+def remove_board_cards(game: GameState, card_indices: List[int]):
+    for i in sorted(card_indices, reverse=True):
+        game.board.pop(i)
+
+def refill_board(game: GameState):
+    """Draws back up to `board_size`, reshuffling the discard pile into the deck if it runs out."""
+    draw_count = max(0, game.board_size - len(game.board))
+    if len(game.deck) < draw_count:
+        game.deck.extend(game.discard_pile)
+        random.shuffle(game.deck)
+        game.discard_pile = []
+
+    new_cards = game.deck[:draw_count]
+    game.board.extend(new_cards)
+    game.deck = game.deck[draw_count:]
+
+def board_set_count(game: GameState) -> int:
+    """Number of sets on the board. Only the cards that changed since the last call are counted again."""
+    if game._board_index is None:
+        game._board_index = BoardSetIndex()
+    return game._board_index.sync([card.attributes for card in game.board])
+
+def is_dead_board(game: GameState) -> bool:
+    return board_set_count(game) == 0
+
+def refresh_dead_board(game: GameState) -> int:
+    """Applies the `auto_refresh_dead_board` rule: redeals a board without sets. Returns the number of redeals."""
+    refreshes = 0
+    while game.auto_refresh_dead_board and game.game_phase == "playing" and refreshes < MAX_BOARD_REFRESHES and is_dead_board(game):
+        game.discard_pile.extend(game.board)
+        game.board = []
+        refill_board(game)
+        refreshes += 1
+    return refreshes
+
+#%% --- Round actions ---
+def play_set(game: GameState, card_indices: List[int], tracer: Optional[ScoreTracer] = None) -> ScoreResult:
+    if game.game_phase != "playing":
+        raise GameActionError("Not in a playing phase.")
+    if len(card_indices) != 3:
+        raise GameActionError("Must select exactly 3 cards.")
+    if game.boards_remaining <= 0:
+        raise GameActionError("No boards remaining.")
+    selected_cards = get_board_cards(game, card_indices)
+    if not b_is_set([card.attributes for card in selected_cards]):
+        raise GameActionError("Not a valid set.")
+    game.mark_dirty(*ROUND_SECTIONS)
+
+    result = score_set(game, selected_cards, tracer=tracer)
+    game.round_score += result.score_gained
+
+    game.discard_pile.extend(selected_cards)
+    remove_board_cards(game, card_indices)
+    refill_board(game)
+    game.boards_remaining -= 1
+
+    blind_info = get_current_blind_info(game)
+    if game.round_score >= blind_info["score_required"]:
+        end_round(game)
+    elif game.boards_remaining <= 0:
+        game.game_phase = "game_over"
+    else:
+        refresh_dead_board(game)
+
+    return result
+
+def discard(game: GameState, card_indices: List[int]):
+    if game.game_phase != "playing":
+        raise GameActionError("Not in a playing phase.")
+    if not (1 <= len(card_indices) <= 5):
+        raise GameActionError("Must select between 1 and 5 cards to discard.")
+    if game.discards_remaining <= 0:
+        raise GameActionError("No discards remaining.")
+
+    selected_cards = get_board_cards(game, card_indices)
+    game.mark_dirty(*ROUND_SECTIONS)
+    game.discard_pile.extend(selected_cards)
+    remove_board_cards(game, card_indices)
+
+    trigger_joker_abilities(GameContext(game=game, selected_card_indices=card_indices), JokerTrigger.ON_DISCARD)
+
+    refill_board(game)
+    game.discards_remaining -= 1
+    refresh_dead_board(game)
+
+def use_consumable(game: GameState, consumable_index: int, target_card_indices: Optional[List[int]] = None) -> str:
+    if game.game_phase != "playing":
+        raise GameActionError("Can only use consumables during a round.")
+    if not (0 <= consumable_index < len(game.consumables)):
+        raise GameActionError("Invalid consumable index.")
+
+    consumable = game.consumables[consumable_index] # Don't pop yet
+
+    # Validation for target count
+    if consumable.target_count > 0:
+        if not target_card_indices or len(target_card_indices) != consumable.target_count:
+            raise GameActionError(f"This consumable requires selecting {consumable.target_count} card(s).")
+
+    # Now pop it
+    game.mark_dirty(*ROUND_SECTIONS)
+    consumable = game.consumables.pop(consumable_index)
+    game.last_consumable_used = consumable
+
+    consumable_ctx = ConsumableContext(game=game, message=f"Used {consumable.name}.")
+    game_ctx = GameContext(
+        game=game,
+        consumable=consumable_ctx,
+        selected_card_indices=target_card_indices or []
+    )
+    trigger_consumable_abilities(game, consumable, ConsumableTrigger.ON_USE, game_ctx)
+    # Consumables such as the Wheel of Fortune can change joker variants
+    invalidate_joker_dispatch(game)
+    # Trigger jokers on consumable use
+    trigger_joker_abilities(game_ctx, JokerTrigger.ON_CONSUMABLE_USE)
+    refresh_dead_board(game)
+    return game_ctx.consumable.message
+
+def end_round(game: GameState):
+    """Pays out the cleared blind and opens the shop."""
+    game.mark_dirty()
+    interest_cap = 5
+    interest_earned = min(game.money // 5, interest_cap)
+    game.money += interest_earned
+
+    trigger_joker_abilities(GameContext(game=game), JokerTrigger.ON_END_OF_ROUND)
+
+    game.game_phase = "shop"
+    game.money += 3 + game.boards_remaining
+    game.shop_state = generate_shop(game)
+
+#%% --- Previews ---
+class SetPreview(NamedTuple):
+    card_indices: tuple[int, int, int]
+    set_type: str
+    chips: float
+    mult: float
+    score: int
+    money_gained: int
+    # Only with expected=True: the exact mean of the score over every roll of the random jokers ...
+    expected_score: Optional[float] = None
+    # ... and the probability that the set alone clears the rest of the blind
+    clear_probability: Optional[float] = None
+
+@contextmanager
+def preserved_random_state():
+    """Restores the global RNG afterwards, so previews of random jokers don't change what the real play rolls."""
+    state = random.getstate()
+    try:
+        yield
+    finally:
+        random.setstate(state)
+
+def preview_sandbox(game: GameState) -> GameState:
+    """A copy-on-write view of `game` for the scoring kernel.
+
+    Fields the kernel only reads are shared with the game; the ones it writes (money is a plain
+    int on the copy, played set types, consumables and stateful jokers) are copied.
+    """
+    sandbox = game.model_copy()
+    sandbox.played_set_types = list(game.played_set_types)
+    sandbox.consumables = list(game.consumables)
+    # Only jokers with custom_data carry state the kernel can write
+    sandbox.jokers = [joker.model_copy(update={"custom_data": copy.deepcopy(joker.custom_data)}) if joker.custom_data else joker
+                      for joker in game.jokers]
+    sandbox._joker_dispatch = None
+    sandbox._sections = {}
+    return sandbox
+
+def preview_set(game: GameState, card_indices: List[int], expected: bool = False) -> SetPreview:
+    """Scores a set on the current board as `play_set` would, without changing the game.
+
+    The plain preview is one roll of the random jokers; `expected` adds the exact mean and clear
+    probability from `preview_distribution`.
+    """
+    selected_cards = get_board_cards(game, card_indices)
+    sandbox = preview_sandbox(game)
+    # Jokers such as Vampire and Midas Mask change the enhancement of the scored cards
+    with not_recorded():
+        result = score_set(sandbox, [card.copy() for card in selected_cards])
+    preview = SetPreview(
+        card_indices=tuple(card_indices),
+        set_type=result.scoring.set_type_string,
+        chips=result.chips,
+        mult=result.mult,
+        score=result.score_gained,
+        money_gained=sandbox.money - game.money,
+    )
+    if expected:
+        distribution = preview_distribution(game, card_indices)
+        preview = preview._replace(expected_score=distribution.mean,
+                                   clear_probability=distribution.probability_at_least(score_remaining(game)))
+    return preview
+
+def preview_sets(game: GameState, expected: bool = False) -> List[SetPreview]:
+    """Previews every valid set on the board, best (expected) score first."""
+    if game.game_phase != "playing":
+        raise GameActionError("Not in a playing phase.")
+    with preserved_random_state():
+        previews = [preview_set(game, list(combo), expected) for combo in b_find_sets([card.attributes for card in game.board])]
+    previews.sort(key=lambda preview: preview.expected_score if expected else preview.score, reverse=True)
+    return previews
+
+def preview_distribution(game: GameState, card_indices: List[int]) -> ScoreDistribution:
+    """The exact score distribution of a set over every roll of Misprint, Bloodstone, 8 Ball etc."""
+    selected_cards = get_board_cards(game, card_indices)
+    if len(selected_cards) != 3 or not b_is_set([card.attributes for card in selected_cards]):
+        raise GameActionError("Not a valid set.")
+
+    def score_once(rng: ScriptedRandom) -> int:
+        return score_set(preview_sandbox(game), [card.copy() for card in selected_cards], rng=rng).score_gained
+
+    # Rolls that don't go through the GameContext (which tarot 8 Ball creates) still use the global RNG
+    with preserved_random_state(), not_recorded():
+        return score_distribution(score_once)
+
+def score_remaining(game: GameState) -> int:
+    """Score still needed to clear the current blind."""
+    return max(0, get_current_blind_info(game)["score_required"] - game.round_score)
+
+#%% --- Joker order ---
+# Triggers whose joker order the scoring kernel sees
+SCORING_TRIGGERS = (JokerTrigger.ON_SCORE_CARD, JokerTrigger.ON_SCORE_CALCULATION)
+# Distinct orders scored by optimal_joker_order; with more, it searches locally from the current order
+MAX_JOKER_ORDERS = 120
+# Sets scored for every order: the best ones under the current order
+MAX_JOKER_ORDER_SETS = 8
+
+class JokerOrder(NamedTuple):
+    order: List[int]  # indices into game.jokers, as taken by reorder_jokers
+    expected_score: float  # expected score of the best set on the board with this order
+    current_expected_score: float
+    best_set: Optional[tuple[int, int, int]]
+    orders_evaluated: int
+    exhaustive: bool  # every distinct order was scored, rather than a local search
+
+def with_joker_order(game: GameState, order: List[int]) -> GameState:
+    """A shallow copy of `game` holding its jokers in the given order."""
+    ordered = game.model_copy(update={"jokers": [game.jokers[i] for i in order]})
+    ordered._joker_dispatch = None
+    ordered._sections = {}
+    return ordered
+
+def scoring_order_key(game: GameState) -> tuple:
+    """What the joker order means to the scoring kernel: the jokers each scoring trigger runs, in order.
+
+    Orders with the same key score the same. Jokers without scoring abilities don't appear, card
+    and end-of-scoring jokers are keyed separately (all card triggers run first), identical jokers
+    share a key and The Wall's debuffed slot is taken into account by the dispatch table.
+    """
+    dispatch = build_joker_dispatch(game)
+    return tuple(
+        tuple((joker.id, joker.variant, repr(joker.custom_data)) for joker, _ability in dispatch[trigger])
+        for trigger in SCORING_TRIGGERS
+    )
+
+def joker_order_candidates(game: GameState) -> Iterator[List[int]]:
+    """Joker orders that may score differently, the current one first.
+
+    Only jokers with scoring abilities are permuted, among the slots they hold. Where the others
+    sit only matters under The Wall, which debuffs the leftmost joker, so there every joker is
+    also tried in the leftmost slot.
+    """
+    n = len(game.jokers)
+    scoring = {i for i, joker in enumerate(game.jokers) if any(ability.trigger in SCORING_TRIGGERS for ability in joker.abilities)}
+    firsts: List[Optional[int]] = [None]
+    if game.boss_blind_effect == "debuff_first_joker":
+        firsts += range(1, n)
+    for first in firsts:
+        base = list(range(n)) if first is None else [first] + [i for i in range(n) if i != first]
+        slots = [slot for slot, i in enumerate(base) if i in scoring and (first is None or slot > 0)]
+        for permutation in itertools.permutations([base[slot] for slot in slots]):
+            order = list(base)
+            for slot, i in zip(slots, permutation):
+                order[slot] = i
+            yield order
+
+def moved_orders(order: List[int]) -> Iterator[List[int]]:
+    """Every order with one joker of `order` moved to another slot."""
+    for i in range(len(order)):
+        rest = order[:i] + order[i + 1:]
+        for j in range(len(order)):
+            if j != i:
+                yield rest[:j] + [order[i]] + rest[j:]
+
+def optimal_joker_order(game: GameState) -> JokerOrder:
+    """Searches the orders of the owned jokers for the highest expected score of the best set on the board.
+
+    Orders are pruned to one per distinct `scoring_order_key` before anything is scored; as chips
+    and mult are summed and multiplied separately, most orders tie. Up to MAX_JOKER_ORDERS of
+    them are all scored, otherwise the search moves one joker at a time from the current order
+    while that improves the score, until it has scored MAX_JOKER_ORDERS orders. Each order is
+    scored on the MAX_JOKER_ORDER_SETS best sets under the current order, with the exact expected
+    score of `preview_distribution`. CPU-bound: servers run it in the solver's worker processes.
+    """
+    if game.game_phase != "playing":
+        raise GameActionError("Not in a playing phase.")
+    sets = b_find_sets([card.attributes for card in game.board])
+    current_order = list(range(len(game.jokers)))
+
+    def key(order: List[int]) -> tuple:
+        return scoring_order_key(with_joker_order(game, order))
+
+    def evaluate(order: List[int], combos) -> tuple[float, float, Optional[tuple[int, int, int]]]:
+        """(best expected score, mean expected score over the sets, best set) for an order."""
+        if not combos:
+            return 0.0, 0.0, None
+        ordered = with_joker_order(game, order)
+        expected = {combo: preview_distribution(ordered, list(combo)).mean for combo in combos}
+        best_set = max(expected, key=expected.get)
+        return expected[best_set], sum(expected.values()) / len(expected), best_set
+
+    candidates: dict[tuple, List[int]] = {}
+    for order in joker_order_candidates(game):
+        # The current order comes first, so it represents its own key and wins ties
+        candidates.setdefault(key(order), order)
+        if len(candidates) > MAX_JOKER_ORDERS:
+            break
+    exhaustive = len(candidates) <= MAX_JOKER_ORDERS
+
+    with preserved_random_state():
+        current_key = next(iter(candidates))
+        current = {combo: preview_distribution(game, list(combo)).mean for combo in sets}
+        combos = sorted(current, key=current.get, reverse=True)[:MAX_JOKER_ORDER_SETS]
+        scores = {current_key: evaluate(current_order, combos)}
+        orders = {current_key: current_order}
+        if exhaustive:
+            for order_key, order in candidates.items():
+                if order_key not in scores:
+                    scores[order_key] = evaluate(order, combos)
+                    orders[order_key] = order
+        else:
+            best_key, improved = current_key, True
+            while improved and len(scores) < MAX_JOKER_ORDERS:
+                improved = False
+                for order in moved_orders(orders[best_key]):
+                    order_key = key(order)
+                    if order_key in scores:
+                        continue
+                    scores[order_key] = evaluate(order, combos)
+                    orders[order_key] = order
+                    if scores[order_key][:2] > scores[best_key][:2]:
+                        best_key, improved = order_key, True
+                        break
+                    if len(scores) >= MAX_JOKER_ORDERS:
+                        break
+    best_key = max(scores, key=lambda order_key: scores[order_key][:2])
+    return JokerOrder(
+        order=orders[best_key],
+        expected_score=scores[best_key][0],
+        current_expected_score=scores[current_key][0],
+        best_set=scores[best_key][2],
+        orders_evaluated=len(scores),
+        exhaustive=exhaustive,
+    )
+
+#%% --- Shop actions ---
+def get_joker_price(joker: Joker) -> int:
+    return math.ceil(JOKER_RARITY_PRICES.get(joker.rarity, 4) * JOKER_VARIANT_PRICES_MULT[joker.variant])
+
+def generate_shop(game: GameState) -> ShopState:
+    shop_state = ShopState()
+    owned_names = {j.name for j in game.jokers}
+    available_jokers = [j for j in JOKER_DATABASE.values() if j.name not in owned_names]
+
+    num_jokers_to_add = min(2, len(available_jokers))
+    for _ in range(num_jokers_to_add):
+        if not available_jokers:
+            break
+
+        joker_to_add = get_random_joker_by_rarity(available_jokers)
+        if not joker_to_add:
+            continue
+
+        available_jokers = [j for j in available_jokers if j.name != joker_to_add.name]
+        shop_state.joker_slots.append(ShopSlot(item=joker_to_add, price=get_joker_price(joker_to_add)))
+    shop_state.booster_pack_slots.append(BoosterPack(name="Celestial Pack", price=4))
+    shop_state.booster_pack_slots.append(BoosterPack(name="Tarot Pack", price=3))
+    return shop_state
+
+def buy_joker(game: GameState, slot_index: int) -> Joker:
+    if game.game_phase != "shop":
+        raise GameActionError("Not in a shop phase.")
+    if len(game.jokers) >= game.joker_slots:
+        raise GameActionError("No empty joker slots.")
+    if not (0 <= slot_index < len(game.shop_state.joker_slots)):
+        raise GameActionError("Invalid shop slot.")
+    slot = game.shop_state.joker_slots[slot_index]
+    if slot.is_purchased:
+        raise GameActionError("Item already purchased.")
+    if game.money < slot.price:
+        raise GameActionError("Not enough money.")
+
+    game.mark_dirty("jokers", "consumables", "shop_state")
+    joker_to_buy = slot.item.copy()
+
+    for ability_def in joker_to_buy.abilities:
+        if ability_def.trigger == JokerTrigger.ON_BUY_SELF:
+            ability_def.ability(joker_to_buy, GameContext(game=game))
+
+    game.money -= slot.price
+    game.jokers.append(joker_to_buy)
+    invalidate_joker_dispatch(game)
+    slot.is_purchased = True
+    trigger_joker_abilities(GameContext(game=game), JokerTrigger.ON_BUY_JOKER)
+    return joker_to_buy
+
+def sell_joker(game: GameState, joker_index: int) -> tuple[Joker, int]:
+    """Sells a joker for half of its price and returns (joker, sell_price)."""
+    if game.game_phase != "shop":
+        raise GameActionError("Can only sell jokers during the shop phase.")
+    if not (0 <= joker_index < len(game.jokers)):
+        raise GameActionError("Invalid joker index.")
+
+    game.mark_dirty("jokers", "consumables", "shop_state")
+    joker_to_sell = game.jokers.pop(joker_index)
+    invalidate_joker_dispatch(game)
+    # Trigger destroy-self abilities for the sold joker
+    for ability_def in joker_to_sell.abilities:
+        if ability_def.trigger == JokerTrigger.ON_DESTROY_SELF:
+            ability_def.ability(joker_to_sell, GameContext(game=game))
+    # Sell price is half of the rarity price, rounded down
+    sell_price = get_joker_price(joker_to_sell) // 2
+    game.money += sell_price
+    trigger_joker_abilities(GameContext(game=game), JokerTrigger.ON_DESTROY_JOKER)
+    return joker_to_sell, sell_price
+
+def reorder_jokers(game: GameState, new_order: List[int]):
+    if game.game_phase not in ["playing", "shop"]:
+        raise GameActionError("Can only reorder jokers during playing or shop phase.")
+    if len(new_order) != len(game.jokers) or set(new_order) != set(range(len(game.jokers))):
+        raise GameActionError("Invalid new order provided.")
+
+    game.jokers = [game.jokers[i] for i in new_order]
+    game.mark_dirty("jokers")
+    invalidate_joker_dispatch(game)
+
+def buy_booster_pack(game: GameState, slot_index: int):
+    if game.game_phase != "shop":
+        raise GameActionError("Not in a shop phase.")
+    if not (0 <= slot_index < len(game.shop_state.booster_pack_slots)):
+        raise GameActionError("Invalid pack slot.")
+    pack = game.shop_state.booster_pack_slots[slot_index]
+    if pack.is_purchased:
+        raise GameActionError("Pack already purchased.")
+    if game.money < pack.price:
+        raise GameActionError("Not enough money.")
+    if pack.name == "Tarot Pack" and len(game.consumables) >= game.consumable_slots:
+        raise GameActionError("Not enough consumable slots to open pack.")
+
+    game.mark_dirty("shop_state", "pack_opening_state")
+    game.money -= pack.price
+    pack.is_purchased = True
+
+    rarity = get_random_pack_rarity()
+    rarity_info = PACK_RARITIES[rarity]
+
+    choices = []
+    if pack.name == "Celestial Pack":
+        # Filter out the "4 Uniform, 0 Ladder" set type as it's practically unachievable.
+        all_set_types = [st for st in game.set_type_levels.keys() if st != "4_uniform_0_ladder"]
+        random.shuffle(all_set_types)
+
+        # Ensure we don't try to show more choices than available
+        num_to_show = min(rarity_info['show'], len(all_set_types))
+
+        for type_key in all_set_types[:num_to_show]:
+            level = game.set_type_levels[type_key]
+            name = type_key.replace("_", " ").replace("ladder", "L").replace("uniform", "U")
+            choices.append(PackOpeningChoice(id=type_key, name=f"Level up {name}", description=f"From Level {level} to {level + 1}"))
+    elif pack.name == "Tarot Pack":
+        available_tarots = list(TAROT_DATABASE.items())
+
+        for _ in range(rarity_info['show']):
+            if not available_tarots:
+                break
+
+            chosen_key, chosen_card = random.choice(available_tarots)
+            choices.append(PackOpeningChoice(id=chosen_key, name=chosen_card.name, description=chosen_card.description))
+
+            available_tarots = [(k, c) for k, c in available_tarots if k != chosen_key]
+
+    game.pack_opening_state = PackOpeningState(
+        pack_type=pack.name,
+        choices=choices,
+        rarity=rarity,
+        choose=rarity_info['choose']
+    )
+    game.game_phase = "pack_opening"
+
+def choose_pack_reward(game: GameState, selected_ids: List[str]) -> str:
+    if game.game_phase != "pack_opening":
+        raise GameActionError("Not in pack opening phase.")
+
+    pack_state = game.pack_opening_state
+    if len(selected_ids) > pack_state.choose:
+        raise GameActionError(f"Can only choose up to {pack_state.choose} rewards.")
+
+    game.mark_dirty("consumables", "pack_opening_state")
+    message = ""
+    if pack_state.pack_type == "Celestial Pack":
+        upgraded_names = []
+        for type_key in selected_ids:
+            game.set_type_levels[type_key] += 1
+            upgraded_names.append(type_key.replace("_", " ").replace("ladder", "L").replace("uniform", "U"))
+        message = f"Upgraded: {', '.join(upgraded_names)}!"
+    elif pack_state.pack_type == "Tarot Pack":
+        gained_cards = []
+        for card_key in selected_ids:
+            if len(game.consumables) < game.consumable_slots:
+                card = TAROT_DATABASE[card_key]
+                game.consumables.append(card)
+                gained_cards.append(card.name)
+        message = f"Gained: {', '.join(gained_cards)}!"
+
+    game.pack_opening_state = None
+    game.game_phase = "shop"
+    return message
+
+def leave_shop(game: GameState):
+    """Advances to the next blind (or wins the run) and deals a fresh board."""
+    if game.game_phase != "shop":
+        raise GameActionError("Not in a shop phase.")
+    game.mark_dirty()
+
+    game.current_blind_index += 1
+    if game.current_blind_index >= len(ANTE_CONFIG[game.ante]["names"]):
+        game.ante += 1
+        game.current_blind_index = 0
+        if game.ante > max(ANTE_CONFIG.keys()):
+            game.game_phase = "run_won"
+            return
+
+    game.game_phase = "playing"
+    game.round_score = 0
+    game.boards_remaining = game.boards_per_round
+    game.discards_remaining = game.discards_per_round
+    game.played_set_types = []
+    game.board_size = game.base_board_size
+
+    # Reshuffle all cards back into the deck
+    all_cards = game.deck + game.board + game.discard_pile
+    random.shuffle(all_cards)
+
+    game.board = all_cards[:game.board_size]
+    game.deck = all_cards[game.board_size:]
+    game.discard_pile = []
+
+    ante_info = ANTE_CONFIG.get(game.ante, {})
+    boss_effects = ante_info.get("boss_effects")
+    game.boss_blind_effect = boss_effects[game.current_blind_index] if boss_effects and game.current_blind_index < len(boss_effects) else None
+    invalidate_joker_dispatch(game)
+
+    if game.boss_blind_effect == "reduce_board_size":
+        game.board_size = 9
+        if len(game.board) > game.board_size:
+            cards_to_discard_count = len(game.board) - game.board_size
+            cards_to_discard = random.sample(game.board, cards_to_discard_count)
+            game.discard_pile.extend(cards_to_discard)
+            game.board = [card for card in game.board if card not in cards_to_discard]
+
+    trigger_joker_abilities(GameContext(game=game), JokerTrigger.ON_START_ROUND) #May not work correctly
+    refresh_dead_board(game)
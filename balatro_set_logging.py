@@ -0,0 +1,109 @@
+import contextvars
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Optional
+from uuid import uuid4
+
+#%% --- Configuration ---
+LOG_LEVEL = os.environ.get("BALATRO_LOG_LEVEL", "WARNING").upper()
+
+# Capture the full joker trace for 1 in N requests (0 disables sampling) ...
+TRACE_SAMPLE_RATE = int(os.environ.get("BALATRO_TRACE_SAMPLE_RATE", "0"))
+# ... and for every request touching one of these game ids
+TRACE_GAME_IDS: set[str] = {g for g in os.environ.get("BALATRO_TRACE_GAME_IDS", "").split(",") if g}
+
+logger = logging.getLogger("balatro")
+# Trace events are only emitted for sampled requests, so they bypass the regular log level
+trace_logger = logging.getLogger("balatro.trace")
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("balatro_trace_id", default=None)
+_game_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("balatro_game_id", default=None)
+_trace_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("balatro_trace_sampled", default=False)
+_request_counter = itertools.count(1)
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including the request trace id and game id."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        trace_id = _trace_id.get()
+        if trace_id:
+            entry["trace_id"] = trace_id
+        game_id = _game_id.get()
+        if game_id:
+            entry["game_id"] = game_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Attaches the structured handler to the `balatro` loggers. Safe to call more than once."""
+    if getattr(logger, "_balatro_configured", False):
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    trace_logger.setLevel(logging.DEBUG)
+    logger._balatro_configured = True
+
+def log_event(level: int, event: str, **fields: Any):
+    """Logs `event` with structured fields, skipping all formatting work if the level is disabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+#%% --- Request tracing ---
+def set_trace_sampling(sample_rate: Optional[int] = None, game_ids: Optional[set[str]] = None):
+    """Changes the sampling switch at runtime."""
+    global TRACE_SAMPLE_RATE, TRACE_GAME_IDS
+    if sample_rate is not None:
+        TRACE_SAMPLE_RATE = max(0, sample_rate)
+    if game_ids is not None:
+        TRACE_GAME_IDS = set(game_ids)
+
+def get_trace_sampling() -> tuple[int, set[str]]:
+    return TRACE_SAMPLE_RATE, set(TRACE_GAME_IDS)
+
+def start_request_trace(game_id: Optional[str] = None, trace_id: Optional[str] = None) -> str:
+    """Assigns a trace id to the current request and decides whether its joker trace is captured."""
+    trace_id = trace_id or uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    _game_id.set(game_id)
+    # A counter rather than `random` so sampling never perturbs the game RNG
+    sampled = (game_id is not None and game_id in TRACE_GAME_IDS) or \
+              (TRACE_SAMPLE_RATE > 0 and next(_request_counter) % TRACE_SAMPLE_RATE == 0)
+    _trace_sampled.set(sampled)
+    return trace_id
+
+def trace_enabled() -> bool:
+    """True if the current request is sampled for a full joker trace."""
+    return _trace_sampled.get()
+
+def trace_event(event: str, **fields: Any):
+    """Emits a trace event; callers check `trace_enabled()` first so unsampled requests pay nothing."""
+    trace_logger.debug(event, extra={"fields": fields})
+
+class log_duration:
+    """Context manager logging the wall time of a block at the given level."""
+    def __init__(self, level: int, event: str, **fields: Any):
+        self.level, self.event, self.fields = level, event, fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.fields
+
+    def __exit__(self, *exc):
+        log_event(self.level, self.event, duration_ms=round((time.perf_counter() - self.start) * 1000, 3), **self.fields)
+        return False
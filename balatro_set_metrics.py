@@ -0,0 +1,197 @@
+"""Counters and histograms for the /metrics endpoint, in the Prometheus text format.
+
+Recording is a dict update keyed by the label values, cheap enough for the scoring loop and the
+set searches. Joker triggers are only counted for plays that happen: previews and searches
+score hypothetical plays inside `not_recorded`. Gauges that are expensive to keep current (the number of games, their memory) are
+computed by a callback when /metrics is scraped. Work done in the solver's worker processes is
+not counted.
+"""
+import bisect
+import math
+import random
+import sys
+import time
+import types
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; request latencies, saves and file I/O all fall between a millisecond and a few seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Seconds; most lock waits and holds are well under a millisecond
+LOCK_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025) + DEFAULT_BUCKETS
+# Games measured for the memory estimate; the total is extrapolated from them
+MEMORY_SAMPLE_SIZE = 16
+
+REGISTRY: List["Metric"] = []
+
+#%% --- Metrics ---
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[tuple, object] = {}
+        REGISTRY.append(self)
+
+    def samples(self) -> Iterable[Tuple[str, tuple, tuple, float]]:
+        """(name suffix, label names, label values, value) of every series."""
+        for key, value in self.values.items():
+            yield "", self.labels, key, value
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, key: tuple = (), amount: float = 1):
+        self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """A value set when it changes, or computed by `collect` (label values -> value) at every scrape."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), collect: Optional[Callable[[], Dict[tuple, float]]] = None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, value: float, key: tuple = ()):
+        self.values[key] = value
+
+    def samples(self):
+        if self.collect is not None:
+            self.values = self.collect()
+        return super().samples()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, key: tuple = ()):
+        # [count per bucket, the last one for values above every bound], sum
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def timer(self, key: tuple = ()):
+        """Observes the seconds spent in the `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, key)
+
+    def samples(self):
+        labels = self.labels + ("le",)
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", labels, key + (bound,), cumulative
+            yield "_sum", self.labels, key, total
+            yield "_count", self.labels, key, cumulative
+
+#%% --- Exposition ---
+def format_value(value) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value) if not value.is_integer() else str(int(value))
+    if isinstance(value, Enum):
+        return str(value.name)
+    return str(value)
+
+def escape_label(value) -> str:
+    return format_value(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, names, values, value in metric.samples():
+            labels = ",".join(f'{name}="{escape_label(label)}"' for name, label in zip(names, values))
+            lines.append(f"{metric.name}{suffix}{{{labels}}} {format_value(value)}" if labels else f"{metric.name}{suffix} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+#%% --- Memory ---
+# Shared by every game (code, card and joker templates), so not counted as a game's memory
+_SKIPPED_TYPES = (type, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.ModuleType, Enum)
+_sampler = random.Random()
+
+def deep_sizeof(obj, seen: set) -> int:
+    """Bytes of `obj` and everything it references that isn't in `seen` yet (which is updated)."""
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIPPED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif not isinstance(current, (str, bytes, int, float, bool)):
+            stack.extend(getattr(current, "__dict__", {}).values())
+            for name in ("__pydantic_private__", "__pydantic_extra__", "__pydantic_fields_set__"):
+                stack.append(getattr(current, name, None))
+            for cls in type(current).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    stack.append(getattr(current, slot, None))
+    return size
+
+def estimate_memory(objects: list, sample_size: int = MEMORY_SAMPLE_SIZE) -> int:
+    """Approximate bytes held by `objects`, measured on a random sample. Objects they share are counted once."""
+    if not objects:
+        return 0
+    # A separate generator, as the games' deals depend on the global one
+    sample = _sampler.sample(objects, min(sample_size, len(objects)))
+    seen = set()
+    measured = sum(deep_sizeof(obj, seen) for obj in sample)
+    return round(measured * len(objects) / len(sample))
+
+#%% --- Engine metrics ---
+JOKER_TRIGGERS = Counter("balatro_joker_triggers_total", "Joker triggers fired in games, by trigger.", ("trigger",))
+JOKER_ABILITIES = Counter("balatro_joker_abilities_total", "Joker abilities run in games, by trigger.", ("trigger",))
+JOKER_TRIGGER_SECONDS = Counter("balatro_joker_trigger_seconds_total", "Time spent running joker abilities in games, by trigger.", ("trigger",))
+SET_SEARCHES = Counter("balatro_set_searches_total", "Set searches, by function and number of cards searched.", ("function", "cards"))
+
+# False while scoring plays that don't happen; a context variable, as previews also run on threads
+_recording_triggers: ContextVar[bool] = ContextVar("recording_triggers", default=True)
+
+@contextmanager
+def not_recorded():
+    """Joker triggers inside the block are not counted: for previews and searches of hypothetical plays."""
+    token = _recording_triggers.set(False)
+    try:
+        yield
+    finally:
+        _recording_triggers.reset(token)
+
+def record_joker_trigger(trigger: Enum, abilities: int, seconds: float):
+    if not _recording_triggers.get():
+        return
+    key = (trigger,)
+    JOKER_TRIGGERS.values[key] = JOKER_TRIGGERS.values.get(key, 0) + 1
+    JOKER_ABILITIES.values[key] = JOKER_ABILITIES.values.get(key, 0) + abilities
+    JOKER_TRIGGER_SECONDS.values[key] = JOKER_TRIGGER_SECONDS.values.get(key, 0.0) + seconds
+
+def record_set_search(function: str, cards: int):
+    key = (function, cards)
+    SET_SEARCHES.values[key] = SET_SEARCHES.values.get(key, 0) + 1
+
+#%% --- Game lock metrics ---
+GAME_LOCK_WAIT_SECONDS = Histogram("balatro_game_lock_wait_seconds", "Time requests waited for a game's lock.", buckets=LOCK_BUCKETS)
+GAME_LOCK_HOLD_SECONDS = Histogram("balatro_game_lock_hold_seconds", "Time requests held a game's lock.", buckets=LOCK_BUCKETS)
+GAME_LOCK_CONTENDED = Counter("balatro_game_lock_contended_total", "Game lock acquisitions that found the lock held by another request.")
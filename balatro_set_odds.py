@@ -0,0 +1,264 @@
+"""Odds that the next refill of the board deals a set of a given type.
+
+The deck order is hidden, so a refill is a uniformly random draw from the deck, or from the deck
+and the discard pile when the deck runs short and gets reshuffled. Refills of up to three cards
+(after a play) and small pools are counted exactly; larger draws such as a full redeal are
+sampled, vectorized with NumPy when it is installed.
+"""
+import itertools
+import math
+import random
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import balatro_set_engine as engine
+from balatro_set_classes import GameState
+from balatro_set_core import b_card_code, b_find_sets, b_is_set, b_third_code
+from balatro_set_engine import GameActionError
+from balatro_set_scoring import get_set_type
+
+Attributes = tuple[int, ...]
+
+ANY_SET = "any"
+# Set types plain cards can form; wildcards can also make e.g. 1_uniform_2_ladder
+PLAIN_SET_TYPES = ("4_uniform_0_ladder", "3_uniform_1_ladder", "2_uniform_2_ladder", "1_uniform_3_ladder", "0_uniform_4_ladder")
+# Draws counted exactly: any draw of up to 3 cards, otherwise pools with at most this many outcomes
+MAX_EXACT_DRAW = 3
+MAX_EXACT_OUTCOMES = 2000
+NUMPY_SAMPLES = 20000
+PYTHON_SAMPLES = 2000
+SAMPLER_SEED = 0
+
+class DrawOdds(NamedTuple):
+    odds: Dict[str, float]  # set type (or "any") -> probability that the board after the refill has such a set
+    draw_count: int
+    pool_size: int  # cards the refill is drawn from
+    reshuffled: bool  # the deck runs short, so the discard pile is shuffled back in first
+    exact: bool
+    samples: int  # 0 when exact
+
+#%% --- Set types ---
+def set_type_of(cards: Sequence[Attributes]) -> str:
+    uniform, ladder = get_set_type(cards)
+    return f"{uniform}_uniform_{ladder}_ladder"
+
+def plain_pair_type(a: Attributes, b: Attributes) -> str:
+    """Type of the set two plain cards make with their third card: equal attributes stay uniform."""
+    uniform = sum(x == y for x, y in zip(a, b))
+    return f"{uniform}_uniform_{len(a) - uniform}_ladder"
+
+def board_set_types(cards: Sequence[Attributes]) -> FrozenSet[str]:
+    return frozenset(set_type_of([cards[i] for i in combo]) for combo in b_find_sets([list(card) for card in cards]))
+
+def matches(set_type: str, types: FrozenSet[str]) -> bool:
+    return bool(types) if set_type == ANY_SET else set_type in types
+
+class BoardCompletions:
+    """Set types that drawn cards complete with the cards staying on the board."""
+
+    def __init__(self, board: Sequence[Attributes]):
+        self.board = board
+        self.plain = [card for card in board if -1 not in card]
+        self.wild = [card for card in board if -1 in card]
+        self.codes = Counter(b_card_code(card) for card in self.plain)
+
+    def with_one(self, card: Attributes) -> FrozenSet[str]:
+        """Types of the sets `card` makes with two board cards."""
+        types = set()
+        if -1 in card:
+            for x, y in itertools.combinations(self.board, 2):
+                if b_is_set([card, x, y]):
+                    types.add(set_type_of([card, x, y]))
+            return frozenset(types)
+        code = b_card_code(card)
+        for other in self.plain:
+            other_code = b_card_code(other)
+            third = b_third_code(code, other_code)
+            # The other card itself doesn't count as its own partner
+            if self.codes[third] > (third == other_code):
+                types.add(plain_pair_type(card, other))
+        for i, x in enumerate(self.board):
+            for y in self.board[i + 1:]:
+                if (-1 in x or -1 in y) and b_is_set([card, x, y]):
+                    types.add(set_type_of([card, x, y]))
+        return frozenset(types)
+
+    def with_two(self, a: Attributes, b: Attributes) -> FrozenSet[str]:
+        """Types of the sets `a` and `b` make with one board card."""
+        types = set()
+        if -1 in a or -1 in b:
+            for x in self.board:
+                if b_is_set([a, b, x]):
+                    types.add(set_type_of([a, b, x]))
+            return frozenset(types)
+        if self.codes[b_third_code(b_card_code(a), b_card_code(b))]:
+            types.add(plain_pair_type(a, b))
+        for x in self.wild:
+            if b_is_set([a, b, x]):
+                types.add(set_type_of([a, b, x]))
+        return frozenset(types)
+
+#%% --- Exact counts ---
+def exact_small_draw(board: Sequence[Attributes], pool: Sequence[Attributes], draw: int, set_types: Sequence[str]) -> Dict[str, float]:
+    """Counts the draws of 1-3 cards without a set of each type through the pairs of the pool.
+
+    A draw misses a type if none of its cards completes such a set with two board cards, none of
+    its pairs with one board card, and the three cards aren't such a set themselves. Pairs that
+    complete one are kept as bitmasks, so the misses are counted per pair instead of per triple.
+    """
+    n = len(pool)
+    completions = BoardCompletions(board)
+    singles = [completions.with_one(card) for card in pool]
+    pairs = {(i, j): completions.with_two(pool[i], pool[j]) for i, j in itertools.combinations(range(n), 2)} if draw >= 2 else {}
+    positions: Dict[int, List[int]] = {}
+    wild = []
+    for k, card in enumerate(pool):
+        if -1 in card:
+            wild.append(k)
+        else:
+            positions.setdefault(b_card_code(card), []).append(k)
+
+    def triples(i: int, j: int):
+        """Yields (k, set type) for the pool cards k making a set with i and j."""
+        a, b = pool[i], pool[j]
+        if -1 in a or -1 in b:
+            candidates = range(n)
+        else:
+            set_type = plain_pair_type(a, b)
+            for k in positions.get(b_third_code(b_card_code(a), b_card_code(b)), ()):
+                yield k, set_type
+            candidates = wild
+        for k in candidates:
+            if k != i and k != j and b_is_set([a, b, pool[k]]):
+                yield k, set_type_of([a, b, pool[k]])
+
+    odds = {}
+    for set_type in set_types:
+        missing = [i for i in range(n) if not matches(set_type, singles[i])]
+        if draw == 1:
+            misses = len(missing)
+        elif draw == 2:
+            misses = sum(1 for i, j in itertools.combinations(missing, 2) if not matches(set_type, pairs[i, j]))
+        else:
+            missing_mask = sum(1 << i for i in missing)
+            hit_with = [0] * n
+            for (i, j), types in pairs.items():
+                if matches(set_type, types):
+                    hit_with[i] |= 1 << j
+                    hit_with[j] |= 1 << i
+            misses = 0
+            for a, i in enumerate(missing):
+                for j in missing[a + 1:]:
+                    if hit_with[i] >> j & 1:
+                        continue
+                    candidates = missing_mask & ~hit_with[i] & ~hit_with[j] & ~((2 << j) - 1)
+                    if candidates:
+                        misses += candidates.bit_count()
+                        misses -= sum(1 for k, k_type in triples(i, j)
+                                      if candidates >> k & 1 and set_type in (ANY_SET, k_type))
+        odds[set_type] = 1 - misses / math.comb(n, draw)
+    return odds
+
+def exact_enumeration(board: Sequence[Attributes], pool: Sequence[Attributes], draw: int, set_types: Sequence[str]) -> Dict[str, float]:
+    """Tries every possible draw; only for small pools."""
+    hits = Counter()
+    outcomes = 0
+    for drawn in itertools.combinations(pool, draw):
+        types = board_set_types(list(board) + list(drawn))
+        hits.update(set_type for set_type in set_types if matches(set_type, types))
+        outcomes += 1
+    return {set_type: hits[set_type] / outcomes for set_type in set_types}
+
+#%% --- Samplers ---
+def sample_python(board: Sequence[Attributes], pool: Sequence[Attributes], draw: int, set_types: Sequence[str], samples: int) -> Dict[str, float]:
+    # A private generator: odds requests must not move the game's global RNG
+    rng = random.Random(SAMPLER_SEED)
+    hits = Counter()
+    for _ in range(samples):
+        types = board_set_types(list(board) + rng.sample(pool, draw))
+        hits.update(set_type for set_type in set_types if matches(set_type, types))
+    return {set_type: hits[set_type] / samples for set_type in set_types}
+
+def sample_numpy(board: Sequence[Attributes], pool: Sequence[Attributes], draw: int, set_types: Sequence[str], samples: int) -> Dict[str, float]:
+    """Samples draws of plain cards as rows of pool indices and ORs the found set types as bit flags.
+
+    Sets with board cards come from the per-card and per-pair tables of BoardCompletions; sets
+    among the drawn cards from third-card completion on the card codes.
+    """
+    n = len(pool)
+    bits = {set_type: 1 << b for b, set_type in enumerate(PLAIN_SET_TYPES)}
+    completions = BoardCompletions(board)
+    single_bits = np.array([sum(bits[t] for t in completions.with_one(card)) for card in pool], dtype=np.int64)
+    pair_bits = np.zeros((n, n), dtype=np.int64)
+    for i, j in itertools.combinations(range(n), 2):
+        pair_bits[i, j] = pair_bits[j, i] = sum(bits[t] for t in completions.with_two(pool[i], pool[j]))
+    codes = np.array([b_card_code(card) for card in pool])
+    third = np.array([[b_third_code(a, b) for b in range(81)] for a in range(81)])
+    cards = list(itertools.product(range(3), repeat=4))
+    type_bits = np.array([[bits[plain_pair_type(a, b)] for b in cards] for a in cards], dtype=np.int64)
+
+    rng = np.random.default_rng(SAMPLER_SEED)
+    drawn = np.argsort(rng.random((samples, n)), axis=1)[:, :draw]
+    found = np.bitwise_or.reduce(single_bits[drawn], axis=1)
+    for a, b in itertools.combinations(range(draw), 2):
+        found |= pair_bits[drawn[:, a], drawn[:, b]]
+    drawn_codes = codes[drawn]
+    for a, b in itertools.combinations(range(draw), 2):
+        code_a, code_b = drawn_codes[:, a], drawn_codes[:, b]
+        completes = (third[code_a, code_b][:, None] == drawn_codes[:, b + 1:]).any(axis=1)
+        found |= np.where(completes, type_bits[code_a, code_b], 0)
+
+    return {set_type: float(np.mean(found != 0)) if set_type == ANY_SET else float(np.mean((found & bits.get(set_type, 0)) != 0))
+            for set_type in set_types}
+
+#%% --- Odds ---
+@lru_cache(maxsize=256)
+def cached_draw_odds(board: tuple[Attributes, ...], pool: tuple[Attributes, ...], draw: int, set_types: tuple[str, ...]) -> tuple[Dict[str, float], bool, int]:
+    """Odds for a board/pool composition. Both are sorted, so equal decks share an entry whatever their order."""
+    already = board_set_types(board)
+    open_types = [set_type for set_type in set_types if not matches(set_type, already)]
+    odds = {set_type: 1.0 for set_type in set_types}
+    exact, samples = True, 0
+    if not open_types:
+        pass
+    elif draw == 0:
+        odds.update({set_type: 0.0 for set_type in open_types})
+    elif draw <= MAX_EXACT_DRAW:
+        odds.update(exact_small_draw(board, pool, draw, open_types))
+    elif math.comb(len(pool), draw) <= MAX_EXACT_OUTCOMES:
+        odds.update(exact_enumeration(board, pool, draw, open_types))
+    elif np is not None and not any(-1 in card for card in board + pool):
+        exact, samples = False, NUMPY_SAMPLES
+        odds.update(sample_numpy(board, pool, draw, open_types, samples))
+    else:
+        exact, samples = False, PYTHON_SAMPLES
+        odds.update(sample_python(board, pool, draw, open_types, samples))
+    return odds, exact, samples
+
+def draw_odds(game: GameState, card_indices: Sequence[int] = (), set_types: Optional[Sequence[str]] = None) -> DrawOdds:
+    """Odds of each set type on the board after the given cards are played or discarded and the board is refilled.
+
+    Without `card_indices`, only the cards missing from the board are drawn. `set_types` defaults
+    to the four scoring types and "any".
+    """
+    if game.game_phase != "playing":
+        raise GameActionError("Not in a playing phase.")
+    leaving = engine.get_board_cards(game, list(card_indices))
+    leaving_indices = set(card_indices)
+    board = [tuple(card.attributes) for i, card in enumerate(game.board) if i not in leaving_indices]
+    draw = max(0, game.board_size - len(board))
+    # Mirrors refill_board: played and discarded cards are in the discard pile by the time it reshuffles
+    reshuffled = len(game.deck) < draw
+    pool_cards = game.deck + game.discard_pile + leaving if reshuffled else game.deck
+    pool = tuple(sorted(tuple(card.attributes) for card in pool_cards))
+    draw = min(draw, len(pool))
+    set_types = tuple(set_types) if set_types else tuple(engine.STARTING_SET_TYPE_LEVELS) + (ANY_SET,)
+
+    odds, exact, samples = cached_draw_odds(tuple(sorted(board)), pool, draw, set_types)
+    return DrawOdds(odds=dict(odds), draw_count=draw, pool_size=len(pool), reshuffled=reshuffled, exact=exact, samples=samples)
@@ -0,0 +1,253 @@
+import math
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from balatro_set_classes import Card, GameState, GameContext, ScoringContext, ScoreLogEntry, JokerTrigger
+from balatro_set_core import trigger_joker_abilities
+
+#%% --- Tracers ---
+class ScoreTracer:
+    """Receives the score log events of the scoring kernel and ignores them; subclasses record them.
+    Passing no tracer disables logging entirely."""
+    def log(self, scoring_ctx: ScoringContext, source_type: str, source_name: str, description: str,
+            chips_before: float, mult_before: float, chips_after: float, mult_after: float, trigger_phase: str):
+        pass
+
+class ScoreLogTracer(ScoreTracer):
+    """Appends a ScoreLogEntry to `scoring_ctx.score_log` for every event, as shown in the UI."""
+    def log(self, scoring_ctx, source_type, source_name, description, chips_before, mult_before, chips_after, mult_after, trigger_phase):
+        scoring_ctx.score_log.append(ScoreLogEntry(
+            source_type=source_type, source_name=source_name, description=description,
+            chips_before=chips_before, mult_before=mult_before,
+            chips_after=chips_after, mult_after=mult_after,
+            trigger_phase=trigger_phase
+        ))
+
+#%% --- Kernel ---
+class ScoreResult(NamedTuple):
+    chips: float
+    mult: float
+    score_gained: int
+    scoring: ScoringContext
+
+def get_set_type(attributes: List[List[int]]) -> tuple[int, int]:
+    """Returns (uniform_features, ladder_features) for the attributes of a played set."""
+    uniform_features, ladder_features = 0, 0
+    for i in range(4):
+        feature_values = {attrs[i] for attrs in attributes}
+        if len(feature_values) == 1:
+            uniform_features += 1
+        elif len(feature_values) == 3:
+            ladder_features += 1
+    return uniform_features, ladder_features
+
+def get_base_score(uniform_features: int, ladder_features: int, level: int) -> tuple[int, float]:
+    """Returns (base_chips, base_mult) of a set type at the given level."""
+    base_chips = (10 + (5 * uniform_features)) + (15 * (level - 1))
+    base_mult = (1 + ladder_features * 2) * (1 + (level - 1) * 0.5)
+    return base_chips, base_mult
+
+def current_chips(scoring_ctx: ScoringContext) -> float:
+    return scoring_ctx.base_chips + scoring_ctx.flat_chips
+
+def current_mult(scoring_ctx: ScoringContext) -> float:
+    return (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
+
+def score_set(game: GameState, selected_cards: List[Card], tracer: Optional[ScoreTracer] = None, rng: Optional[Any] = None) -> ScoreResult:
+    """Scores a played set: set type and level, card enhancements, then jokers per card and at the end.
+
+    The kernel applies the same effects on the game (money, joker custom_data, played set types)
+    whether or not a tracer is given; the tracer only decides whether a score log is produced.
+    `rng` replaces the global RNG for the rolls of the abilities (see GameContext.chance/randint).
+    """
+    uniform_features, ladder_features = get_set_type([card.attributes for card in selected_cards])
+
+    set_type_string = f"{uniform_features}_uniform_{ladder_features}_ladder"
+    game.played_set_types.append(set_type_string)
+
+    level = game.set_type_levels.get(set_type_string, 1)
+    base_chips, base_mult = get_base_score(uniform_features, ladder_features, level)
+
+    scoring_ctx = ScoringContext(
+        base_chips=base_chips,
+        base_mult=base_mult,
+        flat_chips=0,
+        additive_mult=0,
+        multiplicative_mult=1,
+        uniform_features=uniform_features,
+        ladder_features=ladder_features,
+        set_type_string=set_type_string,
+        score_log=[],
+        scoring_cards=selected_cards
+    )
+    game_ctx = GameContext(game=game, scoring=scoring_ctx, rng=rng)
+
+    # Log base set score
+    if tracer:
+        tracer.log(
+            scoring_ctx, source_type='set',
+            source_name=f"Played Set ({uniform_features}U, {ladder_features}L)",
+            description=f"Base score for a level {level} set.",
+            chips_before=0, mult_before=0,
+            chips_after=scoring_ctx.base_chips, mult_after=scoring_ctx.base_mult,
+            trigger_phase="set_base"
+        )
+
+    # Score each card individually, then trigger jokers for that card
+    for card in selected_cards:
+        # Set the current card being scored
+        scoring_ctx.current_scoring_card = card
+
+        if tracer:
+            chips_before = current_chips(scoring_ctx)
+            mult_before = current_mult(scoring_ctx)
+
+        card_mult_modifier = 1.0
+
+        if card.enhancement == "bonus_chips":
+            scoring_ctx.flat_chips += 30
+            if tracer:
+                tracer.log(
+                    scoring_ctx, source_type='card', source_name="Bonus Chips", description="+30 Chips",
+                    chips_before=chips_before, mult_before=mult_before,
+                    chips_after=current_chips(scoring_ctx), mult_after=mult_before,
+                    trigger_phase="card_scoring"
+                )
+        elif card.enhancement == "bonus_mult":
+            scoring_ctx.additive_mult += 2
+            if tracer:
+                tracer.log(
+                    scoring_ctx, source_type='card', source_name="Bonus Mult", description="+2 Mult",
+                    chips_before=chips_before, mult_before=mult_before,
+                    chips_after=chips_before, mult_after=current_mult(scoring_ctx),
+                    trigger_phase="card_scoring"
+                )
+        elif card.enhancement == "x_mult":
+            card_mult_modifier = 1.5
+            # The effect is logged after all other card-specific triggers
+        elif card.enhancement == "gold":
+            game.money += 3
+            if tracer:
+                tracer.log(
+                    scoring_ctx, source_type='card', source_name="Gold Card", description="+$3",
+                    chips_before=chips_before, mult_before=mult_before,
+                    chips_after=chips_before, mult_after=mult_before,
+                    trigger_phase="card_scoring"
+                )
+        elif card.enhancement == "wildcard":
+            # Wildcards provide no chips or mult, but can be part of any set
+            if tracer:
+                tracer.log(
+                    scoring_ctx, source_type='card', source_name="Wildcard", description="Wildcard (no score)",
+                    chips_before=chips_before, mult_before=mult_before,
+                    chips_after=chips_before, mult_after=mult_before,
+                    trigger_phase="card_scoring"
+                )
+
+        # Trigger jokers for this card
+        trigger_joker_abilities(game_ctx, JokerTrigger.ON_SCORE_CARD, tracer)
+
+        # Apply card-specific multiplicative multipliers after jokers
+        if card.enhancement == "x_mult":
+            if tracer:
+                chips_before_x = current_chips(scoring_ctx)
+                mult_before_x = current_mult(scoring_ctx)
+            scoring_ctx.multiplicative_mult *= card_mult_modifier
+            if tracer:
+                tracer.log(
+                    scoring_ctx, source_type='card', source_name="X-Mult Card", description="x1.5 Mult",
+                    chips_before=chips_before_x, mult_before=mult_before_x,
+                    chips_after=chips_before_x, mult_after=current_mult(scoring_ctx),
+                    trigger_phase="card_scoring"
+                )
+
+        if card.enhancement == "amplify":
+            # If this card amplifies, we need to double the chips of other enhancements
+            if tracer:
+                chips_before_amplify = current_chips(scoring_ctx)
+                mult_before_amplify = current_mult(scoring_ctx)
+            scoring_ctx.flat_chips *= 2
+            scoring_ctx.additive_mult *= 2
+            if tracer:
+                tracer.log(
+                    scoring_ctx, source_type='card', source_name="Amplified Card", description="Doubled Chips and Mult",
+                    chips_before=chips_before_amplify, mult_before=mult_before_amplify,
+                    chips_after=current_chips(scoring_ctx), mult_after=current_mult(scoring_ctx),
+                    trigger_phase="card_scoring"
+                )
+
+    # Clear the current scoring card before final triggers
+    scoring_ctx.current_scoring_card = None
+
+    # After all cards, trigger jokers for the end of scoring
+    trigger_joker_abilities(game_ctx, JokerTrigger.ON_SCORE_CALCULATION, tracer)
+
+    chips = current_chips(scoring_ctx)
+    mult = current_mult(scoring_ctx)
+    return ScoreResult(chips=chips, mult=mult, score_gained=int(chips * mult), scoring=scoring_ctx)
+
+#%% --- Distributions ---
+class ScriptedRandom:
+    """Rolls for GameContext.chance/randint that replay a fixed prefix of outcomes.
+
+    Every roll past the prefix takes its first outcome and is recorded with all its outcomes,
+    so the caller can branch on the alternatives.
+    """
+    def __init__(self, prefix: tuple[int, ...] = ()):
+        self.prefix = prefix
+        # (chosen outcome index, ((value, probability), ...)) per roll, in order
+        self.rolls: List[tuple[int, tuple[tuple[Any, float], ...]]] = []
+
+    def roll(self, outcomes: tuple[tuple[Any, float], ...]):
+        depth = len(self.rolls)
+        choice = self.prefix[depth] if depth < len(self.prefix) else 0
+        self.rolls.append((choice, outcomes))
+        return outcomes[choice][0]
+
+    def chance(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        if probability >= 1:
+            return True
+        return self.roll(((True, probability), (False, 1 - probability)))
+
+    def randint(self, low: int, high: int) -> int:
+        probability = 1 / (high - low + 1)
+        return self.roll(tuple((value, probability) for value in range(low, high + 1)))
+
+    @property
+    def probability(self) -> float:
+        """Probability of the path of outcomes taken so far."""
+        return math.prod(outcomes[choice][1] for choice, outcomes in self.rolls)
+
+class ScoreDistribution(NamedTuple):
+    outcomes: Dict[int, float]  # score -> probability, ascending by score
+    mean: float
+    variance: float
+
+    def probability_at_least(self, score: int) -> float:
+        return min(1.0, sum(p for outcome, p in self.outcomes.items() if outcome >= score))
+
+def score_distribution(score_once: Callable[[ScriptedRandom], int]) -> ScoreDistribution:
+    """Exact distribution of a play by enumerating every sequence of ability rolls.
+
+    `score_once` scores the play once on a fresh copy with the given rng. Rolls are explored
+    depth-first, so each distinct sequence of outcomes is scored exactly once: Misprint alone
+    takes 24 passes, Misprint with Bloodstone on three red cards 192.
+    """
+    distribution: Dict[int, float] = defaultdict(float)
+    pending: List[tuple[int, ...]] = [()]
+    while pending:
+        prefix = pending.pop()
+        rng = ScriptedRandom(prefix)
+        distribution[score_once(rng)] += rng.probability
+        # Branch on the alternatives of every roll this pass made past its prefix
+        for depth in range(len(prefix), len(rng.rolls)):
+            path = tuple(choice for choice, _ in rng.rolls[:depth])
+            for alternative in range(1, len(rng.rolls[depth][1])):
+                pending.append(path + (alternative,))
+
+    outcomes = dict(sorted(distribution.items()))
+    mean = sum(score * p for score, p in outcomes.items())
+    variance = sum(p * (score - mean) ** 2 for score, p in outcomes.items())
+    return ScoreDistribution(outcomes=outcomes, mean=mean, variance=variance)
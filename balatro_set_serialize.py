@@ -0,0 +1,108 @@
+"""Cached serialization of GameState for client payloads and the save file.
+
+The large parts of a state (card piles, jokers, consumables, shop, pack) are dumped and encoded
+once and reused until an action marks them dirty with `GameState.mark_dirty`; only the scalar
+fields are dumped every time. Encodes with orjson when it is installed.
+"""
+import copy
+import json
+from typing import Any, List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from pydantic import TypeAdapter
+
+from balatro_set_classes import Card, ConsumableCard, GameState, Joker, update_joker_badges
+
+# Sections the engine marks dirty; round actions change these, see balatro_set_engine
+ROUND_SECTIONS = ("board", "deck", "discard_pile", "jokers", "consumables")
+SECTIONS = ROUND_SECTIONS + ("shop_state", "pack_opening_state")
+# Hidden from the client, only their sizes are sent
+HIDDEN_SECTIONS = ("deck", "discard_pile")
+SCALAR_FIELDS = tuple(name for name in GameState.model_fields if name not in SECTIONS)
+# Game fields the display badges in balatro_set_cards read, besides the jokers themselves
+BADGE_INPUTS = ("money", "discards_remaining", "joker_slots")
+
+_CARDS = TypeAdapter(List[Card])
+_JOKERS = TypeAdapter(List[Joker])
+_CONSUMABLES = TypeAdapter(List[ConsumableCard])
+
+#%% --- Encoding ---
+def encode_json(content: Any) -> bytes:
+    """Compact JSON, as FastAPI's JSONResponse would send it."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+#%% --- Sections ---
+def dump_section(game: GameState, name: str) -> Any:
+    if name in ("board", "deck", "discard_pile"):
+        return _CARDS.dump_python(getattr(game, name))
+    if name == "jokers":
+        dump = _JOKERS.dump_python(game.jokers)
+        for joker_dump, joker in zip(dump, game.jokers):
+            # custom_data is excluded from the model dump; the copy keeps cached dumps from changing with the joker
+            joker_dump["custom_data"] = copy.deepcopy(joker.custom_data)
+        return dump
+    if name == "consumables":
+        return _CONSUMABLES.dump_python(game.consumables)
+    value = getattr(game, name)
+    return value.model_dump() if value is not None else None
+
+def refresh_badges(game: GameState, cache: dict):
+    """Recomputes the joker badges if their inputs changed, and marks the jokers dirty if a badge did."""
+    key = (len(game.jokers),) + tuple(getattr(game, name) for name in BADGE_INPUTS)
+    if cache.get("badges") == key and "jokers" in cache:
+        return
+    badges = [joker.display_badge for joker in game.jokers]
+    update_joker_badges(game)
+    if badges != [joker.display_badge for joker in game.jokers]:
+        cache.pop("jokers", None)
+    cache["badges"] = key
+
+def section(game: GameState, cache: dict, name: str) -> list:
+    """[dump, encoded or None] of a section, dumped again only if it is dirty. Treat the dump as read-only."""
+    entry = cache.get(name)
+    if entry is None:
+        entry = cache[name] = [dump_section(game, name), None]
+    return entry
+
+def encoded_section(game: GameState, cache: dict, name: str) -> bytes:
+    entry = section(game, cache, name)
+    if entry[1] is None:
+        entry[1] = encode_json(entry[0])
+    return entry[1]
+
+#%% --- Game ---
+def dump_scalars(game: GameState) -> dict:
+    dump = {name: getattr(game, name) for name in SCALAR_FIELDS}
+    dump["played_set_types"] = list(game.played_set_types)
+    dump["set_type_levels"] = dict(game.set_type_levels)
+    if game.last_consumable_used is not None:
+        dump["last_consumable_used"] = game.last_consumable_used.model_dump()
+    return dump
+
+def dump_game(game: GameState, client: bool = False) -> dict:
+    """The same dict as `game.model_dump()`, or without the hidden card piles for the client.
+
+    Sections are shared with the cache and with earlier dumps, so they must not be modified.
+    """
+    # Private attributes are slow to reach on a pydantic model, so the cache is fetched once
+    cache = game._sections
+    refresh_badges(game, cache)
+    dump = dump_scalars(game)
+    for name in SECTIONS:
+        if not (client and name in HIDDEN_SECTIONS):
+            dump[name] = section(game, cache, name)[0]
+    return dump
+
+def encode_game(game: GameState) -> bytes:
+    """The JSON of `game.model_dump()`, spliced together from the cached encoded sections."""
+    cache = game._sections
+    refresh_badges(game, cache)
+    parts = [encode_json(dump_scalars(game))[1:-1]]
+    parts.extend(b'"' + name.encode() + b'":' + encoded_section(game, cache, name) for name in SECTIONS)
+    return b"{" + b",".join(parts) + b"}"
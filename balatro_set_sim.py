@@ -0,0 +1,296 @@
+"""Headless Balatro simulations: full runs through balatro_set_engine, driven by pluggable policies.
+
+    python balatro_set_sim.py --runs 10000 --policy greedy --workers 8
+"""
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import balatro_set_engine as engine
+from balatro_set_classes import GameState
+from balatro_set_cards import JOKER_RARITY_PRICES
+from balatro_set_core import ANTE_CONFIG, b_find_sets
+from balatro_set_engine import GameActionError
+from balatro_set_scoring import get_base_score, get_set_type
+from balatro_set_solver import solve
+
+MAX_ACTIONS_PER_RUN = 2000
+
+#%% --- Policies ---
+class Policy:
+    """Decides every action of a run. Subclasses override the three decision points."""
+    name = "base"
+
+    def round_action(self, game: GameState, sets: List[tuple[int, int, int]]) -> Optional[tuple[str, List[int]]]:
+        """Returns ("play", indices) or ("discard", indices), or None if the policy gives up."""
+        raise NotImplementedError
+
+    def shop(self, game: GameState):
+        """Buys/sells/reorders through the engine. Leaving the shop is handled by the runner."""
+        raise NotImplementedError
+
+    def pack_reward(self, game: GameState) -> List[str]:
+        raise NotImplementedError
+
+    def discard_when_stuck(self, game: GameState) -> Optional[tuple[str, List[int]]]:
+        if game.discards_remaining <= 0 or not game.board:
+            return None
+        return ("discard", random.sample(range(len(game.board)), min(5, len(game.board))))
+
+class RandomPolicy(Policy):
+    """Plays a random set, buys random affordable items and picks random pack rewards."""
+    name = "random"
+
+    def round_action(self, game, sets):
+        if sets:
+            return ("play", list(random.choice(sets)))
+        return self.discard_when_stuck(game)
+
+    def shop(self, game):
+        for slot_index, slot in enumerate(game.shop_state.joker_slots):
+            if random.random() < 0.5:
+                try_action(engine.buy_joker, game, slot_index)
+        for slot_index, _pack in enumerate(game.shop_state.booster_pack_slots):
+            if game.game_phase == "shop" and random.random() < 0.5:
+                if try_action(engine.buy_booster_pack, game, slot_index):
+                    engine.choose_pack_reward(game, self.pack_reward(game))
+
+    def pack_reward(self, game):
+        choices = game.pack_opening_state.choices
+        return [c.id for c in random.sample(choices, min(game.pack_opening_state.choose, len(choices)))]
+
+class GreedyPolicy(Policy):
+    """Plays the set with the highest base score, buys the rarest affordable jokers and levels up its favourite set type."""
+    name = "greedy"
+
+    def round_action(self, game, sets):
+        if not sets:
+            return self.discard_when_stuck(game)
+        return ("play", list(max(sets, key=lambda s: self.estimate(game, s))))
+
+    def estimate(self, game: GameState, card_indices) -> float:
+        uniform, ladder = get_set_type([game.board[i].attributes for i in card_indices])
+        level = game.set_type_levels.get(f"{uniform}_uniform_{ladder}_ladder", 1)
+        chips, mult = get_base_score(uniform, ladder, level)
+        return chips * mult
+
+    def shop(self, game):
+        rarity_rank = {rarity: rank for rank, rarity in enumerate(JOKER_RARITY_PRICES)}
+        slots = sorted(range(len(game.shop_state.joker_slots)),
+                       key=lambda i: -rarity_rank.get(game.shop_state.joker_slots[i].item.rarity, 0))
+        for slot_index in slots:
+            try_action(engine.buy_joker, game, slot_index)
+        for slot_index, pack in enumerate(game.shop_state.booster_pack_slots):
+            if pack.name == "Celestial Pack" and try_action(engine.buy_booster_pack, game, slot_index):
+                engine.choose_pack_reward(game, self.pack_reward(game))
+
+    def pack_reward(self, game):
+        pack_state = game.pack_opening_state
+        if pack_state.pack_type != "Celestial Pack":
+            return [c.id for c in pack_state.choices[:pack_state.choose]]
+        ranked = sorted(pack_state.choices, key=lambda c: -game.set_type_levels.get(c.id, 0))
+        return [c.id for c in ranked[:pack_state.choose]]
+
+class MCTSPolicy(GreedyPolicy):
+    """Plays rounds with the MCTS solver (in-process, fixed iterations so runs stay reproducible), shops like greedy."""
+    name = "mcts"
+    iterations = 200
+
+    def round_action(self, game, sets):
+        result = solve(game, budget=float("inf"), workers=1, max_iterations=self.iterations, seed=random.randrange(2**32))
+        if result.kind is None:
+            return None
+        return (result.kind, result.card_indices)
+
+POLICIES = {policy.name: policy for policy in (RandomPolicy, GreedyPolicy, MCTSPolicy)}
+
+def try_action(action, game: GameState, *args) -> bool:
+    try:
+        action(game, *args)
+        return True
+    except GameActionError:
+        return False
+
+#%% --- Runs ---
+@dataclass
+class RunResult:
+    seed: int
+    won: bool = False
+    ante_reached: int = 1
+    blinds_cleared: int = 0
+    # (ante, blind_index, round_score, cleared)
+    blind_scores: List[tuple[int, int, int, bool]] = field(default_factory=list)
+    jokers_offered: List[str] = field(default_factory=list)
+    jokers_bought: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+def simulate_run(seed: int, policy: Policy) -> RunResult:
+    """Plays one full run in-process. Seeds the global RNG, which all game randomness goes through."""
+    random.seed(seed)
+    result = RunResult(seed=seed)
+    game = engine.new_game(f"sim-{seed}")
+
+    try:
+        for _ in range(MAX_ACTIONS_PER_RUN):
+            if game.game_phase == "playing":
+                ante, blind_index = game.ante, game.current_blind_index
+                action = policy.round_action(game, b_find_sets([card.attributes for card in game.board]))
+                if action is None:
+                    # No set and no discard left: the round can't progress
+                    result.blind_scores.append((ante, blind_index, game.round_score, False))
+                    break
+                kind, card_indices = action
+                if kind == "play":
+                    engine.play_set(game, card_indices)
+                else:
+                    engine.discard(game, card_indices)
+                if game.game_phase == "shop":
+                    result.blind_scores.append((ante, blind_index, game.round_score, True))
+                    result.blinds_cleared += 1
+                    result.jokers_offered.extend(slot.item.id for slot in game.shop_state.joker_slots)
+                elif game.game_phase == "game_over":
+                    result.blind_scores.append((ante, blind_index, game.round_score, False))
+                    break
+            elif game.game_phase == "shop":
+                owned_before = {id(j) for j in game.jokers}
+                policy.shop(game)
+                result.jokers_bought.extend(j.id for j in game.jokers if id(j) not in owned_before)
+                engine.leave_shop(game)
+            elif game.game_phase == "pack_opening":
+                engine.choose_pack_reward(game, policy.pack_reward(game))
+            else:
+                break
+    except Exception as e:
+        # Broken joker/tarot abilities surface here instead of as a 500 in the UI
+        result.error = f"{type(e).__name__}: {e}"
+
+    result.won = game.game_phase == "run_won"
+    result.ante_reached = min(game.ante, max(ANTE_CONFIG.keys()))
+    return result
+
+#%% --- Batches ---
+def new_report() -> dict:
+    return {
+        "runs": 0,
+        "wins": 0,
+        "errors": Counter(),
+        "ante_reached": Counter(),
+        "ante_cleared": Counter(),
+        "blind_score_sum": Counter(),
+        "blind_score_count": Counter(),
+        "jokers_offered": Counter(),
+        "jokers_bought": Counter(),
+    }
+
+def add_run(report: dict, result: RunResult):
+    report["runs"] += 1
+    report["wins"] += result.won
+    if result.error:
+        report["errors"][result.error] += 1
+    for ante in range(1, result.ante_reached + 1):
+        report["ante_reached"][ante] += 1
+    for ante, blind_index, round_score, cleared in result.blind_scores:
+        key = f"{ante}-{blind_index}"
+        report["blind_score_sum"][key] += round_score
+        report["blind_score_count"][key] += 1
+        if cleared and blind_index == len(ANTE_CONFIG[ante]["scores"]) - 1:
+            report["ante_cleared"][ante] += 1
+    report["jokers_offered"].update(result.jokers_offered)
+    report["jokers_bought"].update(result.jokers_bought)
+
+def merge_reports(total: dict, part: dict):
+    for key, value in part.items():
+        if isinstance(value, Counter):
+            total[key].update(value)
+        else:
+            total[key] += value
+
+def run_chunk(policy_name: str, seeds: List[int]) -> dict:
+    policy = POLICIES[policy_name]()
+    report = new_report()
+    for seed in seeds:
+        add_run(report, simulate_run(seed, policy))
+    return report
+
+def run_batch(n_runs: int, policy_name: str = "greedy", seed: int = 0, workers: Optional[int] = None, chunk_size: int = 250) -> dict:
+    """Runs `n_runs` seeded runs across a process pool and returns the merged report."""
+    seeds = list(range(seed, seed + n_runs))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    report = new_report()
+    if workers == 1:
+        for chunk in chunks:
+            merge_reports(report, run_chunk(policy_name, chunk))
+        return report
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for part in executor.map(run_chunk, [policy_name] * len(chunks), chunks):
+            merge_reports(report, part)
+    return report
+
+def summarize(report: dict) -> dict:
+    """Turns the raw counters into win rate per ante, the mean score curve and joker pick rates."""
+    runs = report["runs"] or 1
+    antes = sorted(ANTE_CONFIG.keys())
+    return {
+        "runs": report["runs"],
+        "win_rate": report["wins"] / runs,
+        "errors": dict(report["errors"].most_common()),
+        "win_rate_per_ante": {
+            ante: {
+                "reached": report["ante_reached"][ante] / runs,
+                "cleared": report["ante_cleared"][ante] / runs,
+                "cleared_if_reached": report["ante_cleared"][ante] / report["ante_reached"][ante] if report["ante_reached"][ante] else 0.0,
+            } for ante in antes
+        },
+        "score_curve": {
+            key: report["blind_score_sum"][key] / report["blind_score_count"][key]
+            for key in sorted(report["blind_score_count"], key=lambda k: tuple(map(int, k.split("-"))))
+        },
+        "joker_pick_rate": {
+            joker_id: report["jokers_bought"][joker_id] / offered
+            for joker_id, offered in report["jokers_offered"].most_common()
+        },
+    }
+
+def print_summary(summary: dict, elapsed: float):
+    print(f"{summary['runs']} runs in {elapsed:.2f}s ({summary['runs'] / elapsed:.0f} runs/s), win rate {summary['win_rate']:.2%}")
+    print("\nante  reached  cleared  cleared|reached")
+    for ante, rates in summary["win_rate_per_ante"].items():
+        print(f"{ante:>4}  {rates['reached']:7.2%}  {rates['cleared']:7.2%}  {rates['cleared_if_reached']:7.2%}")
+    print("\nblind  mean round score")
+    for key, score in summary["score_curve"].items():
+        print(f"{key:>5}  {score:12.0f}")
+    print("\njoker pick rates")
+    for joker_id, rate in summary["joker_pick_rate"].items():
+        print(f"{joker_id:<24} {rate:6.2%}")
+    if summary["errors"]:
+        print("\nerrors")
+        for error, count in summary["errors"].items():
+            print(f"{count:>6}  {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Balatro runs without the HTTP server.")
+    parser.add_argument("--runs", type=int, default=1000, help="Number of runs to simulate.")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy", help="Policy that plays the runs.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first run; run i uses seed + i.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (1 runs in-process).")
+    parser.add_argument("--chunk-size", type=int, default=250, help="Runs per worker task.")
+    parser.add_argument("--json", type=str, default=None, help="Write the summary to this JSON file.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = run_batch(args.runs, args.policy, args.seed, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    summary = summarize(report)
+    print_summary(summary, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Monte Carlo tree search over the plays and discards of a Balatro round.
+
+The hidden information of a round is the order of the deck, so every iteration searches a
+determinization: a clone of the game with its deck shuffled. Tree nodes are shared between
+determinizations (information set MCTS): actions are identified by the cards they use rather
+than board positions, and a child only competes in selection when it is legal in the current
+determinization.
+
+    python balatro_set_solver.py --seed 1 --budget 2 --workers 4
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import balatro_set_engine as engine
+from balatro_set_classes import Card, GameState
+from balatro_set_core import b_find_sets, get_current_blind_info
+from balatro_set_metrics import not_recorded
+from balatro_set_scoring import get_base_score, get_set_type
+
+# Plays considered per node, best base score first; boards with wildcards can hold hundreds of sets
+MAX_PLAYS_PER_NODE = 8
+# Discards are macro actions: throw away the k cards that are part of the fewest sets
+DISCARD_SIZES = (3, 5)
+EXPLORATION = 0.7
+# Reward of a round that is not cleared, per fraction of the blind reached. Keeps hopeless
+# positions from looking all the same without competing with actually clearing the blind.
+PARTIAL_REWARD = 0.1
+
+#%% --- Actions ---
+def card_key(card: Card) -> tuple:
+    return (tuple(card.attributes), card.enhancement)
+
+def set_estimate(game: GameState, cards: List[Card]) -> float:
+    """Base score of a set at its current level, ignoring jokers and enhancements."""
+    uniform, ladder = get_set_type([card.attributes for card in cards])
+    chips, mult = get_base_score(uniform, ladder, game.set_type_levels.get(f"{uniform}_uniform_{ladder}_ladder", 1))
+    return chips * mult
+
+def legal_actions(game: GameState) -> Dict[tuple, tuple[str, List[int]]]:
+    """Maps action keys to ("play"/"discard", board indices) for the current board.
+
+    Plays are keyed by the cards they use, discards by their size, so the same key means the
+    same action on every determinization that allows it.
+    """
+    actions: Dict[tuple, tuple[str, List[int]]] = {}
+    if game.game_phase != "playing":
+        return actions
+    board = game.board
+    sets = b_find_sets([card.attributes for card in board])
+    if game.boards_remaining > 0:
+        ranked = sorted(sets, key=lambda combo: set_estimate(game, [board[i] for i in combo]), reverse=True)
+        for combo in ranked[:MAX_PLAYS_PER_NODE]:
+            actions[("play",) + tuple(sorted(card_key(board[i]) for i in combo))] = ("play", list(combo))
+    if game.discards_remaining > 0:
+        usage = [0] * len(board)
+        for combo in sets:
+            for i in combo:
+                usage[i] += 1
+        least_used = sorted(range(len(board)), key=lambda i: usage[i])
+        for size in DISCARD_SIZES:
+            if size <= len(board):
+                actions[("discard", size)] = ("discard", least_used[:size])
+    return actions
+
+def apply_action(game: GameState, action: tuple[str, List[int]]):
+    kind, card_indices = action
+    if kind == "play":
+        engine.play_set(game, card_indices)
+    else:
+        engine.discard(game, card_indices)
+
+def rollout_action(game: GameState, actions: Dict[tuple, tuple[str, List[int]]]) -> tuple[str, List[int]]:
+    """Default policy: the best play by base score, otherwise the largest discard."""
+    for key, action in actions.items():
+        if key[0] == "play":
+            return action
+    return actions[("discard", max(size for kind, size in actions if kind == "discard"))]
+
+def round_reward(game: GameState, score_required: int) -> float:
+    if game.game_phase in ("shop", "run_won"):
+        return 1.0
+    return PARTIAL_REWARD * min(1.0, game.round_score / score_required)
+
+#%% --- Search ---
+class Node:
+    __slots__ = ("children", "visits", "value", "availability")
+
+    def __init__(self):
+        self.children: Dict[tuple, "Node"] = {}
+        self.visits = 0
+        self.value = 0.0
+        self.availability = 0
+
+    def ucb(self) -> float:
+        return self.value / self.visits + EXPLORATION * math.sqrt(math.log(self.availability) / self.visits)
+
+class ActionStats(NamedTuple):
+    kind: str
+    card_indices: List[int]
+    visits: int
+    value: float  # mean reward
+
+class SolverResult(NamedTuple):
+    kind: Optional[str]  # "play", "discard", or None if the round can't progress
+    card_indices: List[int]
+    clear_probability: float  # estimated chance of clearing the blind after this action
+    iterations: int
+    actions: List[ActionStats]  # every root action, most visited first
+
+def search_iteration(root: Node, game: GameState, score_required: int):
+    """One determinization: shuffle the hidden deck, select/expand down the tree, roll out, back up."""
+    random.shuffle(game.deck)
+    path = [root]
+    node = root
+    while True:
+        actions = legal_actions(game)
+        if not actions:
+            break
+        for key in actions:
+            if key in node.children:
+                node.children[key].availability += 1
+        untried = [key for key in actions if key not in node.children]
+        if untried:
+            key = random.choice(untried)
+            node.children[key] = child = Node()
+            child.availability = 1
+            apply_action(game, actions[key])
+            path.append(child)
+            break
+        key = max((key for key in actions), key=lambda key: node.children[key].ucb())
+        node = node.children[key]
+        apply_action(game, actions[key])
+        path.append(node)
+
+    while True:
+        actions = legal_actions(game)
+        if not actions:
+            break
+        apply_action(game, rollout_action(game, actions))
+
+    reward = round_reward(game, score_required)
+    for node in path:
+        node.visits += 1
+        node.value += reward
+
+def search(game_data: dict, deadline: float, max_iterations: Optional[int] = None, seed: Optional[int] = None) -> tuple[int, Dict[tuple, tuple[int, float]]]:
+    """Runs MCTS from a `model_dump()` until the wall-clock `deadline` (time.time()) or `max_iterations`.
+
+    Returns (iterations, {root action key: (visits, total reward)}). Runs in worker processes and
+    seeds the global RNG, which the game rules roll with.
+    """
+    if seed is not None:
+        random.seed(seed)
+    root_game = engine.game_state_from_dict(game_data.get("id", ""), game_data)
+    score_required = get_current_blind_info(root_game)["score_required"]
+    root = Node()
+    iterations = 0
+    while (max_iterations is None or iterations < max_iterations) and (iterations == 0 or time.time() < deadline):
+        search_iteration(root, engine.clone_game(root_game), score_required)
+        iterations += 1
+    return iterations, {key: (child.visits, child.value) for key, child in root.children.items()}
+
+#%% --- Solver ---
+# Pools by name: the searches, and the previews servers run beside them (see call_on_game), so
+# that a long search doesn't hold up a preview
+SEARCH_POOL = "search"
+PREVIEW_POOL = "preview"
+_pools: Dict[str, tuple[ProcessPoolExecutor, int]] = {}
+
+def pool_context():
+    """Starts workers from a fork server, or fresh interpreters where there is none. Forking the server
+    itself would copy a process whose other threads (the event loop, the threadpool) hold locks."""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+def get_pool(workers: int, name: str = SEARCH_POOL) -> ProcessPoolExecutor:
+    """The process pool called `name`, shared between calls so they don't pay the process startup each time.
+
+    Servers create their pools at startup and close them with `shutdown_pool`.
+    """
+    pool, pool_workers = _pools.get(name, (None, 0))
+    if pool is None or pool_workers != workers:
+        if pool is not None:
+            pool.shutdown(wait=False)
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+        _pools[name] = (pool, workers)
+    return pool
+
+def call_on_game(fn: Callable, game_data: dict, *args, random_state: Optional[tuple] = None):
+    """`fn(game, *args)` on the game rebuilt from its `model_dump()`, for the pool's workers.
+
+    With `random_state`, the global RNG starts from the caller's, so rolls come out as they would have there.
+    """
+    if random_state is not None:
+        random.setstate(random_state)
+    return fn(engine.game_state_from_dict(game_data.get("id", ""), game_data), *args)
+
+def start_pool(workers: int, name: str = SEARCH_POOL) -> ProcessPoolExecutor:
+    """Creates a shared pool and starts its workers in the background, so that the first hint's
+    budget isn't spent starting processes."""
+    pool = get_pool(workers, name)
+    for _ in range(workers):
+        pool.submit(int)
+    return pool
+
+def shutdown_pool():
+    """Stops the workers of every shared pool, cancelling the calls that haven't started."""
+    while _pools:
+        _name, (pool, _workers) = _pools.popitem()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def solve(game: GameState, budget: float = 1.0, workers: Optional[int] = None, max_iterations: Optional[int] = None,
+          seed: Optional[int] = None, in_process: Optional[bool] = None) -> SolverResult:
+    """Searches the best next play or discard for `game` within `budget` seconds of wall clock.
+
+    With several workers, each process searches its own tree from the same state (root
+    parallelization) and the root statistics are summed. A single worker searches in-process
+    unless `in_process=False`, and leaves the global RNG as it found it; servers should always
+    search in the pool, as other requests share that RNG. `max_iterations` caps each tree, which
+    makes the result reproducible for a given seed.
+    """
+    root_actions = legal_actions(game)
+    if not root_actions:
+        return SolverResult(kind=None, card_indices=[], clear_probability=0.0, iterations=0, actions=[])
+
+    workers = workers or os.cpu_count() or 1
+    in_process = workers == 1 if in_process is None else in_process
+    seed = int.from_bytes(os.urandom(4), "little") if seed is None else seed
+    game_data = game.model_dump()
+    deadline = time.time() + budget
+
+    if in_process:
+        with engine.preserved_random_state(), not_recorded():
+            results = [search(game_data, deadline, max_iterations, seed)]
+    else:
+        pool = get_pool(workers)
+        futures = [pool.submit(search, game_data, deadline, max_iterations, seed + i) for i in range(workers)]
+        results = [future.result() for future in futures]
+
+    totals: Dict[tuple, List[float]] = {}
+    for _iterations, root_stats in results:
+        for key, (visits, value) in root_stats.items():
+            total = totals.setdefault(key, [0, 0.0])
+            total[0] += visits
+            total[1] += value
+
+    stats = sorted(
+        (ActionStats(kind=root_actions[key][0], card_indices=root_actions[key][1], visits=int(visits), value=value / visits)
+         for key, (visits, value) in totals.items() if key in root_actions),
+        key=lambda action: action.visits, reverse=True,
+    )
+    best = stats[0]
+    return SolverResult(
+        kind=best.kind,
+        card_indices=best.card_indices,
+        # Rewards of uncleared rounds are below PARTIAL_REWARD, so the mean overstates the chance by at most that
+        clear_probability=best.value,
+        iterations=sum(iterations for iterations, _ in results),
+        actions=stats,
+    )
+
+#%% --- Benchmark & calibration ---
+def play_round(game: GameState, budget: float, workers: int, max_iterations: Optional[int], seed: int) -> int:
+    """Plays the current round with the solver choosing every action and returns the iterations searched."""
+    iterations = 0
+    step = 0
+    while game.game_phase == "playing":
+        result = solve(game, budget, workers, max_iterations, seed + step)
+        if result.kind is None:
+            break
+        iterations += result.iterations
+        apply_action(game, (result.kind, result.card_indices))
+        step += 1
+    return iterations
+
+def main():
+    parser = argparse.ArgumentParser(description="Play first blinds with the MCTS solver and report the clear rate and search speed.")
+    parser.add_argument("--rounds", type=int, default=10, help="Number of fresh rounds to play.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first round; round i uses seed + i.")
+    parser.add_argument("--budget", type=float, default=1.0, help="Wall-clock seconds per decision.")
+    parser.add_argument("--iterations", type=int, default=None, help="Cap on iterations per tree (reproducible runs).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes per decision (1 searches in-process).")
+    parser.add_argument("--ante", type=int, default=1, help="Ante whose first blind is played.")
+    args = parser.parse_args()
+
+    cleared, iterations, elapsed = 0, 0, 0.0
+    for i in range(args.rounds):
+        random.seed(args.seed + i)
+        game = engine.new_game(f"solver-{args.seed + i}")
+        game.ante = args.ante
+        start = time.perf_counter()
+        iterations += play_round(game, args.budget, args.workers, args.iterations, (args.seed + i) * 100)
+        elapsed += time.perf_counter() - start
+        won = game.game_phase in ("shop", "run_won")
+        cleared += won
+        print(f"round {i}: {'cleared' if won else 'failed '} score {game.round_score}")
+    print(f"\ncleared {cleared}/{args.rounds} ({cleared / args.rounds:.0%}) of ante {args.ante} first blinds, "
+          f"{iterations / elapsed:.0f} iterations/s over {args.workers} worker(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Client payloads of a GameState: versions and JSON patches between them.
+
+Every action bumps `GameState.version`. Clients send the version they last saw (`since`) and get
+back a JSON patch (RFC 6902 add/remove/replace) against it, or the full payload if that version
+is no longer remembered. Payloads leave out the hidden deck and the discard pile, only their
+sizes are sent.
+"""
+import asyncio
+import json
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Awaitable, Callable, Optional
+
+import balatro_set_engine as engine
+from balatro_set_classes import GameState
+from balatro_set_core import get_current_blind_info
+from balatro_set_serialize import dump_game, dump_scalars, encode_json
+
+# Payloads remembered per game; a client further behind gets the full state
+STATE_HISTORY_SIZE = 8
+# Messages queued for a websocket client before its next action waits for it to read them
+SUBSCRIBER_QUEUE_SIZE = 32
+
+#%% --- Payloads ---
+def client_state(game: GameState) -> dict:
+    """The state sent to the client: the game dump without hidden cards, plus the current blind.
+
+    Built from the serializer's cached sections, so unchanged parts are shared between versions.
+    """
+    blind_info = get_current_blind_info(game)
+    payload = dump_game(game, client=True)
+    payload["deck_count"] = len(game.deck)
+    payload["discard_pile_count"] = len(game.discard_pile)
+    payload["current_blind"] = blind_info["name"]
+    payload["blind_score_required"] = blind_info["score_required"]
+    payload["board_set_count"] = engine.board_set_count(game)
+    payload["dead_board"] = payload["board_set_count"] == 0
+    return payload
+
+#%% --- Patches ---
+def escape_pointer(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+def is_scalar_list(value: Any) -> bool:
+    return isinstance(value, list) and not any(isinstance(item, (dict, list)) for item in value)
+
+def item_key(item: Any) -> Any:
+    # With the type, as Python counts 1, 1.0 and True as equal though they are different JSON
+    return json.dumps(item, sort_keys=True) if isinstance(item, (dict, list)) else (type(item).__name__, item)
+
+def same_json(old: Any, new: Any) -> bool:
+    """Whether `old` and `new` encode to the same JSON: `==`, but telling 1, 1.0 and True apart at any depth."""
+    if old is new:
+        return True
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, dict):
+        return old.keys() == new.keys() and all(same_json(value, new[key]) for key, value in old.items())
+    if isinstance(old, list):
+        return len(old) == len(new) and all(map(same_json, old, new))
+    return old == new
+
+def json_patch(old: Any, new: Any, path: str = "") -> list[dict]:
+    """The operations turning `old` into `new`.
+
+    Dicts are diffed per key. Lists are matched item by item, so playing three cards removes
+    them and adds the three drawn ones instead of shifting the whole board; items replaced in
+    place are diffed further. Lists of plain values (card attributes) are replaced whole unless
+    items were only appended.
+    """
+    # `==` first, as it is much faster and rules out most changes
+    if old == new and same_json(old, new):
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{"op": "remove", "path": f"{path}/{escape_pointer(key)}"} for key in old if key not in new]
+        for key, value in new.items():
+            child = f"{path}/{escape_pointer(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(json_patch(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        if is_scalar_list(new) and not same_json(new[:len(old)], old):
+            return [{"op": "replace", "path": path, "value": new}]
+        ops = []
+        matcher = SequenceMatcher(None, [item_key(item) for item in old], [item_key(item) for item in new], autojunk=False)
+        # Before each block the patched list reads new[:j1] + old[i1:], so positions are j-based
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            common = min(i2 - i1, j2 - j1)
+            for k in range(common):
+                ops.extend(json_patch(old[i1 + k], new[j1 + k], f"{path}/{j1 + k}"))
+            ops.extend({"op": "remove", "path": f"{path}/{j1 + common}"} for _ in range(i2 - i1 - common))
+            ops.extend({"op": "add", "path": f"{path}/{j}", "value": new[j]} for j in range(j1 + common, j2))
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+#%% --- Versions ---
+class StateHistory:
+    """The last STATE_HISTORY_SIZE payloads of one game, by version."""
+
+    def __init__(self):
+        self.payloads: OrderedDict[int, dict] = OrderedDict()
+        self.body_version: Optional[int] = None
+        self.encoded: bytes = b""
+
+    def payload(self, game: GameState) -> dict:
+        """The payload of the game's current version, serialized once per version."""
+        payload = self.payloads.get(game.version)
+        if payload is None:
+            payload = self.payloads[game.version] = client_state(game)
+            while len(self.payloads) > STATE_HISTORY_SIZE:
+                self.payloads.popitem(last=False)
+        return payload
+
+    def body(self, game: GameState) -> bytes:
+        """The encoded payload of the current version, kept until the next action."""
+        if self.body_version != game.version:
+            self.encoded = encode_json(self.payload(game))
+            self.body_version = game.version
+        return self.encoded
+
+    def update(self, game: GameState, since: Optional[int] = None) -> dict:
+        """`{"game_state": payload}`, or `{"game_state_patch": {...}}` if the client has version `since`."""
+        payload = self.payload(game)
+        old = self.payloads.get(since) if since is not None else None
+        if old is None:
+            return {"game_state": payload}
+        return {"game_state_patch": {"from": since, "to": game.version, "ops": json_patch(old, payload)}}
+
+def mark_changed(game: GameState):
+    game.version += 1
+
+def state_fingerprint(game: GameState) -> tuple:
+    """Everything a save keeps of the game, read fresh rather than from the serializer's cache, to
+    tell whether a failed action changed it. About as cheap as encoding the scalar fields."""
+    return (
+        encode_json(dump_scalars(game)),
+        tuple(tuple((card.code, card.enhancement) for card in pile) for pile in (game.deck, game.board, game.discard_pile)),
+        tuple((joker.id, joker.variant, encode_json(joker.custom_data)) for joker in game.jokers),
+        tuple(consumable.id for consumable in game.consumables),
+        game.shop_state.model_dump() if game.shop_state is not None else None,
+        game.pack_opening_state.model_dump() if game.pack_opening_state is not None else None,
+    )
+
+#%% --- Subscribers ---
+class StateSubscriber:
+    """A websocket client following one game.
+
+    Replies go through a bounded queue: once it is full, the client's next action waits until it
+    reads, so a client that doesn't read stops being read from. Changes made by other clients are
+    not queued one by one, they only flag a state push, sent as one patch from the version the
+    client has. Events such as score log entries are dropped (and counted) if the queue is full.
+    """
+
+    def __init__(self, history: StateHistory, get_game: Callable[[], Optional[GameState]]):
+        self.history = history
+        self.get_game = get_game
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.wake = asyncio.Event()
+        self.state_changed = False
+        # Version of the last state sent to the client
+        self.version: Optional[int] = None
+        self.dropped = 0
+
+    async def put(self, message: dict):
+        await self.queue.put(message)
+        self.wake.set()
+
+    def offer(self, message: dict):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self.wake.set()
+
+    def notify(self):
+        """The game changed: push its state after the queued messages."""
+        self.state_changed = True
+        self.wake.set()
+
+    async def run(self, send: Callable[[dict], Awaitable[None]]):
+        """Sends the queued messages and state pushes until cancelled."""
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            while not self.queue.empty():
+                await send(self.queue.get_nowait())
+            game = self.get_game()
+            if self.state_changed and game is not None:
+                self.state_changed = False
+                if game.version != self.version:
+                    update = self.history.update(game, self.version)
+                    self.version = game.version
+                    await send({"type": "state", **update})
@@ -0,0 +1,84 @@
+"""Compares the binary save file with the JSON one for 1, 100 and 10k saved games.
+
+Checks that the games load back from both files to the state they were saved in, including
+games saved in the shop, while opening a pack and after using a tarot. Load times include
+rebuilding the GameStates, as the server does at startup.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import balatro_set_engine as engine
+from balatro_set_cards import TAROT_DATABASE
+from balatro_set_codec import decode_saves, encode_record, encode_saves, enhancement_table
+from balatro_set_serialize import encode_game, encode_json
+
+from bench_serializer import make_template, timed
+
+
+def json_save(games: dict) -> bytes:
+    return b"{" + b",".join(encode_json(uid) + b":" + encode_game(game) for uid, game in games.items()) + b"}"
+
+
+def binary_save(games: dict) -> bytes:
+    enhancements = enhancement_table()
+    return encode_saves({uid: encode_record(game, enhancements) for uid, game in games.items()}, enhancements)
+
+
+def load(games: dict) -> dict:
+    return {uid: engine.game_state_from_dict(uid, game_data) for uid, game_data in games.items()}
+
+
+def make_templates(seed: int, count: int) -> list:
+    """Mid-run games in the shop, a third of them opening a pack and a third after using a tarot."""
+    templates = []
+    for i in range(count):
+        game = make_template(seed + i)
+        game.game_phase = "shop"
+        if i % 3 == 1:
+            game.money = 100
+            engine.buy_booster_pack(game, 0)
+        elif i % 3 == 2:
+            game.last_consumable_used = next(iter(TAROT_DATABASE.values())).model_copy()
+        templates.append(game)
+    return templates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the binary save codec against JSON.")
+    parser.add_argument("--sizes", type=str, default="1,100,10000", help="Comma-separated numbers of saved games.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    templates = make_templates(args.seed, 50)
+    pretty = len(json.dumps(templates[0].model_dump(), indent=4))
+    for size in map(int, args.sizes.split(",")):
+        games = {}
+        for i in range(size):
+            game = engine.clone_game(templates[i % len(templates)])
+            game.id = f"game-{i}"
+            games[game.id] = game
+
+        json_body, json_time = timed(json_save, games)
+        binary_body, binary_time = timed(binary_save, games)
+        json_games, json_load_time = timed(lambda: load(json.loads(json_body)))
+        binary_games, binary_load_time = timed(lambda: load(decode_saves(binary_body)))
+        for uid in list(games)[:100]:
+            expected = games[uid].model_dump()
+            if json_games[uid].model_dump() != expected:
+                print(f"FAIL: game {uid} loads differently from the JSON save")
+                sys.exit(1)
+            if binary_games[uid].model_dump() != expected:
+                print(f"FAIL: game {uid} loads differently from the binary save")
+                sys.exit(1)
+
+        print(f"{size:>6} games: {len(json_body) / size:7.0f} B/game JSON ({pretty} pretty), {len(binary_body) / size:6.0f} B/game binary | "
+              f"save {json_time * 1e3:8.1f} -> {binary_time * 1e3:8.1f} ms, load {json_load_time * 1e3:8.1f} -> {binary_load_time * 1e3:8.1f} ms")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
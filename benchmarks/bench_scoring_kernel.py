@@ -0,0 +1,64 @@
+"""Compares the scoring kernel with the UI score log tracer against the untraced fast path.
+
+Both paths must produce identical scores; the untraced path should be much cheaper.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balatro_set_classes import Card, GameState
+from balatro_set_cards import JOKER_DATABASE
+from balatro_set_core import b_create_deck, b_is_set
+from balatro_set_scoring import score_set, ScoreLogTracer
+
+JOKER_IDS = ["J_MULT", "J_GREEDY", "J_SLY", "J_MISPRINT", "J_BLOODSTONE", "J_ONYX", "J_SCARY_FACE", "J_ABSTRACT"]
+ENHANCEMENTS = [None, "bonus_chips", "bonus_mult", "x_mult", "amplify"]
+
+
+def make_game(n_jokers: int) -> GameState:
+    jokers = [JOKER_DATABASE[j].instantiate() for j in JOKER_IDS[:n_jokers]]
+    return GameState(jokers=jokers, joker_slots=max(5, n_jokers), set_type_levels={"1_uniform_3_ladder": 2, "2_uniform_2_ladder": 3})
+
+
+def make_sets(n: int) -> list[list[Card]]:
+    deck = b_create_deck()
+    sets = [list(c) for c in itertools.combinations(deck[:20], 3) if b_is_set(list(c))]
+    return [[Card(attributes=a, enhancement=random.choice(ENHANCEMENTS)) for a in sets[i % len(sets)]] for i in range(n)]
+
+
+def run(game: GameState, sets: list[list[Card]], traced: bool, seed: int) -> tuple[list[int], float]:
+    random.seed(seed)
+    scores = []
+    start = time.perf_counter()
+    for cards in sets:
+        game.played_set_types.clear()
+        scores.append(score_set(game, cards, tracer=ScoreLogTracer() if traced else None).score_gained)
+    return scores, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark traced vs untraced set scoring.")
+    parser.add_argument("--plays", type=int, default=5000, help="Number of scored sets per configuration.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    sets = make_sets(args.plays)
+    for n_jokers in (0, 3, 5, len(JOKER_IDS)):
+        traced_scores, traced_time = run(make_game(n_jokers), sets, True, args.seed)
+        fast_scores, fast_time = run(make_game(n_jokers), sets, False, args.seed)
+        if traced_scores != fast_scores:
+            print(f"FAIL: traced and untraced scores differ with {n_jokers} jokers")
+            sys.exit(1)
+        print(f"{n_jokers} jokers: traced {traced_time / args.plays * 1e6:8.1f} us/play, "
+              f"untraced {fast_time / args.plays * 1e6:8.1f} us/play ({traced_time / fast_time:.1f}x)")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
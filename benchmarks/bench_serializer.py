@@ -0,0 +1,102 @@
+"""Compares the cached serializer with model_dump + json for 1, 100 and 10k saved games.
+
+Saving used to dump and indent every game on every save; the serializer re-encodes only the
+sections an action marked dirty. Also checks that both produce the same JSON.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import balatro_set_engine as engine
+from balatro_set_cards import JOKER_DATABASE
+from balatro_set_core import b_find_sets
+from balatro_set_serialize import encode_game, encode_json, orjson
+from balatro_set_sync import client_state
+
+
+# Jokers with display badges (read at every dump) that score without errors
+BENCH_JOKERS = ["J_MULT", "J_BANNER", "J_ABSTRACT", "J_POPCORN", "J_WEE", "J_BULL"]
+
+
+def make_template(seed: int):
+    """A mid-run game: a few jokers, a played set and a generated shop."""
+    random.seed(seed)
+    game = engine.new_game(f"bench-{seed}")
+    for joker_id in random.sample([j for j in BENCH_JOKERS if j in JOKER_DATABASE], 4):
+        game.jokers.append(JOKER_DATABASE[joker_id].instantiate())
+    sets = b_find_sets([card.attributes for card in game.board])
+    if sets:
+        engine.play_set(game, list(sets[0]))
+    game.shop_state = engine.generate_shop(game)
+    return game
+
+
+def legacy_save(games: dict) -> bytes:
+    return json.dumps({uid: game.model_dump() for uid, game in games.items()}, indent=4).encode()
+
+
+def cached_save(games: dict) -> bytes:
+    return b"{" + b",".join(encode_json(uid) + b":" + encode_game(game) for uid, game in games.items()) + b"}"
+
+
+def legacy_state(game) -> bytes:
+    payload = game.model_dump()
+    payload["board_set_count"] = engine.board_set_count(game)
+    return json.dumps(payload).encode()
+
+
+def timed(fn, *args) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cached GameState serializer.")
+    parser.add_argument("--sizes", type=str, default="1,100,10000", help="Comma-separated numbers of saved games.")
+    parser.add_argument("--changed", type=float, default=0.01, help="Fraction of games changed between two saves.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"JSON backend: {'orjson' if orjson is not None else 'json'}")
+    templates = [make_template(args.seed + i) for i in range(50)]
+    for size in map(int, args.sizes.split(",")):
+        games = {}
+        for i in range(size):
+            game = engine.clone_game(templates[i % len(templates)])
+            game.id = f"game-{i}"
+            games[game.id] = game
+
+        legacy, legacy_time = timed(legacy_save, games)
+        cached, cold_time = timed(cached_save, games)
+        if json.loads(legacy) != json.loads(cached):
+            print(f"FAIL: the cached save differs from model_dump on {size} games")
+            sys.exit(1)
+
+        random.seed(args.seed)
+        for game in random.sample(list(games.values()), max(1, int(size * args.changed))):
+            if game.game_phase == "playing":
+                engine.discard(game, [0])
+            else:
+                engine.reorder_jokers(game, list(reversed(range(len(game.jokers)))))
+        _, warm_time = timed(cached_save, games)
+
+        game = next(iter(games.values()))
+        repeat = 200
+        _, legacy_state_time = timed(lambda: [legacy_state(game) for _ in range(repeat)])
+        _, state_time = timed(lambda: [encode_json(client_state(game)) for _ in range(repeat)])
+
+        print(f"{size:>6} games: save model_dump+indent {legacy_time * 1e3:9.1f} ms, cached cold {cold_time * 1e3:8.1f} ms "
+              f"({legacy_time / cold_time:4.1f}x), after {args.changed:.0%} changed {warm_time * 1e3:8.1f} ms "
+              f"({legacy_time / warm_time:5.1f}x) | state payload {legacy_state_time / repeat * 1e6:6.1f} -> "
+              f"{state_time / repeat * 1e6:6.1f} us")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
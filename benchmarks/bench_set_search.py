@@ -0,0 +1,71 @@
+"""Compares the wildcard-aware set search with trying every triple on 9-21 card boards.
+
+Both must find exactly the same sets (and b_count_sets / b_has_set must agree with them);
+the search should stay far below the cubic brute force as boards grow.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balatro_set_core import b_count_sets, b_create_deck, b_find_sets, b_has_set, b_is_set
+
+
+def brute_force_sets(cards: list[list[int]]) -> list[tuple[int, int, int]]:
+    return [combo for combo in itertools.combinations(range(len(cards)), 3) if b_is_set([cards[i] for i in combo])]
+
+
+def make_board(size: int, n_wild: int, n_partial: int) -> list[list[int]]:
+    deck = b_create_deck()
+    board = [list(card) for card in random.sample(deck, size)]
+    # Tarots can copy cards (Death), so duplicates are allowed
+    if size > 1 and random.random() < 0.3:
+        board[-1] = list(board[0])
+    for i in random.sample(range(size), n_wild + n_partial):
+        if n_wild:
+            board[i] = [-1, -1, -1, -1]
+            n_wild -= 1
+        else:
+            board[i][random.randrange(4)] = -1
+    return board
+
+
+def timed(fn, boards, repeat: int) -> tuple[list, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [fn(board) for board in boards]
+    return results, (time.perf_counter() - start) / (repeat * len(boards))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the set search against brute force.")
+    parser.add_argument("--boards", type=int, default=300, help="Random boards per configuration.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for size in (9, 12, 15, 21):
+        for n_wild, n_partial in ((0, 0), (0, 1), (2, 0)):
+            boards = [make_board(size, n_wild, n_partial) for _ in range(args.boards)]
+            expected, brute_time = timed(brute_force_sets, boards, args.repeat)
+            found, fast_time = timed(b_find_sets, boards, args.repeat)
+            if found != expected:
+                print(f"FAIL: b_find_sets differs from brute force on {size} cards ({n_wild} wild, {n_partial} partial)")
+                sys.exit(1)
+            if [b_count_sets(board) for board in boards] != [len(sets) for sets in expected] or \
+               [b_has_set(board) for board in boards] != [bool(sets) for sets in expected]:
+                print(f"FAIL: b_count_sets/b_has_set disagree on {size} cards ({n_wild} wild, {n_partial} partial)")
+                sys.exit(1)
+            _, count_time = timed(b_count_sets, boards, args.repeat)
+            print(f"{size:>2} cards, {n_wild} wild, {n_partial} partial: brute force {brute_time * 1e6:8.1f} us, "
+                  f"find {fast_time * 1e6:7.1f} us ({brute_time / fast_time:4.1f}x), count {count_time * 1e6:7.1f} us")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
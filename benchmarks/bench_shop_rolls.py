@@ -0,0 +1,54 @@
+"""Regression benchmark: the cost of rolling shop jokers must not grow with the number of rolls.
+
+Every roll used to append variant abilities to the shared JOKER_DATABASE entry, so both the
+roll and every later scoring pass got slower the longer the server ran.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from balatro_set_cards import JOKER_DATABASE
+from balatro_set_core import get_random_joker_by_rarity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-roll cost of shop joker generation.")
+    parser.add_argument("--rolls", type=int, default=100_000, help="Total number of shop rolls.")
+    parser.add_argument("--buckets", type=int, default=10, help="Number of equally sized buckets to report.")
+    parser.add_argument("--max-growth", type=float, default=1.5, help="Fail if the last bucket is this much slower than the first.")
+    args = parser.parse_args()
+
+    templates = list(JOKER_DATABASE.values())
+    ability_counts = {t.id: len(t.abilities) for t in templates}
+    bucket_size = args.rolls // args.buckets
+
+    timings = []
+    for bucket in range(args.buckets):
+        start = time.perf_counter()
+        for _ in range(bucket_size):
+            joker = get_random_joker_by_rarity(templates)
+            # Touch the resolved abilities like the scoring loop does
+            for _ability in joker.abilities:
+                pass
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed / bucket_size)
+        print(f"rolls {bucket * bucket_size:>7}-{(bucket + 1) * bucket_size:>7}: {timings[-1] * 1e6:8.2f} us/roll")
+
+    grown = {t.id: len(t.abilities) for t in templates if len(t.abilities) != ability_counts[t.id]}
+    if grown:
+        print(f"FAIL: templates gained abilities: {grown}")
+        sys.exit(1)
+
+    growth = timings[-1] / timings[0]
+    print(f"last/first bucket: {growth:.2f}x")
+    if growth > args.max_growth:
+        print(f"FAIL: per-roll cost grew by more than {args.max_growth}x")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
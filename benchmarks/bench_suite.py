@@ -0,0 +1,286 @@
+"""Micro and macro benchmarks of the Set checks, the Balatro engine and the save file, with stored results.
+
+Runs offline: the server module is imported in a temporary directory, so its save file is never
+touched. Results are written as JSON with --output; --compare reports every benchmark against an
+earlier result file and fails if one got slower than --threshold, so regressions between commits show up:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --compare before.json
+    python benchmarks/bench_suite.py --compare before.json --against after.json   # two stored runs
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Iterator, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import balatro_set_engine as engine
+from balatro_set_cards import JOKER_DATABASE
+from balatro_set_codec import ENHANCEMENTS
+from balatro_set_core import b_create_deck, b_find_sets, b_is_set, get_random_joker_by_rarity
+
+from bench_serializer import BENCH_JOKERS, make_template
+
+FIND_SIZES = (3, 12, 27, 54, 81)
+EXCLUDE_SIZES = (0, 20, 40, 60)
+
+
+class Case(NamedTuple):
+    name: str
+    fn: Callable
+    # Builds the arguments of one call, outside the timing; for calls that use up their input
+    setup: Optional[Callable[[], tuple]] = None
+
+
+#%% --- Timing ---
+def time_calls(case: Case, loops: int) -> float:
+    """Seconds spent in `loops` calls of the case, without its setup."""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if case.setup is None:
+            start = time.perf_counter()
+            for _ in range(loops):
+                case.fn()
+            return time.perf_counter() - start
+        total = 0.0
+        for _ in range(loops):
+            args = case.setup()
+            start = time.perf_counter()
+            case.fn(*args)
+            total += time.perf_counter() - start
+        return total
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def measure(case: Case, min_time: float, repeat: int) -> dict:
+    """Time per call: calls are batched until a batch takes `min_time`, then `repeat` batches are timed."""
+    loops = 1
+    while True:
+        elapsed = time_calls(case, loops)
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.2))
+    times = [time_calls(case, loops) / loops for _ in range(repeat)]
+    return {"best_us": min(times) * 1e6, "median_us": statistics.median(times) * 1e6, "loops": loops, "repeat": repeat}
+
+
+def call_endpoint(coro):
+    """The value of an endpoint coroutine that never awaits, without an event loop."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("The endpoint awaited; run it on an event loop instead.")
+
+
+#%% --- Cases ---
+def set_cases(server, args) -> Iterator[Case]:
+    deck = [server.SetCard(color_val=a, shape_val=b, number_val=c, shading_val=d) for a, b, c, d in b_create_deck()]
+    valid = [deck[0], deck[1], deck[2]]
+    invalid = [deck[0], deck[1], deck[4]]
+    yield Case("sets/is_valid_set valid", lambda: server.is_valid_set(valid))
+    yield Case("sets/is_valid_set invalid", lambda: server.is_valid_set(invalid))
+    valid_lists = [list(card.to_tuple()) for card in valid]
+    wild_lists = [[0, -1, 2, 1], [1, 1, -1, 1], [2, 0, 0, 1]]
+    yield Case("sets/b_is_set", lambda: b_is_set(valid_lists))
+    yield Case("sets/b_is_set wild", lambda: b_is_set(wild_lists))
+
+    rng = random.Random(args.seed)
+    for n in FIND_SIZES:
+        cards = rng.sample(deck, n)
+        yield Case(f"sets/find_set n={n}", lambda cards=cards: call_endpoint(server.find_set(cards)))
+        yield Case(f"sets/find_all_sets n={n}", lambda cards=cards: call_endpoint(server.find_all_sets(cards)))
+        attributes = [list(card.to_tuple()) for card in cards]
+        yield Case(f"sets/b_find_sets n={n}", lambda attributes=attributes: b_find_sets(attributes))
+
+
+def deal_cases(server, args) -> Iterator[Case]:
+    deck = [server.SetCard(color_val=a, shape_val=b, number_val=c, shading_val=d) for a, b, c, d in b_create_deck()]
+    for size in EXCLUDE_SIZES:
+        exclude = random.Random(args.seed).sample(deck, size)
+        request = lambda exclude=exclude: server.DealRequest(n_cards=server.N_CARDS_TO_DEAL, seed=args.seed, exclude=exclude or None)
+        yield Case(f"deal/deal_cards exclude={size}", lambda request=request: call_endpoint(server.deal_cards(request())))
+
+
+def play_template(n_jokers: int, enhancement: Optional[str], seed: int):
+    """A new game with jokers and a set on the board whose cards have `enhancement`, and the set's indices."""
+    random.seed(seed)
+    game = engine.new_game(f"bench-play-{seed}")
+    for joker_id in BENCH_JOKERS[:n_jokers]:
+        game.jokers.append(JOKER_DATABASE[joker_id].instantiate())
+    indices = list(b_find_sets([card.attributes for card in game.board])[0])
+    for i in indices:
+        game.board[i].enhancement = enhancement
+    return game, indices
+
+
+def play_cases(server, args) -> Iterator[Case]:
+    configurations = [(n_jokers, None) for n_jokers in range(6)]
+    configurations += [(3, enhancement) for enhancement in ENHANCEMENTS if enhancement is not None]
+    for n_jokers, enhancement in configurations:
+        game, indices = play_template(n_jokers, enhancement, args.seed)
+        # Each play changes the board, so every call gets a fresh copy of the game
+        yield Case(f"play/play_set jokers={n_jokers} enhancement={enhancement}",
+                   lambda game, indices: engine.play_set(game, indices),
+                   setup=lambda game=game, indices=indices: (engine.clone_game(game), indices))
+
+
+def state_cases(server, args) -> Iterator[Case]:
+    game = make_template(args.seed)
+    yield Case("state/model_dump", game.model_dump)
+    yield Case("state/clone_game", lambda: engine.clone_game(game))
+
+
+def forget_save_records(server) -> tuple:
+    """Makes the next save encode every game again, as the first save after startup does."""
+    server.SAVE_RECORDS.clear()
+    return ()
+
+
+def save_cases(server, args) -> Iterator[Case]:
+    templates = [make_template(args.seed + i) for i in range(50)]
+    loop = asyncio.new_event_loop()
+    try:
+        for size in args.save_sizes:
+            server.GAME_SAVES.clear()
+            server.SAVE_RECORDS.clear()
+            for i in range(size):
+                game = engine.clone_game(templates[i % len(templates)])
+                game.id = f"game-{i}"
+                server.GAME_SAVES[game.id] = game
+            save = lambda: loop.run_until_complete(server.save_game_saves())
+            yield Case(f"saves/save_game_saves cold games={size}", save, setup=lambda: forget_save_records(server))
+            yield Case(f"saves/save_game_saves games={size}", save)
+            yield Case(f"saves/load_game_saves games={size}", server.load_game_saves)
+    finally:
+        server.GAME_SAVES.clear()
+        loop.close()
+
+
+def shop_cases(server, args) -> Iterator[Case]:
+    random.seed(args.seed)
+    game = make_template(args.seed)
+    game.game_phase = "shop"
+    game.money = 100
+    templates = list(JOKER_DATABASE.values())
+    yield Case("shop/generate_shop", lambda: engine.generate_shop(game))
+    yield Case("shop/get_random_joker_by_rarity", lambda: get_random_joker_by_rarity(templates))
+    for slot, pack in enumerate(game.shop_state.booster_pack_slots):
+        yield Case(f"shop/buy_booster_pack {pack.name}", engine.buy_booster_pack,
+                   setup=lambda slot=slot: (engine.clone_game(game), slot))
+
+
+GROUPS = {"sets": set_cases, "deal": deal_cases, "play": play_cases, "state": state_cases, "saves": save_cases, "shop": shop_cases}
+
+
+#%% --- Results ---
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    # The server reads and writes its files in the working directory, so it is imported in an empty one
+    os.chdir(tempfile.mkdtemp(prefix="balatro-bench-"))
+    import server
+
+    pattern = re.compile(args.filter) if args.filter else None
+    results = {}
+    for group in args.groups:
+        for case in GROUPS[group](server, args):
+            if pattern is not None and not pattern.search(case.name):
+                continue
+            results[case.name] = measure(case, args.min_time, args.repeat)
+            print(f"{case.name:<55} {results[case.name]['best_us']:12.2f} us (median {results[case.name]['median_us']:.2f})", flush=True)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Prints each benchmark's change in best time and returns those slower than `threshold`."""
+    print(f"\n{'benchmark':<55} {'baseline':>12} {'current':>12} {'change':>8}   "
+          f"({baseline['meta'].get('commit')} -> {current['meta'].get('commit')})")
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<55} {'-':>12} {result['best_us']:12.2f}      new")
+            continue
+        change = result["best_us"] / before["best_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<55} {before['best_us']:12.2f} {result['best_us']:12.2f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite, store its results and compare them with an earlier run.")
+    parser.add_argument("--groups", type=str, default=",".join(GROUPS), help=f"Comma-separated groups to run, of {', '.join(GROUPS)}.")
+    parser.add_argument("--filter", type=str, default=None, help="Only run the benchmarks whose name matches this regex.")
+    parser.add_argument("--save-sizes", type=str, default="1,1000,10000", help="Comma-separated numbers of saved games.")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed batch of calls.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed batches; the best is compared.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--compare", type=str, default=None, help="Compare with the results in this JSON file.")
+    parser.add_argument("--against", type=str, default=None, help="With --compare: compare this results file instead of running.")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Slowdown (0.15 = 15%%) that counts as a regression.")
+    args = parser.parse_args()
+    args.groups = [group for group in args.groups.split(",") if group]
+    args.save_sizes = [int(size) for size in args.save_sizes.split(",") if size]
+    unknown = [group for group in args.groups if group not in GROUPS]
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(unknown)}")
+    if args.against and not args.compare:
+        parser.error("--against needs --compare")
+
+    # run() changes the working directory
+    output, baseline_path, against = (os.path.abspath(path) if path else None for path in (args.output, args.compare, args.against))
+    if against:
+        with open(against) as f:
+            current = json.load(f)
+    else:
+        current = run(args)
+        if output:
+            with open(output, "w") as f:
+                json.dump(current, f, indent=4)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"FAIL: {len(regressions)} benchmarks are more than {args.threshold:.0%} slower")
+            sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""Load test: concurrent simulated players against a running server, or one started for the test.
+
+Players send the requests the clients send. Timed-mode players deal cards, ask find_set for a
+hint, check sets with is_set (some of them wrong) and post their score. Balatro players start a
+run, play and discard sets using state patches, buy jokers and packs, pick pack rewards and leave
+the shop until the run ends. The report has p50/p95/p99 latency, rejected (4xx) and error (5xx
+or failed) rates per endpoint, and the overall throughput.
+
+Sessions can be recorded and replayed later with their original timing:
+
+    python benchmarks/load_test.py --players 20 --duration 30 --record sessions.jsonl
+    python benchmarks/load_test.py --replay sessions.jsonl --speed 2
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --mix timed=3,balatro=1
+
+Without --url a server is started on a free port in a temporary directory, so no save or
+leaderboard file is touched. Replayed Balatro runs are dealt different boards, so some of their
+plays are rejected.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from balatro_set_core import b_find_sets
+
+PERCENTILES = (50, 95, 99)
+MAX_BALATRO_ACTIONS = 80
+# Share of timed-mode guesses that are not the hinted set
+WRONG_GUESS_RATE = 0.2
+
+
+#%% --- Measurements ---
+class Stats:
+    """Latencies and status codes by endpoint ("POST /api/v1/is_set")."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, endpoint: str, seconds: float, status: int | str):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            statuses = self.statuses[endpoint]
+            endpoints[endpoint] = {
+                "count": len(latencies),
+                "rps": len(latencies) / duration,
+                **{f"p{p}_ms": percentile(latencies, p) * 1e3 for p in PERCENTILES},
+                "rejected": sum(n for status, n in statuses.items() if isinstance(status, int) and 400 <= status < 500),
+                "errors": sum(n for status, n in statuses.items() if not isinstance(status, int) or status >= 500),
+            }
+        total = sum(endpoint["count"] for endpoint in endpoints.values())
+        return {
+            "duration_s": duration,
+            "requests": total,
+            "throughput_rps": total / duration,
+            "rejected": sum(endpoint["rejected"] for endpoint in endpoints.values()),
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def print_summary(summary: dict):
+    print(f"{'endpoint':<42} {'count':>7} {'rps':>8} " + " ".join(f"{f'p{p} ms':>8}" for p in PERCENTILES) + f" {'4xx':>7} {'errors':>7}")
+    for endpoint, row in summary["endpoints"].items():
+        print(f"{endpoint:<42} {row['count']:>7} {row['rps']:>8.1f} " + " ".join(f"{row[f'p{p}_ms']:>8.1f}" for p in PERCENTILES)
+              + f" {row['rejected'] / row['count']:>7.1%} {row['errors'] / row['count']:>7.1%}")
+    requests = max(summary["requests"], 1)
+    print(f"{summary['requests']} requests in {summary['duration_s']:.1f} s: {summary['throughput_rps']:.1f} req/s, "
+          f"{summary['rejected'] / requests:.1%} rejected, {summary['errors'] / requests:.2%} errors")
+
+
+#%% --- Players ---
+class Player:
+    """One simulated client: sends requests, times them and records them for replays."""
+
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, think_time: float, started: float):
+        self.client = client
+        self.stats = stats
+        self.think_time = think_time
+        self.started = started
+        self.trace: list[dict] = []
+
+    async def request(self, method: str, path: str, params: Optional[dict] = None, body=None) -> Optional[httpx.Response]:
+        """The response, or None if the request failed; every outcome is counted."""
+        self.trace.append({"at": time.perf_counter() - self.started, "method": method, "path": path, "params": params, "json": body})
+        endpoint = f"{method} {path}"
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, params=params, json=body)
+        except httpx.HTTPError as exc:
+            self.stats.add(endpoint, time.perf_counter() - start, type(exc).__name__)
+            return None
+        self.stats.add(endpoint, time.perf_counter() - start, response.status_code)
+        return response
+
+    async def think(self, rng: random.Random):
+        if self.think_time > 0:
+            await asyncio.sleep(rng.expovariate(1 / self.think_time))
+
+
+async def timed_session(player: Player, rng: random.Random):
+    """A timed-mode game: deal, hint, check sets and deal replacements, then post the score."""
+    seed = rng.randrange(1_000_000)
+    response = await player.request("POST", "/api/v1/deal_cards", body={"n_cards": 12, "seed": seed})
+    if response is None or response.status_code != 200:
+        return
+    board = response.json()["cards"]
+    dealt = list(board)
+    score = 0
+    for _ in range(rng.randint(5, 20)):
+        hint = await player.request("POST", "/api/v1/find_set", body=board)
+        if hint is None or hint.status_code != 200:
+            break
+        await player.think(rng)
+        guess = hint.json()["set"] if rng.random() >= WRONG_GUESS_RATE else rng.sample(board, 3)
+        response = await player.request("POST", "/api/v1/is_set", body=guess)
+        if response is None or response.status_code != 200:
+            continue
+        score += 1
+        board = [card for card in board if card not in guess]
+        response = await player.request("POST", "/api/v1/deal_cards", body={"n_cards": 3, "seed": seed, "exclude": dealt})
+        if response is None or response.status_code != 200:
+            break
+        board += response.json()["cards"]
+        dealt += response.json()["cards"]
+    await player.request("POST", "/api/v1/post_score", body={"name": f"load-{rng.randrange(10_000)}", "score": score})
+    await player.request("GET", "/api/v1/get_leaderboard")
+
+
+def apply_patch(doc, ops: list[dict]):
+    """Applies a `game_state_patch`'s operations, like applyPatch in static/balatro.js."""
+    for op in ops:
+        if op["path"] == "":
+            doc = op["value"]
+            continue
+        keys = [key.replace("~1", "/").replace("~0", "~") for key in op["path"][1:].split("/")]
+        parent = doc
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+        last = keys[-1]
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else int(last)
+            if op["op"] == "add":
+                parent.insert(index, op["value"])
+            elif op["op"] == "remove":
+                del parent[index]
+            else:
+                parent[index] = op["value"]
+        elif op["op"] == "remove":
+            del parent[last]
+        else:
+            parent[last] = op["value"]
+    return doc
+
+
+async def resolve_state(player: Player, game_id: str, state: dict, data: dict) -> Optional[dict]:
+    """The new state from an action's reply, fetching the full state if the patch isn't against ours."""
+    patch = data.get("game_state_patch")
+    if patch is None:
+        return data.get("game_state")
+    if patch["from"] == state["version"]:
+        return apply_patch(state, patch["ops"])
+    response = await player.request("GET", "/api/balatro/state", params={"id": game_id})
+    return response.json() if response is not None and response.status_code == 200 else None
+
+
+def balatro_action(state: dict, rng: random.Random) -> Optional[tuple[str, Optional[dict]]]:
+    """The endpoint and body of a player's next action, or None once the run is over."""
+    phase = state["game_phase"]
+    if phase == "playing":
+        sets = b_find_sets([card["attributes"] for card in state["board"]])
+        if state["discards_remaining"] > 0 and (not sets or rng.random() < 0.15):
+            return "discard", {"card_indices": rng.sample(range(len(state["board"])), min(3, len(state["board"])))}
+        if sets:
+            return "play_set", {"card_indices": list(rng.choice(sets))}
+        return None
+    if phase == "shop":
+        shop = state["shop_state"]
+        jokers = [i for i, slot in enumerate(shop["joker_slots"])
+                  if not slot["is_purchased"] and slot["price"] <= state["money"] and len(state["jokers"]) < state["joker_slots"]]
+        packs = [i for i, pack in enumerate(shop["booster_pack_slots"])
+                 if not pack["is_purchased"] and pack["price"] <= state["money"]
+                 and (pack["name"] != "Tarot Pack" or len(state["consumables"]) < state["consumable_slots"])]
+        if jokers and rng.random() < 0.5:
+            return "buy_joker", {"slot_index": rng.choice(jokers)}
+        if packs and rng.random() < 0.3:
+            return "buy_booster_pack", {"slot_index": rng.choice(packs)}
+        return "leave_shop", None
+    if phase == "pack_opening":
+        pack = state["pack_opening_state"]
+        return "choose_pack_reward", {"selected_ids": [choice["id"] for choice in pack["choices"][:pack["choose"]]]}
+    return None
+
+
+async def balatro_session(player: Player, rng: random.Random):
+    """A Balatro run from new_run until game over (or MAX_BALATRO_ACTIONS actions)."""
+    response = await player.request("POST", "/api/balatro/new_run")
+    if response is None or response.status_code != 200:
+        return
+    state = response.json()
+    game_id = state["id"]
+    for _ in range(MAX_BALATRO_ACTIONS):
+        action = balatro_action(state, rng)
+        if action is None:
+            return
+        await player.think(rng)
+        name, body = action
+        response = await player.request("POST", f"/api/balatro/{name}", params={"id": game_id, "since": state["version"]}, body=body)
+        if response is None:
+            return
+        if response.status_code == 200:
+            state = await resolve_state(player, game_id, state, response.json())
+        else:
+            response = await player.request("GET", "/api/balatro/state", params={"id": game_id})
+            state = response.json() if response is not None and response.status_code == 200 else None
+        if state is None:
+            return
+
+
+SCENARIOS = {"timed": timed_session, "balatro": balatro_session}
+
+
+#%% --- Runs ---
+async def simulate(client: httpx.AsyncClient, stats: Stats, args) -> list[dict]:
+    """Runs `args.players` concurrent players until the duration or session count is reached; returns their traces."""
+    started = time.perf_counter()
+    deadline = started + args.duration
+    names, weights = zip(*args.mix.items())
+    sessions = iter(range(args.sessions)) if args.sessions else None
+    traces = []
+
+    async def worker(index: int):
+        rng = random.Random(args.seed * 1000 + index)
+        while time.perf_counter() < deadline and (sessions is None or next(sessions, None) is not None):
+            scenario = rng.choices(names, weights)[0]
+            player = Player(client, stats, args.think, started)
+            start = time.perf_counter() - started
+            await SCENARIOS[scenario](player, rng)
+            traces.append({"scenario": scenario, "start": start, "requests": player.trace})
+
+    await asyncio.gather(*(worker(i) for i in range(args.players)))
+    return traces
+
+
+async def replay(client: httpx.AsyncClient, stats: Stats, traces: list[dict], speed: float):
+    """Sends the recorded sessions' requests at their recorded times, divided by `speed`."""
+    started = time.perf_counter()
+
+    async def replay_session(trace: dict):
+        player = Player(client, stats, 0, started)
+        game_id = None
+        for request in trace["requests"]:
+            delay = request["at"] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            params = dict(request["params"] or {})
+            # The server names the replayed run differently
+            if "id" in params and game_id is not None:
+                params["id"] = game_id
+            response = await player.request(request["method"], request["path"], params=params or None, body=request["json"])
+            if request["path"] == "/api/balatro/new_run" and response is not None and response.status_code == 200:
+                game_id = response.json()["id"]
+
+    await asyncio.gather(*(replay_session(trace) for trace in traces))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    """The server on `port`, run in an empty directory so its save and leaderboard files are throwaway."""
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), str(port)],
+                               cwd=tempfile.mkdtemp(prefix="balatro-load-"), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode}.")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/v1/get_leaderboard", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The server did not start within 30 seconds.")
+
+
+async def run(url: str, args) -> tuple[Stats, float, list[dict]]:
+    stats = Stats()
+    traces = []
+    if args.replay:
+        with open(args.replay) as f:
+            traces = [json.loads(line) for line in f if line.strip()]
+    # Replayed sessions overlap as recorded, each with its own connection
+    connections = len(traces) if args.replay else args.players
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        if args.replay:
+            await replay(client, stats, traces, args.speed)
+        else:
+            traces = await simulate(client, stats, args)
+        return stats, time.perf_counter() - start, traces
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the server with simulated timed-mode and Balatro players.")
+    parser.add_argument("--url", type=str, default=None, help="Server to test; by default one is started for the test.")
+    parser.add_argument("--players", type=int, default=20, help="Concurrent players (replays run the recorded sessions).")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to keep starting sessions.")
+    parser.add_argument("--sessions", type=int, default=0, help="Stop after this many sessions (0: only the duration counts).")
+    parser.add_argument("--mix", type=parse_mix, default="timed=1,balatro=1", help="Scenario weights, e.g. timed=3,balatro=1.")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean seconds a player thinks before each move.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", type=str, default=None, help="Write the sessions to this JSON lines file.")
+    parser.add_argument("--replay", type=str, default=None, help="Replay the sessions of a recorded file instead of simulating.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay this many times faster than recorded.")
+    parser.add_argument("--output", type=str, default=None, help="Write the summary to this JSON file.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Fail above this share of 5xx or failed requests.")
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        stats, duration, traces = asyncio.run(run(url, args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = stats.summary(duration)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=4)
+    if args.record and not args.replay:
+        with open(args.record, "w") as f:
+            for trace in sorted(traces, key=lambda trace: trace["start"]):
+                f.write(json.dumps(trace) + "\n")
+
+    if summary["errors"] > args.max_error_rate * max(summary["requests"], 1):
+        print(f"FAIL: {summary['errors']} of {summary['requests']} requests failed")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,32 @@
+"""Renders the placeholder art of the jokers and tarots into static/images.
+
+Only cards whose name, description or layout changed since the last run are rendered again (see
+the manifest), in parallel across processes. All card art is also packed into one sprite atlas
+with a coordinate map, which the Balatro UI loads instead of an image per card.
+
+    python create_tmp_images.py [--workers N] [--force] [--atlas-scale 0.5]
+"""
 from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import functools
+import hashlib
+import json
+import math
 import re
 import os
-from balatro_set_core import JOKER_DATABASE, TAROT_DATABASE
+from balatro_set_cards import JOKER_DATABASE, TAROT_DATABASE
 
 WIDTH = 400
 HEIGHT = 600
 TITLE_FONT_SIZE = 52
 DESCRIPTION_FONT_SIZE = 36
+# Bump when the drawing code changes, so every card is rendered again
+RENDER_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+ATLAS_IMAGE = "atlas.webp"
+ATLAS_MAP = "atlas.json"
 
 
 def wrap_text(text, font, max_width, draw):
@@ -35,6 +55,21 @@ def wrap_text(text, font, max_width, draw):
     return "\n".join(lines)
 
 
+@functools.lru_cache(maxsize=None)
+def load_fonts():
+    """The title and description fonts, loaded once per process."""
+    try:
+        return ImageFont.truetype("arial.ttf", TITLE_FONT_SIZE), ImageFont.truetype("arial.ttf", DESCRIPTION_FONT_SIZE)
+    except IOError:
+        return ImageFont.load_default(), ImageFont.load_default()
+
+
+def card_hash(card_name, description):
+    """Identifies what a card's image shows; an unchanged hash means the image can be kept."""
+    key = [RENDER_VERSION, WIDTH, HEIGHT, TITLE_FONT_SIZE, DESCRIPTION_FONT_SIZE, card_name, description]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+
 def create_card_image(card_id, card_name, description, output_dir):
     width, height = WIDTH, HEIGHT
     text_box_height = int(height * 0.2)
@@ -42,12 +77,7 @@ def create_card_image(card_id, card_name, description, output_dir):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    try:
-        title_font = ImageFont.truetype("arial.ttf", TITLE_FONT_SIZE)
-        description_font = ImageFont.truetype("arial.ttf", DESCRIPTION_FONT_SIZE)
-    except IOError:
-        title_font = ImageFont.load_default()
-        description_font = ImageFont.load_default()
+    title_font, description_font = load_fonts()
 
     image = Image.new("RGB", (width, height), "white")
     draw = ImageDraw.Draw(image)
@@ -78,11 +108,81 @@ def create_card_image(card_id, card_name, description, output_dir):
     image.save(output_filename, "WEBP")
     print(f"Created {output_filename}")
 
+def read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4, sort_keys=True)
+
+
+def render_cards(cards, output_dir, workers=None, force=False):
+    """Renders the cards (id -> (name, description)) whose image is missing or outdated. Returns their ids."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {} if force else read_json(manifest_path) or {}
+    hashes = {card_id: card_hash(name, description) for card_id, (name, description) in cards.items()}
+    outdated = [card_id for card_id, digest in hashes.items()
+                if manifest.get(card_id) != digest or not os.path.exists(os.path.join(output_dir, f"{card_id}.webp"))]
+
+    if outdated:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(create_card_image, card_id, *cards[card_id], output_dir) for card_id in outdated]
+            for future in futures:
+                future.result()
+    manifest.update((card_id, hashes[card_id]) for card_id in outdated)
+    write_json(manifest_path, manifest)
+    return outdated
+
+
+def build_atlas(card_ids, output_dir, scale=0.5):
+    """Packs the cards' images into a grid in one image, with a map of each card's column and row."""
+    cell_width, cell_height = round(WIDTH * scale), round(HEIGHT * scale)
+    columns = math.ceil(math.sqrt(len(card_ids)))
+    rows = math.ceil(len(card_ids) / columns)
+    atlas = Image.new("RGB", (columns * cell_width, rows * cell_height), "white")
+    cells = {}
+    for i, card_id in enumerate(sorted(card_ids)):
+        column, row = i % columns, i // columns
+        with Image.open(os.path.join(output_dir, f"{card_id}.webp")) as image:
+            atlas.paste(image.convert("RGB").resize((cell_width, cell_height), Image.LANCZOS), (column * cell_width, row * cell_height))
+        cells[card_id] = [column, row]
+    atlas.save(os.path.join(output_dir, ATLAS_IMAGE), "WEBP", quality=90)
+    # The client positions cells in percent of the atlas, so only the grid size is needed
+    write_json(os.path.join(output_dir, ATLAS_MAP), {
+        "image": f"/images/{ATLAS_IMAGE}",
+        "columns": columns,
+        "rows": rows,
+        "cell": [cell_width, cell_height],
+        "cards": cells,
+    })
+    print(f"Packed {len(cells)} cards into {os.path.join(output_dir, ATLAS_IMAGE)}")
+
+
+def atlas_outdated(card_ids, output_dir, scale):
+    atlas_map = read_json(os.path.join(output_dir, ATLAS_MAP))
+    return (atlas_map is None or not os.path.exists(os.path.join(output_dir, ATLAS_IMAGE))
+            or set(atlas_map.get("cards", {})) != set(card_ids)
+            or atlas_map.get("cell") != [round(WIDTH * scale), round(HEIGHT * scale)])
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the joker and tarot placeholder images and their sprite atlas.")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: one per core).")
+    parser.add_argument("--force", action="store_true", help="Render every card, even unchanged ones.")
+    parser.add_argument("--atlas-scale", type=float, default=0.5, help="Size of the atlas cells relative to the card images.")
+    args = parser.parse_args()
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
     img_dir = os.path.join(script_dir, "static", "images")
-    for card_id, card_data in JOKER_DATABASE.items():
-        create_card_image(card_id, card_data.name, card_data.description, img_dir)
-    for card_id, card_data in TAROT_DATABASE.items():
-        create_card_image(card_id, card_data.name, card_data.description, img_dir)
-
+    cards = {card_id: (card_data.name, card_data.description)
+             for database in (JOKER_DATABASE, TAROT_DATABASE) for card_id, card_data in database.items()}
+    rendered = render_cards(cards, img_dir, workers=args.workers, force=args.force)
+    print(f"Rendered {len(rendered)} of {len(cards)} cards")
+    if rendered or atlas_outdated(cards, img_dir, args.atlas_scale):
+        build_atlas(list(cards), img_dir, scale=args.atlas_scale)
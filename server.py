@@ -1,29 +1,57 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
 from fastapi import HTTPException
-from fastapi import BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List
+from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import random
 import sys
 import os
 import json
-import itertools
+import logging
 import math
+import itertools
+import time
 from uuid import uuid4
 
-from balatro_set_classes import Joker, JokerTrigger, ConsumableTrigger, ScoreLogEntry, ScoringContext, ConsumableContext, GameContext, JokerVariant
-from balatro_set_classes import Card, ShopSlot, PackOpeningChoice, PackOpeningState, BoosterPack, ShopState, GameState
-from balatro_set_cards import JOKER_RARITY_PRICES, JOKER_VARIANT_PRICES_MULT
-from balatro_set_core import get_current_blind_info, get_joker_by_name, get_random_joker_by_rarity, get_random_pack_rarity
-from balatro_set_core import ANTE_CONFIG, PACK_RARITIES
-from balatro_set_cards import JOKER_DATABASE, TAROT_DATABASE
-from balatro_set_core import b_create_deck, b_is_set
-from balatro_set_core import trigger_joker_abilities, trigger_consumable_abilities
-
-app = FastAPI()
+from balatro_set_actions import ACTIONS, Action, ActionBatchRequest, parse_action
+from balatro_set_actions import PlaySetRequest, DiscardRequest, BuyJokerRequest, SellJokerRequest, BuyBoosterRequest
+from balatro_set_actions import ChoosePackRewardRequest, LeaveShopRequest, UseConsumableRequest, ReorderJokersRequest
+from balatro_set_actions import SetMoneyRequest, GiveJokerRequest, GiveTarotRequest
+from balatro_set_assets import StaticAssets
+from balatro_set_classes import GameState
+from balatro_set_codec import encode_record, enhancement_table, read_saves, write_saves
+from balatro_set_core import get_current_blind_info
+from balatro_set_engine import GameActionError
+from balatro_set_odds import draw_odds
+from balatro_set_solver import PREVIEW_POOL, call_on_game, get_pool, shutdown_pool, solve, start_pool
+from balatro_set_serialize import encode_game, encode_json
+from balatro_set_sync import StateHistory, StateSubscriber, mark_changed, state_fingerprint
+import balatro_set_engine as engine
+from balatro_set_logging import configure_logging, log_duration, get_trace_sampling, set_trace_sampling, start_request_trace
+from balatro_set_metrics import Counter, Gauge, Histogram, GAME_LOCK_CONTENDED, GAME_LOCK_HOLD_SECONDS, GAME_LOCK_WAIT_SECONDS, estimate_memory, record_set_search, render
+
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loaded here rather than on import: the solver's worker processes import this module again
+    # when the server is started as a script, and they don't need the games
+    GAME_SAVES.update(load_game_saves())
+    # Started before any request rather than by the first hint or preview, on a threadpool thread
+    start_pool(SOLVER_WORKERS)
+    start_pool(PREVIEW_WORKERS, PREVIEW_POOL)
+    try:
+        yield
+    finally:
+        # Saves still waiting for their delay are written before the server exits
+        await asyncio.gather(*SAVE_TASKS)
+        await run_in_threadpool(shutdown_pool)
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,6 +60,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace_id = start_request_trace(game_id=request.query_params.get("id"), trace_id=request.headers.get("x-trace-id"))
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Labelled by route template, so game ids and static paths don't each get a series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUESTS.inc((request.method, route, status))
+        HTTP_LATENCY.observe(time.perf_counter() - start, (request.method, route))
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
 LEADERBOARD_FILE = "leaderboard.json"
 
 N_DIMS = 4
@@ -42,43 +86,64 @@ N_CARDS_TO_DEAL = 12
 DIM_NAMES = ["color", "shape", "number", "shading"]
 
 GAME_SAVES: dict[str, GameState] = {}
-
-if os.path.exists("balatro-saves.json"):
-    with open("balatro-saves.json", "r") as f:
-        data = json.load(f)
-        for uid, game_data in data.items():
-            joker_data = game_data.get("jokers", [])
-            jokers: List['Joker'] = []
-            for j in joker_data:
-                if j["id"] in JOKER_DATABASE:
-                    joker = JOKER_DATABASE[j["id"]].copy()
-                    joker.variant = j["variant"]
-                    jokers.append(joker)
-
-            for idx in range(len(jokers)):
-                jokers[idx].custom_data = joker_data[idx].get("custom_data", {})
-
-            consumable_data = game_data.get("consumables", [])
-            consumables = [TAROT_DATABASE[c["id"]].copy() for c in consumable_data if c["id"] in TAROT_DATABASE]
-            game_state = GameState(
-                id=uid,
-                board_size=game_data.get("board_size", 12),
-                base_board_size=game_data.get("base_board_size", 12),
-                money=game_data.get("money", 4),
-                boards_remaining=game_data.get("boards_remaining", 4),
-                discards_remaining=game_data.get("discards_remaining", 3),
-                ante=game_data.get("ante", 1),
-                current_blind_index=game_data.get("current_blind_index", 0),
-                game_phase=game_data.get("game_phase", "playing"),
-                jokers=jokers,
-                consumables=consumables,
-                set_type_levels=game_data.get("set_type_levels", {}),
-            )
-            game_state.board = [Card(**card) for card in game_data.get("board", [])]
-            game_state.deck = [Card(**card) for card in game_data.get("deck", [])]
-            game_state.discard_pile = [Card(**card) for card in game_data.get("discard_pile", [])]
-            game_state.round_score = game_data.get("round_score", 0)
-            GAME_SAVES[uid] = game_state
+GAME_LOCKS: dict[str, asyncio.Lock] = {}
+STATE_HISTORIES: dict[str, StateHistory] = {}
+# Websocket clients following each game, see balatro_socket
+SUBSCRIBERS: dict[str, set[StateSubscriber]] = {}
+# Saves started by actions, referenced until they finish. At most one of them waits to start.
+SAVE_TASKS: set[asyncio.Task] = set()
+SAVE_FILE_LOCK = asyncio.Lock()
+SAVE_STATE = {"pending": False}
+# Seconds an action's save waits, so that the actions of a burst are saved together
+SAVE_DELAY = 1.0
+# Processes searching a hint, and the longest search a client may ask for
+SOLVER_WORKERS = int(os.environ.get("BALATRO_SOLVER_WORKERS", os.cpu_count() or 1))
+MAX_HINT_BUDGET = 5.0
+# Hints searched at once; each takes every solver worker, so more hints would only share them
+MAX_CONCURRENT_HINTS = 1
+HINT_SLOTS = asyncio.Semaphore(MAX_CONCURRENT_HINTS)
+# Processes scoring previews, apart from the solver's so that previews don't wait for a hint
+PREVIEW_WORKERS = int(os.environ.get("BALATRO_PREVIEW_WORKERS", 1))
+MAX_BATCH_ACTIONS = 32
+# Versions restart from the save file, so ETags also name the server process that handed them out
+BOOT_ID = uuid4().hex[:8]
+# The save browser's index: bumped whenever any game changes, with the encoded body of that version
+SAVES_INDEX = {"version": 0, "body_version": None, "body": b""}
+
+# Served by /metrics, with the engine's metrics from balatro_set_metrics
+HTTP_REQUESTS = Counter("balatro_http_requests_total", "HTTP requests, by method, route and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("balatro_http_request_duration_seconds", "HTTP request latency, by method and route.", ("method", "route"))
+SAVE_SECONDS = Histogram("balatro_save_duration_seconds", "Time saving the games, by phase: encoding them under their locks, then writing the file.", ("phase",))
+SAVE_BYTES = Counter("balatro_save_written_bytes_total", "Bytes written to the save file.")
+SAVE_FILE_BYTES = Gauge("balatro_save_file_bytes", "Size of the last save file written.")
+LEADERBOARD_IO = Histogram("balatro_leaderboard_io_seconds", "Time reading and writing the leaderboard file.", ("operation",))
+GAMES = Gauge("balatro_games", "Games in memory.", collect=lambda: {(): len(GAME_SAVES)})
+GAME_LOCK_COUNT = Gauge("balatro_game_locks", "Per-game locks created.", collect=lambda: {(): len(GAME_LOCKS)})
+GAMES_MEMORY = Gauge("balatro_games_memory_bytes", "Estimated memory held by the games in memory, measured on a sample of them.",
+                     collect=lambda: {(): estimate_memory(list(GAME_SAVES.values()))})
+
+# Games are saved in the binary format of balatro_set_codec; the JSON file of earlier versions is
+# still read if there is no binary save yet, and JSON remains available through the export endpoint
+SAVE_FILE = "balatro-saves.bin"
+JSON_SAVE_FILE = "balatro-saves.json"
+# Encoded save records by game id with the game version they were encoded at. The enhancement table
+# only grows, so the indices in a cached record stay valid.
+SAVE_RECORDS: dict[str, tuple[int, bytes]] = {}
+SAVE_ENHANCEMENTS = enhancement_table()
+
+# The static files, read and compressed once, see balatro_set_assets
+STATIC_ASSETS = StaticAssets("static")
+
+def load_game_saves() -> dict[str, GameState]:
+    """The games of the save file, read at startup (see lifespan)."""
+    if os.path.exists(SAVE_FILE):
+        data = read_saves(SAVE_FILE)
+    elif os.path.exists(JSON_SAVE_FILE):
+        with open(JSON_SAVE_FILE, "r") as f:
+            data = json.load(f)
+    else:
+        data = {}
+    return {uid: engine.game_state_from_dict(uid, game_data) for uid, game_data in data.items()}
 
 
 class SetCard(BaseModel):
@@ -103,20 +168,22 @@ class Score(BaseModel):
     score: int
 
 def get_leaderboard_data() -> list[Score]:
-    if not os.path.exists(LEADERBOARD_FILE):
-        return []
-    with open(LEADERBOARD_FILE, "r") as f:
-        try:
-            data = json.load(f)
-            if not isinstance(data, list):
-                return []
-            return [Score(**item) for item in data]
-        except (json.JSONDecodeError, TypeError):
+    with LEADERBOARD_IO.timer(("read",)):
+        if not os.path.exists(LEADERBOARD_FILE):
             return []
+        with open(LEADERBOARD_FILE, "r") as f:
+            try:
+                data = json.load(f)
+                if not isinstance(data, list):
+                    return []
+                return [Score(**item) for item in data]
+            except (json.JSONDecodeError, TypeError):
+                return []
 
 def save_leaderboard_data(leaderboard: list[Score]):
-    with open(LEADERBOARD_FILE, "w") as f:
-        json.dump([item.dict() for item in leaderboard], f, indent=4)
+    with LEADERBOARD_IO.timer(("write",)):
+        with open(LEADERBOARD_FILE, "w") as f:
+            json.dump([item.dict() for item in leaderboard], f, indent=4)
 
 def is_valid_set(cards: list[SetCard]) -> tuple[bool, str | None]:
     values = [card.to_tuple() for card in cards]
@@ -180,6 +247,7 @@ async def post_score(score: Score):
 
 @app.post("/api/v1/find_set")
 async def find_set(cards: list[SetCard]):
+    record_set_search("find_set", len(cards))
     if len(cards) < N_CARDS_PER_SET:
         return JSONResponse(status_code=400, content={"message": f"At least {N_CARDS_PER_SET} cards must be provided."})
 
@@ -191,6 +259,7 @@ async def find_set(cards: list[SetCard]):
 
 @app.post("/api/v1/find_all_sets")
 async def find_all_sets(cards: list[SetCard]):
+    record_set_search("find_all_sets", len(cards))
     if len(cards) < N_CARDS_PER_SET:
         return JSONResponse(status_code=400, content={"message": f"At least {N_CARDS_PER_SET} cards must be provided."})
 
@@ -203,584 +272,385 @@ async def find_all_sets(cards: list[SetCard]):
 
     return JSONResponse(status_code=200, content={"sets": found_sets, "ok": True})
 
-class PlaySetRequest(BaseModel): card_indices: list[int]
-class BuyJokerRequest(BaseModel): slot_index: int
-class SellJokerRequest(BaseModel): joker_index: int
-class BuyBoosterRequest(BaseModel): slot_index: int
-class ChoosePackRewardRequest(BaseModel): selected_ids: list[str]
-
-class UseConsumableRequest(BaseModel):
-    consumable_index: int
-    target_card_indices: list[int] | None = None
-
-class ReorderJokersRequest(BaseModel):
-    new_order: list[int]
-
-@app.post("/api/balatro/new_run", response_model=GameState)
-async def new_run():
-    deck_cards = [Card(attributes=attr) for attr in b_create_deck()]
-    random.shuffle(deck_cards)
-    current_game = GameState(
-        board_size=12, base_board_size=12, money=4, boards_remaining=4, discards_remaining=3, ante=1,
-        current_blind_index=0, game_phase="playing",
-        jokers=[],
-        set_type_levels={"3_uniform_1_ladder": 2, "2_uniform_2_ladder": 2, "1_uniform_3_ladder": 2, "0_uniform_4_ladder": 2}
-    )
-    current_game.board = deck_cards[:current_game.board_size]
-    current_game.deck = deck_cards[current_game.board_size:]
+def get_game_lock(id: str) -> asyncio.Lock:
+    """Returns the lock guarding a single game, creating it on first use."""
+    lock = GAME_LOCKS.get(id)
+    if lock is None:
+        lock = GAME_LOCKS[id] = asyncio.Lock()
+    return lock
+
+@asynccontextmanager
+async def locked_game(id: str):
+    """Holds the per-game lock for `id` and yields its GameState.
 
+    Requests for the same game are serialized, requests for different games are not.
+    """
+    if id not in GAME_SAVES:
+        raise HTTPException(status_code=404, detail="Game not found.")
+    lock = get_game_lock(id)
+    if lock.locked():
+        GAME_LOCK_CONTENDED.inc()
+    with GAME_LOCK_WAIT_SECONDS.timer():
+        await lock.acquire()
+    try:
+        with GAME_LOCK_HOLD_SECONDS.timer():
+            # The game may have been deleted while we were waiting
+            if id not in GAME_SAVES:
+                raise HTTPException(status_code=404, detail="Game not found.")
+            yield GAME_SAVES[id]
+    finally:
+        lock.release()
+
+@app.exception_handler(GameActionError)
+async def game_action_error_handler(request: Request, exc: GameActionError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+def get_state_history(id: str) -> StateHistory:
+    history = STATE_HISTORIES.get(id)
+    if history is None:
+        history = STATE_HISTORIES[id] = StateHistory()
+    return history
+
+def publish_change(game: GameState, source: StateSubscriber | None = None):
+    """Bumps the version of a game an action changed.
+
+    Websocket clients following the game, other than the `source` of the action, get the change pushed.
+    """
+    mark_changed(game)
+    SAVES_INDEX["version"] += 1
+    for subscriber in SUBSCRIBERS.get(game.id, ()):
+        if subscriber is not source:
+            subscriber.notify()
+
+def state_update(game: GameState, since: int | None, source: StateSubscriber | None = None) -> dict:
+    """Bumps the version of a game an action changed and returns its new state, as a patch against `since` if possible."""
+    publish_change(game, source)
+    return get_state_history(game.id).update(game, since)
+
+def apply_action(game: GameState, action: Action, request: BaseModel, since: int | None, source: StateSubscriber | None = None) -> dict:
+    """Applies an action from ACTIONS and returns its reply: the new state plus what the action reports."""
+    before = state_fingerprint(game)
+    try:
+        result = action.apply(game, request)
+    except Exception:
+        # Most failures are rejected requests that changed nothing. One that changed the game before
+        # failing leaves nothing cached for the current version (sections, payloads, ETag) valid.
+        if state_fingerprint(game) != before:
+            game.mark_dirty()
+            publish_change(game, source)
+        raise
+    if action.saves:
+        schedule_save()
+    return {**state_update(game, since, source), **result}
+
+async def run_preview(fn, game_data: dict, *args):
+    """`fn(game, *args)` in the preview worker processes, on a game dumped under its lock.
+
+    For the CPU-bound previews, which would otherwise hold the event loop and the game lock. They
+    can't run on a thread: scoring rolls some jokers with the global RNG and restores its state
+    afterwards, which would undo the rolls of the requests handled in between. The worker starts
+    from this process's RNG state, so previews roll what they would have rolled here.
+    """
+    future = get_pool(PREVIEW_WORKERS, PREVIEW_POOL).submit(call_on_game, fn, game_data, *args, random_state=random.getstate())
+    return await asyncio.wrap_future(future)
+
+def schedule_save():
+    """Saves the games after SAVE_DELAY. Saves requested while one is waiting are merged into it,
+    so the file is written at most once per delay however many actions come in."""
+    if SAVE_STATE["pending"]:
+        return
+    SAVE_STATE["pending"] = True
+    task = asyncio.create_task(delayed_save())
+    SAVE_TASKS.add(task)
+    task.add_done_callback(SAVE_TASKS.discard)
+
+async def delayed_save():
+    await asyncio.sleep(SAVE_DELAY)
+    async with SAVE_FILE_LOCK:
+        # Games may change again once the snapshot has passed them, so later actions need a new save
+        SAVE_STATE["pending"] = False
+        await snapshot_and_write_saves()
+
+def cached_response(request: Request, etag: str, body: bytes | None = None, content=None) -> Response:
+    """304 if the client's If-None-Match has `etag`, else the body (or `content`) tagged with it.
+
+    `no-cache` makes browsers revalidate every time, so polling a state that didn't change costs a 304.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        body = encode_json(content)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/api/balatro/new_run")
+async def new_run(auto_refresh_dead_board: bool = False):
     uid = str(uuid4())
-    current_game.id = uid
+    current_game = engine.new_game(uid, auto_refresh_dead_board)
     GAME_SAVES[uid] = current_game
+    SAVES_INDEX["version"] += 1
 
-    return JSONResponse(content=current_game.model_dump())
+    return get_state_history(uid).payload(current_game)
 
 @app.get("/api/balatro/state")
-async def get_state(id: str):
-    
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-
-    blind_info = get_current_blind_info(current_game)
-    return {**current_game.model_dump(), "current_blind": blind_info["name"], "blind_score_required": blind_info["score_required"]}
+async def get_state(request: Request, id: str, since: int | None = None):
+    """The full state, or `{"game_state_patch": ...}` against the version `since` the client already has.
+
+    Tagged with the game version: If-None-Match with the current tag returns 304.
+    """
+    async with locked_game(id) as current_game:
+        history = get_state_history(id)
+        etag = f'"{BOOT_ID}-{current_game.version}"'
+        if since is not None:
+            update = history.update(current_game, since)
+            if "game_state_patch" in update:
+                return cached_response(request, etag, content=update)
+        return cached_response(request, etag, body=history.body(current_game))
 
 @app.post("/api/balatro/play_set")
-async def play_set(request: PlaySetRequest, id: str, background_tasks: BackgroundTasks):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-
-    if not current_game or current_game.game_phase != "playing":
-        raise HTTPException(status_code=400, detail="Not in a playing phase.")
-    if len(request.card_indices) != 3:
-        raise HTTPException(status_code=400, detail="Must select exactly 3 cards.")
-    if current_game.boards_remaining <= 0:
-        raise HTTPException(status_code=400, detail="No boards remaining.")
-    selected_cards = [current_game.board[i] for i in request.card_indices]
-    if not b_is_set([card.attributes for card in selected_cards]):
-        raise HTTPException(status_code=400, detail="Not a valid set.")
-
-    attributes = [card.attributes for card in selected_cards]
-    uniform_features, ladder_features = 0, 0
-    for i in range(4):
-        feature_values = {attrs[i] for attrs in attributes}
-        if len(feature_values) == 1:
-            uniform_features += 1
-        elif len(feature_values) == 3:
-            ladder_features += 1
-
-    set_type_string = f"{uniform_features}_uniform_{ladder_features}_ladder"
-    current_game.played_set_types.append(set_type_string)
-    
-    level = current_game.set_type_levels.get(set_type_string, 1)
-
-    base_chips = (10 + (5 * uniform_features)) + (15 * (level - 1))
-    base_mult = (1 + ladder_features * 2) * (1 + (level - 1) * 0.5)
-
-    scoring_ctx = ScoringContext(
-        base_chips=base_chips,
-        base_mult=base_mult,
-        flat_chips=0,
-        additive_mult=0,
-        multiplicative_mult=1,
-        uniform_features=uniform_features,
-        ladder_features=ladder_features,
-        set_type_string=set_type_string,
-        score_log=[],
-        scoring_cards=selected_cards
-    )
-
-    # Log base set score
-    scoring_ctx.score_log.append(ScoreLogEntry(
-        source_type='set',
-        source_name=f"Played Set ({uniform_features}U, {ladder_features}L)",
-        description=f"Base score for a level {level} set.",
-        chips_before=0, mult_before=0,
-        chips_after=scoring_ctx.base_chips, mult_after=scoring_ctx.base_mult,
-        trigger_phase="set_base"
-    ))
-
-    # Score each card individually, then trigger jokers for that card
-    for card in selected_cards:
-        # Set the current card being scored
-        scoring_ctx.current_scoring_card = card
-        
-        card_scored = False
-        chips_before = scoring_ctx.base_chips + scoring_ctx.flat_chips
-        mult_before = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
-        
-        card_mult_modifier = 1.0
-
-        if card.enhancement == "bonus_chips":
-            scoring_ctx.flat_chips += 30
-            scoring_ctx.score_log.append(ScoreLogEntry(
-                source_type='card', source_name="Bonus Chips", description="+30 Chips",
-                chips_before=chips_before, mult_before=mult_before,
-                chips_after=scoring_ctx.base_chips + scoring_ctx.flat_chips, mult_after=mult_before,
-                trigger_phase="card_scoring"
-            ))
-        elif card.enhancement == "bonus_mult":
-            scoring_ctx.additive_mult += 2
-            scoring_ctx.score_log.append(ScoreLogEntry(
-                source_type='card', source_name="Bonus Mult", description="+2 Mult",
-                chips_before=chips_before, mult_before=mult_before,
-                chips_after=chips_before, mult_after=(scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult,
-                trigger_phase="card_scoring"
-            ))
-        elif card.enhancement == "x_mult":
-            card_mult_modifier = 1.5
-            # The effect is logged after all other card-specific triggers
-        elif card.enhancement == "gold":
-            current_game.money += 3
-            scoring_ctx.score_log.append(ScoreLogEntry(
-                source_type='card', source_name="Gold Card", description="+$3",
-                chips_before=chips_before, mult_before=mult_before,
-                chips_after=chips_before, mult_after=mult_before,
-                trigger_phase="card_scoring"
-            ))
-        elif card.enhancement == "wildcard":
-            # Wildcards provide no chips or mult, but can be part of any set
-            scoring_ctx.score_log.append(ScoreLogEntry(
-                source_type='card', source_name="Wildcard", description="Wildcard (no score)",
-                chips_before=chips_before, mult_before=mult_before,
-                chips_after=chips_before, mult_after=mult_before,
-                trigger_phase="card_scoring"
-            ))
-
-        # Trigger jokers for this card
-        trigger_joker_abilities(GameContext(game=current_game, scoring=scoring_ctx), JokerTrigger.ON_SCORE_CARD)
-
-        # Apply card-specific multiplicative multipliers after jokers
-        if card.enhancement == "x_mult":
-            chips_before_x = scoring_ctx.base_chips + scoring_ctx.flat_chips
-            mult_before_x = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
-            scoring_ctx.multiplicative_mult *= card_mult_modifier
-            scoring_ctx.score_log.append(ScoreLogEntry(
-                source_type='card', source_name="X-Mult Card", description="x1.5 Mult",
-                chips_before=chips_before_x, mult_before=mult_before_x,
-                chips_after=chips_before_x, mult_after=(scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult,
-                trigger_phase="card_scoring"
-            ))
-        
-        if card.enhancement == "amplify":
-            # If this card amplifies, we need to double the chips of other enhancements
-            chips_before_amplify = scoring_ctx.base_chips + scoring_ctx.flat_chips
-            mult_before_amplify = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
-            scoring_ctx.flat_chips *= 2
-            scoring_ctx.additive_mult *= 2
-            scoring_ctx.score_log.append(ScoreLogEntry(
-                source_type='card', source_name="Amplified Card", description="Doubled Chips and Mult",
-                chips_before=chips_before_amplify, mult_before=mult_before_amplify,
-                chips_after=scoring_ctx.base_chips + scoring_ctx.flat_chips, mult_after=(scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult,
-                trigger_phase="card_scoring"
-            ))
-
-    # Clear the current scoring card before final triggers
-    scoring_ctx.current_scoring_card = None
-    
-    # After all cards, trigger jokers for the end of scoring
-    trigger_joker_abilities(GameContext(game=current_game, scoring=scoring_ctx), JokerTrigger.ON_SCORE_CALCULATION)
-
-    chips = scoring_ctx.base_chips + scoring_ctx.flat_chips
-    mult = (scoring_ctx.base_mult + scoring_ctx.additive_mult) * scoring_ctx.multiplicative_mult
-    score_gained = int(chips * mult)
-    current_game.round_score += score_gained
-
-    current_game.discard_pile.extend(selected_cards)
-    for i in sorted(request.card_indices, reverse=True):
-        current_game.board.pop(i)
-
-    draw_count = max(0, current_game.board_size - len(current_game.board))
-    if len(current_game.deck) < draw_count:
-        current_game.deck.extend(current_game.discard_pile)
-        random.shuffle(current_game.deck)
-        current_game.discard_pile = []
-
-    new_cards = current_game.deck[:draw_count]
-    current_game.board.extend(new_cards)
-    current_game.deck = current_game.deck[draw_count:]
-    current_game.boards_remaining -= 1
-
-    blind_info = get_current_blind_info(current_game)
-    if current_game.round_score >= blind_info["score_required"]:
-        interest_cap = 5
-        interest_earned = min(current_game.money // 5, interest_cap)
-        current_game.money += interest_earned
-
-        trigger_joker_abilities(GameContext(game=current_game), JokerTrigger.ON_END_OF_ROUND)
-
-        current_game.game_phase = "shop"
-        current_game.money += 3 + current_game.boards_remaining
-        current_game.shop_state = ShopState()
-        available_jokers = [j for j in JOKER_DATABASE.values() if j.name not in {j.name for j in current_game.jokers}]
-        
-        num_jokers_to_add = min(2, len(available_jokers))
-        for _ in range(num_jokers_to_add):
-            if not available_jokers:
-                break
-            
-            joker_to_add = get_random_joker_by_rarity(available_jokers)
-            if not joker_to_add:
-                continue
-
-            available_jokers = [j for j in available_jokers if j.name != joker_to_add.name]
-
-            price = math.ceil(JOKER_RARITY_PRICES.get(joker_to_add.rarity, 4) * JOKER_VARIANT_PRICES_MULT[joker_to_add.variant])
-            current_game.shop_state.joker_slots.append(ShopSlot(item=joker_to_add, price=price))
-        current_game.shop_state.booster_pack_slots.append(BoosterPack(name="Celestial Pack", price=4))
-        current_game.shop_state.booster_pack_slots.append(BoosterPack(name="Tarot Pack", price=3))
-    elif current_game.boards_remaining <= 0:
-        current_game.game_phase = "game_over"
-
-    game_state_dict = current_game.model_dump()
-    game_state_dict["current_blind"] = blind_info["name"]
-    game_state_dict["blind_score_required"] = blind_info["score_required"]
-
-    final_scoring_details = {
-        "chips": chips,
-        "mult": mult,
-        "score_gained": score_gained,
-        "score_log": [log.model_dump() for log in scoring_ctx.score_log]
+async def play_set(request: PlaySetRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["play_set"], request, since)
+
+@app.get("/api/balatro/preview_sets")
+async def preview_sets(id: str, expected: bool = False):
+    """Every valid set on the board with the score it would get right now, best first. Changes nothing.
+    With `expected`, sets are ranked by their exact expected score over the rolls of random jokers."""
+    async with locked_game(id) as current_game:
+        game_data = current_game.model_dump()
+        score_remaining = engine.score_remaining(current_game)
+    previews = await run_preview(engine.preview_sets, game_data, expected)
+    return {
+        "sets": [preview._asdict() for preview in previews],
+        "score_remaining": score_remaining,
     }
 
-    background_tasks.add_task(save_game_saves)
+@app.post("/api/balatro/score_distribution")
+async def score_distribution(request: PlaySetRequest, id: str):
+    """The exact score distribution of a candidate set: mean, variance and the chance to clear the blind."""
+    async with locked_game(id) as current_game:
+        game_data = current_game.model_dump()
+        score_remaining = engine.score_remaining(current_game)
+    distribution = await run_preview(engine.preview_distribution, game_data, request.card_indices)
+    return {
+        "mean": distribution.mean,
+        "variance": distribution.variance,
+        "std_dev": math.sqrt(distribution.variance),
+        "score_remaining": score_remaining,
+        "clear_probability": distribution.probability_at_least(score_remaining),
+        "outcomes": [{"score": score, "probability": p} for score, p in distribution.outcomes.items()],
+    }
 
-    return {"game_state": game_state_dict, "scoring_details": final_scoring_details}
+class DrawOddsRequest(BaseModel):
+    card_indices: list[int] = []
+    set_types: list[str] | None = None
 
-class DiscardRequest(BaseModel): card_indices: list[int]
+@app.post("/api/balatro/draw_odds")
+async def get_draw_odds(request: DrawOddsRequest, id: str):
+    """Chance that the board holds a set of each type after `card_indices` are played or discarded and refilled."""
+    async with locked_game(id) as current_game:
+        snapshot = engine.clone_game(current_game)
+    # The sampler has its own seeded RNG, so unlike the score previews this can run on a thread
+    odds = await run_in_threadpool(draw_odds, snapshot, request.card_indices, request.set_types)
+    return odds._asdict()
 
 @app.post("/api/balatro/discard")
-async def discard(request: DiscardRequest, id: str):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    
-    current_game = GAME_SAVES[id]
-
-    if not current_game or current_game.game_phase != "playing": raise HTTPException(status_code=400, detail="Not in a playing phase.")
-    if not (1 <= len(request.card_indices) <= 5): raise HTTPException(status_code=400, detail="Must select between 1 and 5 cards to discard.")
-    if current_game.discards_remaining <= 0: raise HTTPException(status_code=400, detail="No discards remaining.")
-    
-    selected_cards = [current_game.board[i] for i in request.card_indices]
-    current_game.discard_pile.extend(selected_cards)
-    for i in sorted(request.card_indices, reverse=True):
-        current_game.board.pop(i)
-    
-    trigger_joker_abilities(GameContext(game=current_game, selected_card_indices=request.card_indices), JokerTrigger.ON_DISCARD)
-
-    draw_count = max(0, current_game.board_size - len(current_game.board))
-    if len(current_game.deck) < draw_count:
-        current_game.deck.extend(current_game.discard_pile)
-        random.shuffle(current_game.deck)
-        current_game.discard_pile = []
-    
-    new_cards = current_game.deck[:draw_count]
-    current_game.board.extend(new_cards)
-    current_game.deck = current_game.deck[draw_count:]
-    current_game.discards_remaining -= 1
-    
-    blind_info = get_current_blind_info(current_game)
-    game_state_dict = current_game.model_dump()
-    game_state_dict["current_blind"] = blind_info["name"]
-    game_state_dict["blind_score_required"] = blind_info["score_required"]
-    return {"game_state": game_state_dict}
+async def discard(request: DiscardRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["discard"], request, since)
 
 @app.post("/api/balatro/buy_joker")
-async def buy_joker(request: BuyJokerRequest, id: str):
-    
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-
-    if not current_game or current_game.game_phase != "shop": raise HTTPException(status_code=400, detail="Not in a shop phase.")
-    if len(current_game.jokers) >= current_game.joker_slots: raise HTTPException(status_code=400, detail="No empty joker slots.")
-    slot_index = request.slot_index
-    if not (0 <= slot_index < len(current_game.shop_state.joker_slots)): raise HTTPException(status_code=400, detail="Invalid shop slot.")
-    slot = current_game.shop_state.joker_slots[slot_index]
-    if slot.is_purchased: raise HTTPException(status_code=400, detail="Item already purchased.")
-    if current_game.money < slot.price: raise HTTPException(status_code=400, detail="Not enough money.")
-    
-    joker_to_buy = slot.item.copy()
-
-    for ability_def in joker_to_buy.abilities:
-        if ability_def.trigger == JokerTrigger.ON_BUY_SELF:
-            ability_def.ability(joker_to_buy, GameContext(game=current_game))
-            
-    current_game.money -= slot.price
-    current_game.jokers.append(joker_to_buy)
-    """ if slot.item.variant == JokerVariant.NEGATIVE:
-        current_game.joker_slots += 1 """
-    slot.is_purchased = True
-    trigger_joker_abilities(GameContext(game=current_game), JokerTrigger.ON_BUY_JOKER)
-    return {"game_state": current_game.model_dump()}
+async def buy_joker(request: BuyJokerRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["buy_joker"], request, since)
 
 @app.post("/api/balatro/sell_joker")
-async def sell_joker(request: SellJokerRequest, id: str):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-
-    if not current_game or current_game.game_phase != "shop":
-        raise HTTPException(status_code=400, detail="Can only sell jokers during the shop phase.")
-    
-    joker_index = request.joker_index
-    if not (0 <= joker_index < len(current_game.jokers)):
-        raise HTTPException(status_code=400, detail="Invalid joker index.")
-
-    joker_to_sell = current_game.jokers.pop(joker_index)
-    # Trigger destroy-self abilities for the sold joker
-    for ability_def in joker_to_sell.abilities:
-        if ability_def.trigger == JokerTrigger.ON_DESTROY_SELF:
-            ability_def.ability(joker_to_sell, GameContext(game=current_game))
-    # Sell price is half of the rarity price, rounded down
-    sell_price = math.ceil(JOKER_RARITY_PRICES.get(joker_to_sell.rarity, 4) * JOKER_VARIANT_PRICES_MULT[joker_to_sell.variant]) // 2
-    current_game.money += sell_price
-    """ if joker_to_sell.variant == JokerVariant.NEGATIVE:
-        current_game.joker_slots -= 1 """
-    trigger_joker_abilities(GameContext(game=current_game), JokerTrigger.ON_DESTROY_JOKER)
-    return {"game_state": current_game.model_dump(), "message": f"Sold {joker_to_sell.name} for ${sell_price}."}
+async def sell_joker(request: SellJokerRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["sell_joker"], request, since)
 
 @app.post("/api/balatro/buy_booster_pack")
-async def buy_booster_pack(request: BuyBoosterRequest, id: str):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-    
-    if not current_game or current_game.game_phase != "shop": raise HTTPException(status_code=400, detail="Not in a shop phase.")
-    slot_index = request.slot_index
-    if not (0 <= slot_index < len(current_game.shop_state.booster_pack_slots)): raise HTTPException(status_code=400, detail="Invalid pack slot.")
-    pack = current_game.shop_state.booster_pack_slots[slot_index]
-    if pack.is_purchased: raise HTTPException(status_code=400, detail="Pack already purchased.")
-    if current_game.money < pack.price: raise HTTPException(status_code=400, detail="Not enough money.")
-    
-    current_game.money -= pack.price
-    pack.is_purchased = True
-    
-    rarity = get_random_pack_rarity()
-    rarity_info = PACK_RARITIES[rarity]
-    
-    choices = []
-    if pack.name == "Celestial Pack":
-        # Filter out the "4 Uniform, 0 Ladder" set type as it's practically unachievable.
-        all_set_types = [st for st in current_game.set_type_levels.keys() if st != "4_uniform_0_ladder"]
-        random.shuffle(all_set_types)
-        
-        # Ensure we don't try to show more choices than available
-        num_to_show = min(rarity_info['show'], len(all_set_types))
-
-        for type_key in all_set_types[:num_to_show]:
-            level = current_game.set_type_levels[type_key]
-            name = type_key.replace("_", " ").replace("ladder", "L").replace("uniform", "U")
-            choices.append(PackOpeningChoice(id=type_key, name=f"Level up {name}", description=f"From Level {level} to {level + 1}"))
-    elif pack.name == "Tarot Pack":
-        if len(current_game.consumables) >= current_game.consumable_slots:
-            current_game.money += pack.price # Refund
-            pack.is_purchased = False
-            raise HTTPException(status_code=400, detail="Not enough consumable slots to open pack.")
-        
-        available_tarots = list(TAROT_DATABASE.items())
-        
-        pack_choices = []
-        for _ in range(rarity_info['show']):
-            if not available_tarots:
-                break
-            
-            result = random.choice(available_tarots)
-            if not result:
-                continue
-            chosen_key, chosen_card = result
-            
-            pack_choices.append(PackOpeningChoice(id=chosen_key, name=chosen_card.name, description=chosen_card.description))
-            
-            available_tarots = [(k, c) for k, c in available_tarots if k != chosen_key]
-        choices = pack_choices
-
-    current_game.pack_opening_state = PackOpeningState(
-        pack_type=pack.name,
-        choices=choices,
-        rarity=rarity,
-        choose=rarity_info['choose']
-    )
-    current_game.game_phase = "pack_opening"
-    
-    return {"game_state": current_game.model_dump()}
+async def buy_booster_pack(request: BuyBoosterRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["buy_booster_pack"], request, since)
 
 @app.post("/api/balatro/choose_pack_reward")
-async def choose_pack_reward(request: ChoosePackRewardRequest, id: str):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-    if not current_game or current_game.game_phase != "pack_opening":
-        raise HTTPException(status_code=400, detail="Not in pack opening phase.")
-    
-    pack_state = current_game.pack_opening_state
-    if len(request.selected_ids) > pack_state.choose:
-        raise HTTPException(status_code=400, detail=f"Can only choose up to {pack_state.choose} rewards.")
-
-    message = ""
-    if pack_state.pack_type == "Celestial Pack":
-        upgraded_names = []
-        for type_key in request.selected_ids:
-            current_game.set_type_levels[type_key] += 1
-            upgraded_names.append(type_key.replace("_", " ").replace("ladder", "L").replace("uniform", "U"))
-        message = f"Upgraded: {', '.join(upgraded_names)}!"
-    elif pack_state.pack_type == "Tarot Pack":
-        gained_cards = []
-        for card_key in request.selected_ids:
-            if len(current_game.consumables) < current_game.consumable_slots:
-                card = TAROT_DATABASE[card_key]
-                current_game.consumables.append(card)
-                gained_cards.append(card.name)
-        message = f"Gained: {', '.join(gained_cards)}!"
-
-    current_game.pack_opening_state = None
-    current_game.game_phase = "shop"
-    
-    return {"game_state": current_game.model_dump(), "message": message}
+async def choose_pack_reward(request: ChoosePackRewardRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["choose_pack_reward"], request, since)
 
 @app.post("/api/balatro/use_consumable")
-async def use_consumable(request: UseConsumableRequest, id: str):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-
-    if not current_game or current_game.game_phase != "playing": raise HTTPException(status_code=400, detail="Can only use consumables during a round.")
-    index = request.consumable_index
-    if not (0 <= index < len(current_game.consumables)): raise HTTPException(status_code=400, detail="Invalid consumable index.")
-    
-    consumable = current_game.consumables[index] # Don't pop yet
-
-    # Validation for target count
-    if consumable.target_count > 0:
-        if not request.target_card_indices or len(request.target_card_indices) != consumable.target_count:
-            raise HTTPException(status_code=400, detail=f"This consumable requires selecting {consumable.target_count} card(s).")
-
-    # Now pop it
-    consumable = current_game.consumables.pop(index)
-    current_game.last_consumable_used = consumable
-    
-    consumable_ctx = ConsumableContext(game=current_game, message=f"Used {consumable.name}.")
-    game_ctx = GameContext(
-        game=current_game,
-        consumable=consumable_ctx,
-        selected_card_indices=request.target_card_indices or []
-    )
-    trigger_consumable_abilities(current_game, consumable, ConsumableTrigger.ON_USE, game_ctx)
-    # Trigger jokers on consumable use
-    trigger_joker_abilities(game_ctx, JokerTrigger.ON_CONSUMABLE_USE)
-    return {"game_state": current_game.model_dump(), "message": game_ctx.consumable.message}
+async def use_consumable(request: UseConsumableRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["use_consumable"], request, since)
+
+@app.get("/api/balatro/optimal_joker_order")
+async def optimal_joker_order(id: str):
+    """The joker order with the highest expected score for the best set on the board, for reorder_jokers."""
+    async with locked_game(id) as current_game:
+        game_data = current_game.model_dump()
+    return (await run_preview(engine.optimal_joker_order, game_data))._asdict()
+
+@app.get("/api/balatro/hint")
+async def hint(id: str, budget: float = 0.5):
+    """Suggests the next play or discard, found by the MCTS solver within `budget` seconds."""
+    async with locked_game(id) as current_game:
+        if current_game.game_phase != "playing":
+            raise GameActionError("Not in a playing phase.")
+        snapshot = engine.clone_game(current_game)
+    # Searched in the solver's process pool, so neither the event loop nor the game lock waits on it.
+    # Other hints wait for a slot, here rather than in the pool's queue where their budget would run out.
+    budget = min(max(budget, 0.05), MAX_HINT_BUDGET)
+    async with HINT_SLOTS:
+        result = await run_in_threadpool(solve, snapshot, budget, SOLVER_WORKERS, None, None, False)
+    return {
+        "action": result.kind,
+        "card_indices": result.card_indices,
+        "clear_probability": result.clear_probability,
+        "iterations": result.iterations,
+        "alternatives": [action._asdict() for action in result.actions],
+    }
 
 @app.post("/api/balatro/reorder_jokers")
-async def reorder_jokers(request: ReorderJokersRequest, id: str):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-
-    if not current_game or current_game.game_phase not in ["playing", "shop"]:
-        raise HTTPException(status_code=400, detail="Can only reorder jokers during playing or shop phase.")
-
-    new_order_indices = request.new_order
-    jokers = current_game.jokers
-
-    if len(new_order_indices) != len(jokers) or set(new_order_indices) != set(range(len(jokers))):
-        raise HTTPException(status_code=400, detail="Invalid new order provided.")
-
-    reordered_jokers = [jokers[i] for i in new_order_indices]
-    current_game.jokers = reordered_jokers
-
-    # No need to return the full game state, just a success message is fine
-    # to reduce network traffic, but returning state is also okay.
-    return {"game_state": current_game.model_dump()}
+async def reorder_jokers(request: ReorderJokersRequest, id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["reorder_jokers"], request, since)
 
 @app.post("/api/balatro/leave_shop")
-async def leave_shop(id: str):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-
-    if not current_game or current_game.game_phase != "shop": raise HTTPException(status_code=400, detail="Not in a shop phase.")
-    
-    current_game.current_blind_index += 1
-    if current_game.current_blind_index >= len(ANTE_CONFIG[current_game.ante]["names"]):
-        current_game.ante += 1
-        current_game.current_blind_index = 0
-        if current_game.ante > max(ANTE_CONFIG.keys()):
-            current_game.game_phase = "run_won"
-            return {"game_state": current_game.model_dump()}
-    
-    current_game.game_phase = "playing"
-    current_game.round_score = 0
-    current_game.boards_remaining = current_game.boards_per_round
-    current_game.discards_remaining = current_game.discards_per_round
-    current_game.played_set_types = []
-    current_game.board_size = current_game.base_board_size
-
-    # Reshuffle all cards back into the deck
-    all_cards = current_game.deck + current_game.board + current_game.discard_pile
-    random.shuffle(all_cards)
-    
-    current_game.board = all_cards[:current_game.board_size]
-    current_game.deck = all_cards[current_game.board_size:]
-    current_game.discard_pile = []
-    
-    ante_info = ANTE_CONFIG.get(current_game.ante, {})
-    boss_effects = ante_info.get("boss_effects")
-    current_game.boss_blind_effect = boss_effects[current_game.current_blind_index] if boss_effects and current_game.current_blind_index < len(boss_effects) else None
-    
-    if current_game.boss_blind_effect == "reduce_board_size":
-        current_game.board_size = 9
-        if len(current_game.board) > current_game.board_size:
-            cards_to_discard_count = len(current_game.board) - current_game.board_size
-            cards_to_discard = random.sample(current_game.board, cards_to_discard_count)
-            current_game.discard_pile.extend(cards_to_discard)
-            current_game.board = [card for card in current_game.board if card not in cards_to_discard]
-    
-    blind_info = get_current_blind_info(current_game)
-    game_state_dict = current_game.model_dump()
-    game_state_dict["current_blind"] = blind_info["name"]
-    game_state_dict["blind_score_required"] = blind_info["score_required"]
-
-    trigger_joker_abilities(GameContext(game=current_game), JokerTrigger.ON_START_ROUND) #May not work correctly
-    return {"game_state": game_state_dict}
+async def leave_shop(id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["leave_shop"], LeaveShopRequest(), since)
 
 @app.post("/api/balatro/set_money", include_in_schema=False)
-async def set_money(id: str, amount: int):
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-    current_game.money = amount
-    return {"game_state": current_game.model_dump()}
+async def set_money(id: str, amount: int, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["set_money"], SetMoneyRequest(amount=amount), since)
 
 @app.post("/api/balatro/give_joker", include_in_schema=False)
-async def give_joker(id: str, joker_id: str):
-    from balatro_set_core import JOKER_DATABASE
-    if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-    if joker_id not in JOKER_DATABASE:
-        raise HTTPException(status_code=400, detail="Invalid joker id.")
-    if len(current_game.jokers) >= current_game.joker_slots:
-        raise HTTPException(status_code=400, detail="No empty joker slots.")
-    joker = JOKER_DATABASE[joker_id].copy()
-    current_game.jokers.append(joker)
-    return {"game_state": current_game.model_dump()}
+async def give_joker(id: str, joker_id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["give_joker"], GiveJokerRequest(joker_id=joker_id), since)
 
 @app.post("/api/balatro/give_tarot", include_in_schema=False)
-async def give_tarot(id: str, tarot_id: str):
-    from balatro_set_core import TAROT_DATABASE
+async def give_tarot(id: str, tarot_id: str, since: int | None = None):
+    async with locked_game(id) as current_game:
+        return apply_action(current_game, ACTIONS["give_tarot"], GiveTarotRequest(tarot_id=tarot_id), since)
+
+@app.post("/api/balatro/actions")
+async def run_actions(request: ActionBatchRequest, id: str, since: int | None = None):
+    """Applies a list of actions in order, all or nothing: the state after the last one plus each action's result.
+
+    The actions run on a copy of the game that replaces it only if all of them succeed, so a
+    failing action leaves the game (and the random state) as it was. One version bump, one save.
+    """
+    if len(request.actions) > MAX_BATCH_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ACTIONS} actions per batch.")
+    parsed = []
+    for index, item in enumerate(request.actions):
+        try:
+            parsed.append(parse_action(item.action, item.params))
+        except GameActionError as exc:
+            return JSONResponse(status_code=400, content={"detail": str(exc), "index": index})
+
+    async with locked_game(id) as current_game:
+        batch_game = engine.clone_game(current_game)
+        random_state = random.getstate()
+        results = []
+        try:
+            for index, (action, action_request) in enumerate(parsed):
+                results.append({"action": request.actions[index].action, **action.apply(batch_game, action_request)})
+        except Exception as exc:
+            random.setstate(random_state)
+            if not isinstance(exc, GameActionError):
+                raise
+            return JSONResponse(status_code=400, content={"detail": f"{request.actions[index].action}: {exc}", "index": index})
+        GAME_SAVES[id] = batch_game
+        if any(action.saves for action, _ in parsed):
+            schedule_save()
+        return {**state_update(batch_game, since), "results": results}
+
+@app.websocket("/ws/balatro/{id}")
+async def balatro_socket(websocket: WebSocket, id: str):
+    """The game's actions over one connection, with the changes and score events of every client pushed.
+
+    Client: `{"id": 1, "action": "play_set", "params": {"card_indices": [0, 1, 2]}, "since": 7}`, with
+    the actions and params of ACTIONS; `since` defaults to the last state this connection received.
+    Server: `{"type": "result", "id": 1, "game_state"|"game_state_patch": ..., ...}` with what the HTTP
+    endpoint returns, `{"type": "error", "id": 1, "detail": ...}`, and pushed `{"type": "state", ...}`
+    and `{"type": "score_event", "entry": ...}` messages.
+    """
     if id not in GAME_SAVES:
-        raise HTTPException(status_code=404, detail="Game not found.")
-    current_game = GAME_SAVES[id]
-    if tarot_id not in TAROT_DATABASE:
-        raise HTTPException(status_code=400, detail="Invalid tarot id.")
-    if len(current_game.consumables) >= current_game.consumable_slots:
-        raise HTTPException(status_code=400, detail="No empty consumable slots.")
-    tarot = TAROT_DATABASE[tarot_id]
-    current_game.consumables.append(tarot)
-    return {"game_state": current_game.model_dump()}
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    subscriber = StateSubscriber(get_state_history(id), lambda: GAME_SAVES.get(id))
+    SUBSCRIBERS.setdefault(id, set()).add(subscriber)
+    # The first push is the full state
+    subscriber.notify()
+    sender = asyncio.create_task(subscriber.run(lambda message: websocket.send_text(encode_json(message).decode())))
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (ValueError, KeyError):
+                await subscriber.put({"type": "error", "id": None, "detail": "Messages must be JSON objects."})
+                continue
+            await subscriber.put(await socket_action(id, message, subscriber))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        SUBSCRIBERS.get(id, set()).discard(subscriber)
+        if not SUBSCRIBERS.get(id, True):
+            del SUBSCRIBERS[id]
+
+async def socket_action(id: str, message, subscriber: StateSubscriber) -> dict:
+    """Applies one websocket action and returns the reply to queue for its client."""
+    if not isinstance(message, dict):
+        return {"type": "error", "id": None, "detail": "Messages must be JSON objects."}
+    request_id = message.get("id")
+    since = message.get("since", subscriber.version)
+    try:
+        action, request = parse_action(message.get("action"), message.get("params"))
+        async with locked_game(id) as current_game:
+            reply = apply_action(current_game, action, request, since, source=subscriber)
+            subscriber.version = current_game.version
+    except (GameActionError, HTTPException) as exc:
+        return {"type": "error", "id": request_id, "detail": exc.detail if isinstance(exc, HTTPException) else str(exc)}
+    for entry in reply.get("scoring_details", {}).get("score_log", ()):
+        for follower in SUBSCRIBERS.get(id, ()):
+            follower.offer({"type": "score_event", "entry": entry})
+    return {"type": "result", "id": request_id, "action": message["action"], **reply}
+
+@app.post("/api/balatro/trace", include_in_schema=False)
+async def configure_trace(sample_rate: int | None = None, game_id: str | None = None, enabled: bool = True):
+    """Captures the full joker trace for 1 in `sample_rate` requests and/or every request of `game_id`."""
+    _, game_ids = get_trace_sampling()
+    if game_id:
+        if enabled:
+            game_ids.add(game_id)
+        else:
+            game_ids.discard(game_id)
+    set_trace_sampling(sample_rate=sample_rate, game_ids=game_ids)
+    sample_rate, game_ids = get_trace_sampling()
+    return {"ok": True, "sample_rate": sample_rate, "game_ids": sorted(game_ids)}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request, save, leaderboard and engine metrics in the Prometheus text format."""
+    return Response(content=render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/api/balatro/saves")
-async def get_saves():
+async def get_saves(request: Request):
+    """The save browser's index, encoded once per version of the index. Supports If-None-Match."""
+    etag = f'"{BOOT_ID}-saves-{SAVES_INDEX["version"]}"'
+    if SAVES_INDEX["body_version"] != SAVES_INDEX["version"]:
+        SAVES_INDEX["body"] = encode_json({"saves": saves_index()})
+        SAVES_INDEX["body_version"] = SAVES_INDEX["version"]
+    return cached_response(request, etag, body=SAVES_INDEX["body"])
+
+def saves_index() -> list[dict]:
     blind_infos = []
     for uid, game in GAME_SAVES.items():
         blind_info = get_current_blind_info(game)
@@ -791,34 +661,77 @@ async def get_saves():
             "round_score": game.round_score,
             "game_phase": game.game_phase,
             "ante": game.ante,
-            "money": game.money
+            "money": game.money,
+            "version": game.version,
         })
-    return {"saves": blind_infos}
+    return blind_infos
 
 @app.delete("/api/balatro/saves/{id}")
 async def delete_save(id: str):
     if id not in GAME_SAVES:
         raise HTTPException(status_code=404, detail="Save not found.")
-    del GAME_SAVES[id]
-    save_game_saves()
+    async with get_game_lock(id):
+        if id not in GAME_SAVES:
+            raise HTTPException(status_code=404, detail="Save not found.")
+        del GAME_SAVES[id]
+        GAME_LOCKS.pop(id, None)
+        STATE_HISTORIES.pop(id, None)
+        SAVE_RECORDS.pop(id, None)
+        SAVES_INDEX["version"] += 1
+    await save_game_saves()
     return {"ok": True, "message": f"Deleted save {id}"}
 
-def save_game_saves():
-    print("Saving game saves...")
-
-    with open("balatro-saves.json", "w") as f:
-        json.dump({uid: game.model_dump() for uid, game in GAME_SAVES.items()}, f, indent=4)
+async def save_game_saves():
+    """Saves the games now, after the save being written if there is one."""
+    async with SAVE_FILE_LOCK:
+        await snapshot_and_write_saves()
+
+async def snapshot_and_write_saves():
+    """Snapshots every game under its own lock, then writes the file off the event loop. Needs SAVE_FILE_LOCK."""
+    with log_duration(logging.INFO, "saved games") as fields:
+        start = time.perf_counter()
+        snapshot = {}
+        for uid in list(GAME_SAVES.keys()):
+            async with get_game_lock(uid):
+                game = GAME_SAVES.get(uid)
+                if game is not None:
+                    # Every action bumps the version (see state_update), so unchanged games reuse their record
+                    record = SAVE_RECORDS.get(uid)
+                    if record is None or record[0] != game.version:
+                        record = SAVE_RECORDS[uid] = (game.version, encode_record(game, SAVE_ENHANCEMENTS))
+                    snapshot[uid] = record[1]
+        fields["games"] = len(snapshot)
+        SAVE_SECONDS.observe(time.perf_counter() - start, ("encode",))
+
+        with SAVE_SECONDS.timer(("write",)):
+            written = await run_in_threadpool(write_saves, SAVE_FILE, snapshot, dict(SAVE_ENHANCEMENTS))
+        fields["bytes"] = written
+        SAVE_BYTES.inc(amount=written)
+        SAVE_FILE_BYTES.set(written)
+
+@app.get("/api/balatro/saves/export")
+async def export_saves(id: str | None = None):
+    """Every saved game (or only `id`) as the JSON of its model_dump, id -> game."""
+    if id is not None and id not in GAME_SAVES:
+        raise HTTPException(status_code=404, detail="Save not found.")
+    parts = []
+    for uid in ([id] if id is not None else list(GAME_SAVES.keys())):
+        async with get_game_lock(uid):
+            game = GAME_SAVES.get(uid)
+            if game is not None:
+                parts.append(encode_json(uid) + b":" + encode_game(game))
+    return Response(content=b"{" + b",".join(parts) + b"}", media_type="application/json",
+                    headers={"Content-Disposition": 'attachment; filename="balatro-saves.json"'})
 
 
 @app.get("/{path:path}")
-async def serve_file(path: str):
+async def serve_file(request: Request, path: str):
     if path == "":
         path = "index.html"
-    file_path = os.path.join("static", path)
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
-    else:
+    response = STATIC_ASSETS.response(path, request.headers.get("accept-encoding", ""), request.headers.get("if-none-match", ""))
+    if response is None:
         return JSONResponse(status_code=404, content={"message": "File not found"})
+    return response
 
 if __name__ == "__main__":
     port = 8000
@@ -2,11 +2,123 @@ import { showMsg, createCardElement } from './app.js';
 
 const API_BASE = '/api/balatro';
 
+// Fingerprinted URLs of the static files, which browsers cache without revalidating (see balatro_set_assets.py)
+const ASSET_URLS = JSON.parse(document.getElementById('asset-manifest')?.textContent || '{}');
+const assetUrl = path => ASSET_URLS[path] || path;
+
+// Card art packed into one image by create_tmp_images.py. The atlas is only used once both its files have loaded:
+// until then, when they were never generated, or for cards missing from it, each card has its own image
+let cardAtlas = null;
+if (ASSET_URLS['/images/atlas.json']) {
+    fetch(assetUrl('/images/atlas.json'))
+        .then(res => res.ok ? res.json() : null)
+        .then(atlas => {
+            if (!atlas || !atlas.cards || !atlas.image || !ASSET_URLS[atlas.image]) return;
+            const image = new Image();
+            image.onload = () => { cardAtlas = atlas; };
+            image.src = assetUrl(atlas.image);
+        })
+        .catch(() => {});
+}
+
+function cardArt(id, name) {
+    const cell = cardAtlas && cardAtlas.cards[id];
+    if (!cell) {
+        return `<img src="${assetUrl(`/images/${id}.webp`)}" alt="${name}" class="card-image" onerror="this.style.display='none'">`;
+    }
+    const { columns, rows } = cardAtlas;
+    const x = columns > 1 ? cell[0] / (columns - 1) * 100 : 0;
+    const y = rows > 1 ? cell[1] / (rows - 1) * 100 : 0;
+    return `<div class="card-image" role="img" aria-label="${name}" style="background-image: url('${assetUrl(cardAtlas.image)}'); `
+        + `background-size: ${columns * 100}% ${rows * 100}%; background-position: ${x}% ${y}%"></div>`;
+}
+
+// Actions send the state version we have, and get back a JSON patch against it instead of the full state
+const since = () => (state.game && state.game.version !== undefined) ? `&since=${state.game.version}` : '';
+
+function applyPatch(doc, ops) {
+    for (const { op, path, value } of ops) {
+        if (path === '') {
+            doc = value;
+            continue;
+        }
+        const keys = path.slice(1).split('/').map(key => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+        const last = keys.pop();
+        const parent = keys.reduce((node, key) => node[key], doc);
+        if (Array.isArray(parent)) {
+            const index = last === '-' ? parent.length : Number(last);
+            if (op === 'add') parent.splice(index, 0, value);
+            else if (op === 'remove') parent.splice(index, 1);
+            else parent[index] = value;
+        } else if (op === 'remove') {
+            delete parent[last];
+        } else {
+            parent[last] = value;
+        }
+    }
+    return doc;
+}
+
+// Turns a `game_state_patch` response into a `game_state` one. The patch is applied to a copy, as the
+// animations still hold the previous state; if it isn't against our version, the full state is fetched.
+async function resolveState(data) {
+    if (!data || !data.game_state_patch) return data;
+    const { game_state_patch: patch, ...rest } = data;
+    const gameState = (state.game && state.game.version === patch.from)
+        ? applyPatch(structuredClone(state.game), patch.ops)
+        : await api.getState(state.gameId);
+    return { ...rest, game_state: gameState };
+}
+
+// While a game is open, actions go over its websocket, which also pushes the changes made elsewhere
+const socket = { ws: null, nextId: 1, pending: new Map() };
+
+function connectSocket(id) {
+    closeSocket();
+    const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${protocol}://${location.host}/ws/balatro/${id}`);
+    socket.ws = ws;
+    ws.onmessage = async (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'result' || message.type === 'error') {
+            const pending = socket.pending.get(message.id);
+            socket.pending.delete(message.id);
+            if (!pending) return;
+            if (message.type === 'error') pending.reject(new Error(message.detail || "Server error"));
+            else pending.resolve(message);
+        } else if (message.type === 'state' && state.gameId === id && state.game && !socket.pending.size) {
+            // Our own actions come back as results; this is a change from another tab or client
+            const { game_state: gameState } = await resolveState(message);
+            if (gameState.version !== state.game.version) updateUI(gameState, state.game);
+        }
+    };
+    ws.onclose = () => {
+        if (socket.ws === ws) socket.ws = null;
+        for (const { reject } of socket.pending.values()) reject(new Error("Connection lost."));
+        socket.pending.clear();
+    };
+}
+
+function closeSocket() {
+    if (socket.ws) socket.ws.close();
+    socket.ws = null;
+}
+
+// The action's result over the websocket, or null if it isn't open (the caller then uses HTTP)
+function socketAction(action, params = {}) {
+    if (!socket.ws || socket.ws.readyState !== WebSocket.OPEN) return null;
+    const id = socket.nextId++;
+    return new Promise((resolve, reject) => {
+        socket.pending.set(id, { resolve, reject });
+        socket.ws.send(JSON.stringify({ id, action, params, since: state.game ? state.game.version : undefined }));
+    }).then(resolveState);
+}
+
 const api = {
     getSaves: () => fetch(`${API_BASE}/saves`).then(res => res.json()),
     newRun: () => fetch(`${API_BASE}/new_run`, { method: 'POST' }).then(res => res.json()),
     getState: (id) => fetch(`${API_BASE}/state?id=${id}`).then(res => res.json()),
-    playSet: (id, card_indices) => fetch(`${API_BASE}/play_set?id=${id}`, {
+    playSet: (id, card_indices) => socketAction('play_set', { card_indices }) || fetch(`${API_BASE}/play_set?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ card_indices })
@@ -15,9 +127,9 @@ const api = {
             const err = await res.json();
             throw new Error(err.detail || "Server error");
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
-    discard: (id, card_indices) => fetch(`${API_BASE}/discard?id=${id}`, {
+    discard: (id, card_indices) => socketAction('discard', { card_indices }) || fetch(`${API_BASE}/discard?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ card_indices })
@@ -25,10 +137,10 @@ const api = {
         if (!res.ok) {
             return res.json().then(err => { throw new Error(err.detail || "Server error") });
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
-    leaveShop: (id) => fetch(`${API_BASE}/leave_shop?id=${id}`, { method: 'POST' }).then(res => res.json()),
-    buyJoker: (id, slot_index) => fetch(`${API_BASE}/buy_joker?id=${id}`, {
+    leaveShop: (id) => socketAction('leave_shop') || fetch(`${API_BASE}/leave_shop?id=${id}${since()}`, { method: 'POST' }).then(res => res.json()).then(resolveState),
+    buyJoker: (id, slot_index) => socketAction('buy_joker', { slot_index }) || fetch(`${API_BASE}/buy_joker?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ slot_index })
@@ -36,9 +148,9 @@ const api = {
         if (!res.ok) {
             return res.json().then(err => { throw new Error(err.detail || "Server error") });
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
-    buyBoosterPack: (id, slot_index) => fetch(`${API_BASE}/buy_booster_pack?id=${id}`, {
+    buyBoosterPack: (id, slot_index) => socketAction('buy_booster_pack', { slot_index }) || fetch(`${API_BASE}/buy_booster_pack?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ slot_index })
@@ -46,9 +158,9 @@ const api = {
         if (!res.ok) {
             return res.json().then(err => { throw new Error(err.detail || "Server error") });
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
-    choosePackReward: (id, selected_ids) => fetch(`${API_BASE}/choose_pack_reward?id=${id}`, {
+    choosePackReward: (id, selected_ids) => socketAction('choose_pack_reward', { selected_ids }) || fetch(`${API_BASE}/choose_pack_reward?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ selected_ids })
@@ -56,9 +168,9 @@ const api = {
         if (!res.ok) {
             return res.json().then(err => { throw new Error(err.detail || "Server error") });
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
-    useConsumable: (id, consumable_index, target_card_indices = []) => fetch(`${API_BASE}/use_consumable?id=${id}`, {
+    useConsumable: (id, consumable_index, target_card_indices = []) => socketAction('use_consumable', { consumable_index, target_card_indices }) || fetch(`${API_BASE}/use_consumable?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ consumable_index, target_card_indices })
@@ -66,9 +178,9 @@ const api = {
         if (!res.ok) {
             return res.json().then(err => { throw new Error(err.detail || "Server error") });
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
-    reorderJokers: (id, new_order) => fetch(`${API_BASE}/reorder_jokers?id=${id}`, {
+    reorderJokers: (id, new_order) => socketAction('reorder_jokers', { new_order }) || fetch(`${API_BASE}/reorder_jokers?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ new_order })
@@ -76,9 +188,9 @@ const api = {
         if (!res.ok) {
             return res.json().then(err => { throw new Error(err.detail || "Server error") });
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
-    sellJoker: (id, joker_index) => fetch(`${API_BASE}/sell_joker?id=${id}`, {
+    sellJoker: (id, joker_index) => socketAction('sell_joker', { joker_index }) || fetch(`${API_BASE}/sell_joker?id=${id}${since()}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ joker_index })
@@ -86,7 +198,7 @@ const api = {
         if (!res.ok) {
             return res.json().then(err => { throw new Error(err.detail || "Server error") });
         }
-        return res.json();
+        return res.json().then(resolveState);
     }),
     deleteSave: (id) => fetch(`${API_BASE}/saves/${id}`, { method: 'DELETE' })
         .then(res => { if (!res.ok) throw new Error("Failed to delete save"); return res.json(); }),
@@ -310,11 +422,9 @@ function renderJoker(joker, index, context = 'player') {
     }
     jokerEl.dataset.index = index;
     
-    const imageSrc = `/images/${joker.id}.webp`;
-
     jokerEl.innerHTML = `
         <div class="card-image-container">
-            <img src="${imageSrc}" alt="${joker.name}" class="card-image" onerror="this.style.display='none'">
+            ${cardArt(joker.id, joker.name)}
         </div>
     `;
 
@@ -432,6 +542,11 @@ function updateUI(gameState, oldGameState = { round_score: 0, board: [] }, isMid
     // Update score display
     updateScoreDisplay(gameState.round_score, gameState.blind_score_required);
 
+    // Warn before a discard is burned on a board that has no set at all
+    const deadBoard = gameState.game_phase === 'playing' && gameState.dead_board;
+    DOMElements.boardArea.classList.toggle('dead-board', Boolean(deadBoard));
+    DOMElements.boardArea.title = deadBoard ? 'No sets on this board - discard to draw new cards' : '';
+
     // Handle boss blind display
     if (gameState.boss_blind_effect) {
         DOMElements.bossBlindEffectDisplay.classList.remove('hidden');
@@ -731,11 +846,9 @@ function renderConsumable(consumable, index) {
     const consumableEl = document.createElement('div');
     consumableEl.classList.add('consumable-card', consumable.rarity.toLowerCase());
 
-    const imageSrc = `/images/${consumable.id}.webp`;
-
     consumableEl.innerHTML = `
         <div class="card-image-container">
-            <img src="${imageSrc}" alt="${consumable.name}" class="card-image" onerror="this.style.display='none'">
+            ${cardArt(consumable.id, consumable.name)}
         </div>
     `;
     consumableEl.addEventListener('click', () => handleUseConsumable(index));
@@ -825,6 +938,7 @@ async function cancelTargeting() {
 }
 
 function showLobby() {
+    closeSocket();
     DOMElements.gameContainer.style.display = 'none';
     DOMElements.lobbyContainer.classList.remove('hidden');
     DOMElements.endRunContainer.style.display = 'none';
@@ -841,6 +955,7 @@ function showLobby() {
 async function loadGame(id, gameState = null) {
     try {
         state.gameId = id;
+        connectSocket(id);
         const gameToLoad = gameState || await api.getState(id);
 
         DOMElements.lobbyContainer.classList.add('hidden');
@@ -969,12 +1084,8 @@ async function handleJokerDrop(event) {
     draggedJokerIndex = null;
 
     try {
-        // We don't need the response if it's just the same state
-        await api.reorderJokers(state.gameId, newOrder);
-        // The UI is already visually updated, so we just need to refresh the state
-        // in the background for consistency, or trust the visual update.
-        // For simplicity, we'll fetch the new state to be safe.
-        const newGameState = await api.getState(state.gameId);
+        // The UI is already visually updated; the response patches our state to the new joker order
+        const { game_state: newGameState } = await api.reorderJokers(state.gameId, newOrder);
         updateUI(newGameState);
 
     } catch (error) {
@@ -1261,11 +1372,9 @@ function renderPackOpening(packState) {
         cardEl.classList.add('consumable-card', 'pack-choice', packState.rarity.toLowerCase());
         cardEl.dataset.id = choice.id;
 
-        const imageSrc = `/images/${choice.id}.webp`;
-
         cardEl.innerHTML = `
             <div class="card-image-container">
-                <img src="${imageSrc}" alt="${choice.name}" class="card-image" onerror="this.style.display='none'">
+                ${cardArt(choice.id, choice.name)}
             </div>
         `;
         
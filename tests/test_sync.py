@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from balatro_set_sync import json_patch
+
+
+def apply_patch(doc, ops):
+    """Applies add/remove/replace operations, like applyPatch in static/balatro.js."""
+    for op in ops:
+        if op["path"] == "":
+            doc = op["value"]
+            continue
+        keys = [key.replace("~1", "/").replace("~0", "~") for key in op["path"][1:].split("/")]
+        parent = doc
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+        last = int(keys[-1]) if isinstance(parent, list) else keys[-1]
+        if op["op"] == "add" and isinstance(parent, list):
+            parent.insert(last, op["value"])
+        elif op["op"] == "remove":
+            del parent[last]
+        else:
+            parent[last] = op["value"]
+    return doc
+
+
+@pytest.mark.parametrize("old, new", [
+    ([1, 2, 3], [True, 2, 3]),
+    ([1, 2, 3], [1, 2.0, 3]),
+    ([0, 1], [0, 1, False]),
+    ([{"a": 1}, {"b": 2}], [{"a": True}, {"b": 2}]),
+    ({"levels": {"x": 1}}, {"levels": {"x": 1.0}}),
+    (["a", 1], ["a", True, 1]),
+])
+def test_patch_keeps_json_types(old, new):
+    patched = apply_patch(json.loads(json.dumps(old)), json_patch(old, new))
+    assert json.dumps(patched) == json.dumps(new)
+
+
+def test_equal_values_need_no_patch():
+    assert json_patch({"a": [1, {"b": True}]}, {"a": [1, {"b": True}]}) == []